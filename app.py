@@ -1,43 +1,351 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from scripts.speech_symbol_timestamps import audio_query_json
+from scripts.model_registry import model_registry
+from scripts.result_cache import result_cache
+from scripts.inference_pool import PoolFullError, create_inference_pool
+from scripts.batch_transcriber import BatchTranscriber
+from scripts.streaming import MoraStream, aiter_accent_phrases
+from scripts.realtime import PCM_ENCODINGS, RealtimeSession, decode_pcm
+from scripts.audio_buffer import AudioBuffer
+from scripts.formant_engine import formants_available
+from scripts.columnar import to_npz_bytes
+from scripts.response_encoding import compact_audio_query, dumps, encode_response, server_timing
+from scripts.metrics import (audio_seconds_total, collect_timings, observe_stages, registry, request_seconds,
+                             requests_total, stage)
+from scripts import config
 import soundfile as sf
 import uvicorn
+import asyncio
 import io
+import time
 
 app = FastAPI()
+inference_pool = None
+batch_transcriber = None
+realtime_sessions = 0
+readiness = {"status": "starting"}
 
-def create_binary(file: UploadFile):
-    data, samplerate = sf.read(io.BytesIO(file.file.read()), dtype='int16')
-    binary_data = data.tobytes()
-    return binary_data, samplerate
+@app.on_event("startup")
+async def load_models():
+    global inference_pool, batch_transcriber
+    inference_pool = create_inference_pool()
+    # Concurrent requests share batched Whisper passes; only threads of this process can join the same batch
+    if config.BATCH_SIZE > 1 and config.WORKER_KIND == "thread":
+        batch_transcriber = BatchTranscriber(max_batch=config.BATCH_SIZE, max_wait_ms=config.BATCH_WAIT_MS)
+    # Warm up in the background: /health answers as soon as the server listens, /ready once the models are loaded
+    # and have run once, so the first requests do not pay for it.
+    asyncio.get_running_loop().create_task(warm_up())
 
-@app.post("/mora")
-async def get_mora(file: UploadFile = File(...)):
+async def warm_up():
+    # Loads the models, the kana converter and the mapping of every inference worker and runs them once
+    global readiness
+    readiness = {"status": "warming_up"}
+    start_time = time.perf_counter()
     try:
-        # Read the uploaded file
-        binary, samplerate = create_binary(file)
+        await inference_pool.warm_up(config.PRELOAD_MODELS, config.WARMUP_INFERENCE)
+        readiness = {"status": "ready", "warmup_seconds": round(time.perf_counter() - start_time, 3),
+                     "models": config.PRELOAD_MODELS}
+        print("Ready", readiness)
+    except Exception as e:
+        readiness = {"status": "failed", "detail": f"{type(e).__name__}: {e}"}
+        print("Warmup failed:", readiness["detail"])
+
+def register_gauges():
+    # Components keep their own counters; the metrics read them when /metrics is scraped.
+    # With process workers, the model and cache counters are those of the API process.
+    registry.gauge("mora_queue_depth", "Requests running or waiting in the inference pool",
+                   lambda: inference_pool.pending if inference_pool else 0)
+    registry.gauge("mora_models_resident", "Whisper models loaded in memory", lambda: len(model_registry.resident()))
+    registry.gauge("mora_model_hits_total", "Model lookups served by a loaded model",
+                   lambda: model_registry.hits, kind="counter")
+    registry.gauge("mora_model_misses_total", "Model lookups that loaded the model",
+                   lambda: model_registry.misses, kind="counter")
+    for name in ("memory_hits", "disk_hits", "misses"):
+        registry.gauge(f"mora_result_cache_{name}_total", f"Result cache {name.replace('_', ' ')}",
+                       lambda name=name: result_cache.stats()[name], kind="counter")
+    registry.gauge("mora_ready", "1 once the warmup is done and /ready reports ready",
+                   lambda: int(readiness["status"] == "ready"))
+    registry.gauge("mora_realtime_sessions", "Open realtime WebSocket sessions", lambda: realtime_sessions)
+    registry.gauge("mora_result_cache_hit_rate", "Fraction of result cache lookups that were hits",
+                   lambda: result_cache.stats()["hit_rate"])
+
+register_gauges()
+
+@app.on_event("shutdown")
+def stop_workers():
+    inference_pool.shutdown()
+    if batch_transcriber is not None:
+        batch_transcriber.close()
+
+def read_samples(content):
+    # Decode the upload in memory; the samples are handed to the pipeline without touching the disk
+    data, samplerate = sf.read(io.BytesIO(content), dtype='float32')
+    return data, samplerate
+
+def shared_transcriber(model):
+    # Batched passes run the batch transcriber's model; requests for another inference mode run on their own
+    if batch_transcriber is not None and batch_transcriber.model_name == model:
+        return batch_transcriber.transcribe
+    return None
+
+def check_model(model):
+    # The inference mode is the name of a registered model: "default", "int8", "fast"...
+    if model not in model_registry.names():
+        raise HTTPException(status_code=400, detail=f"No model registered under the name: {model}")
+
+def check_formants(formants):
+    # Formant features need praat-parselmouth; without it they are refused instead of failing with a 500
+    if formants and not formants_available():
+        raise HTTPException(status_code=400,
+                            detail="Formant features are unavailable: praat-parselmouth is not installed")
 
-        print("Binary data created", samplerate)
+def process_upload(content, alignment=config.ALIGNMENT, formants=False, vad=config.VAD, model="default"):
+    # Runs in the inference pool: decoding, transcription and feature extraction never block the event loop.
+    # The stage timings travel back with the result, so they are also collected from process workers.
+    with collect_timings() as timings:
+        with stage("decode"):
+            samples, samplerate = read_samples(content)
 
-        # Save the uploaded file to a temporary path if needed
-        # temp_audio_path = "./temp_audio.wav"
-        # with open(temp_audio_path, "wb") as temp_file:
-        #     temp_file.write(binary)
+        print("Samples decoded", samplerate)
 
         # Get data using the audio_query_json function
-        data = audio_query_json(audio_path=file.filename, mapping_file="files/mapping.json")
+        transcriber = shared_transcriber(model)
+        data = audio_query_json(samples=samples, sample_rate=samplerate, mapping_file="files/mapping.json",
+                                model_name=model, transcriber=transcriber, alignment=alignment, formants=formants,
+                                vad=vad)
+
+    print("Data created")
+
+    return data, samplerate, len(samples) / samplerate, timings
+
+@app.get("/health")
+async def health():
+    # Liveness: the server answers, even while it is still warming up
+    return {"status": "ok", "pending": inference_pool.pending if inference_pool else 0}
+
+@app.get("/ready")
+async def ready():
+    # Readiness: the models are loaded and warm, so requests are answered at full speed
+    if readiness["status"] != "ready":
+        return JSONResponse(status_code=503, content=readiness)
+    return readiness
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition of the request, stage, queue, model and cache metrics
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/mora")
+async def get_mora(request: Request, file: UploadFile = File(...), format: str = "json", compact: bool = False,
+                   alignment: str = config.ALIGNMENT, formants: bool = False, vad: bool = config.VAD,
+                   timings: bool = False, model: str = "default"):
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await mora_response(request, file, format, compact, alignment, formants, vad, timings, model)
+        status = response.status_code
+        return response
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    finally:
+        request_seconds.observe(time.perf_counter() - start_time, "/mora")
+        requests_total.inc("/mora", str(status))
+
+async def mora_response(request, file, format, compact, alignment, formants, vad, include_timings, model):
+    if alignment not in ("equal", "acoustic"):
+        raise HTTPException(status_code=400, detail=f"Unknown alignment: {alignment}")
+    check_model(model)
+    check_formants(formants)
+    # Read the uploaded file
+    content = await file.read()
+    try:
+        start_time = time.perf_counter()
+        data, samplerate, duration, stage_timings = await inference_pool.run(
+            process_upload, content, alignment, formants, vad, model, timeout=config.REQUEST_TIMEOUT)
+        inference_ms = (time.perf_counter() - start_time) * 1000
+        audio_seconds_total.inc(amount=duration)
 
-        print("Data created")
+        # Compact columnar arrays (see scripts/columnar.py); the sample rate travels in a header
+        if format == "npz":
+            serialize_start = time.perf_counter()
+            body = to_npz_bytes(data)
+            observe_stages({**stage_timings, "serialization": time.perf_counter() - serialize_start})
+            return Response(content=body, media_type="application/octet-stream",
+                            headers={"X-Samplerate": str(samplerate)})
 
         response_data = {
-            "data": data,
+            "data": compact_audio_query(data) if compact else data,
             "samplerate": samplerate
         }
+        if include_timings:
+            # Milliseconds per pipeline stage; "inference" includes the wait in the inference pool
+            response_data["timings"] = {name: round(seconds * 1000, 3) for name, seconds in stage_timings.items()}
+            response_data["timings"]["inference"] = round(inference_ms, 3)
 
-        return response_data
+        # Serialize with orjson and compress as negotiated, off the event loop; the cost of each step is reported
+        # in the Server-Timing header so clients can compare it with their transfer time
+        body, encoding, timings = await asyncio.to_thread(
+            encode_response, response_data, request.headers.get("accept-encoding"),
+            config.COMPRESS_MIN_BYTES, config.GZIP_LEVEL, config.BROTLI_QUALITY)
+        observe_stages({**stage_timings, "serialization": (timings["serialize"] + timings["compress"]) / 1000})
+        headers = {
+            "Server-Timing": server_timing({"inference": inference_ms, "serialize": timings["serialize"],
+                                            "compress": timings["compress"]}),
+            "X-Uncompressed-Length": str(timings["json_bytes"]),
+            "Vary": "Accept-Encoding",
+        }
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
 
+    except PoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(config.RETRY_AFTER)})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Processing took longer than {config.REQUEST_TIMEOUT} seconds")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/mora/stream")
+async def stream_mora(file: UploadFile = File(...), alignment: str = config.ALIGNMENT, formants: bool = False,
+                      model: str = "default"):
+    try:
+        return await mora_stream_response(file, alignment, formants, model)
+    except HTTPException as e:
+        requests_total.inc("/mora/stream", str(e.status_code))
+        raise
+
+async def mora_stream_response(file, alignment, formants, model):
+    # Streams one accent phrase per line (NDJSON) as each window is processed; the last line holds the metadata
+    start_time = time.perf_counter()
+    if alignment not in ("equal", "acoustic"):
+        raise HTTPException(status_code=400, detail=f"Unknown alignment: {alignment}")
+    check_model(model)
+    check_formants(formants)
+    # The stream holds a slot of the inference pool until its last line is sent, and its windows run on it
+    try:
+        reservation = inference_pool.reserve()
+    except PoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(config.RETRY_AFTER)})
+    try:
+        content = await file.read()
+        audio = await reservation.run(lambda: AudioBuffer.from_array(*read_samples(content)),
+                                      timeout=config.REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        reservation.release()
+        raise HTTPException(status_code=504, detail=f"Decoding took longer than {config.REQUEST_TIMEOUT} seconds")
+    except Exception as e:
+        reservation.release()
+        raise HTTPException(status_code=400, detail=str(e))
+    stream = MoraStream(audio, mapping_file="files/mapping.json", model_name=model, alignment=alignment,
+                        formants=formants)
+
+    def run_window(function, *args):
+        return reservation.run(function, *args, timeout=config.REQUEST_TIMEOUT)
+
+    async def ndjson_lines():
+        status = "500"
+        try:
+            async for accent_phrase in aiter_accent_phrases(stream, run_window):
+                yield dumps(accent_phrase) + b"\n"
+            yield dumps(stream.metadata()) + b"\n"
+            status = "200"
+            audio_seconds_total.inc(amount=audio.duration)
+        except asyncio.TimeoutError:
+            status = "504"
+            raise
+        finally:
+            # The request lasts until the last line is sent
+            reservation.release()
+            request_seconds.observe(time.perf_counter() - start_time, "/mora/stream")
+            requests_total.inc("/mora/stream", status)
+
+    # The background task releases the slot if the response ends before the body is iterated
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson",
+                             background=BackgroundTask(reservation.release))
+
+@app.websocket("/mora/realtime")
+async def realtime_mora(websocket: WebSocket, sample_rate: int = 16000, encoding: str = "pcm_s16le",
+                        latency: float = config.REALTIME_LATENCY, model: str = "default"):
+    # Live audio: binary messages carry PCM chunks, the text message "end" finishes the stream. Pitch frames are
+    # sent as soon as their chunk arrives, the moras once their words are committed (see scripts/realtime.py)
+    global realtime_sessions
+    if encoding not in PCM_ENCODINGS or sample_rate <= 0 or latency < 0 or model not in model_registry.names():
+        await websocket.close(code=1003, reason="Unsupported encoding, sample rate, latency or model")
+        return
+    if realtime_sessions >= config.REALTIME_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="Too many realtime sessions")
+        return
+    ended = asyncio.Event()
+    send_lock = asyncio.Lock()
+    transcription = None
+
+    async def send(events):
+        async with send_lock:
+            for event in events:
+                await websocket.send_text(dumps(event).decode("utf-8"))
+
+    async def run_pass(function, final=False):
+        # Passes take a slot of the inference pool like any request, with the same timeout. A periodic pass is
+        # skipped while the pool is full (the next one covers its audio); the final pass waits for a slot
+        deadline = time.perf_counter() + config.REQUEST_TIMEOUT
+        while True:
+            try:
+                return await inference_pool.run_local(function, timeout=config.REQUEST_TIMEOUT)
+            except PoolFullError:
+                if not final:
+                    return []
+                if time.perf_counter() >= deadline:
+                    raise asyncio.TimeoutError()
+                await asyncio.sleep(config.REALTIME_STEP)
+
+    async def transcribe_periodically(session):
+        # Whisper runs in the inference pool, so the chunks keep being received (and their pitch sent) meanwhile
+        while not ended.is_set():
+            try:
+                await asyncio.wait_for(ended.wait(), timeout=config.REALTIME_STEP)
+            except asyncio.TimeoutError:
+                pass
+            if not ended.is_set() and session.has_new_audio():
+                await send(await run_pass(session.transcribe))
+
+    realtime_sessions += 1
+    try:
+        await websocket.accept()
+        session = RealtimeSession(sample_rate, latency_seconds=latency, buffer_seconds=config.REALTIME_BUFFER,
+                                  model_name=model, transcriber=shared_transcriber(model))
+        transcription = asyncio.create_task(transcribe_periodically(session))
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                # Resampling and pitch tracking run in a thread: the lock they take is also held by the pass in
+                # the pool, and the loop keeps serving the other connections meanwhile
+                await send(await asyncio.to_thread(session.feed, decode_pcm(message["bytes"], encoding)))
+            elif message.get("text") == "end":
+                ended.set()
+                await transcription
+                await send(await run_pass(session.finish, final=True))
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        detail = f"Processing took longer than {config.REQUEST_TIMEOUT} seconds" \
+            if isinstance(e, asyncio.TimeoutError) else str(e)
+        try:
+            await send([{"type": "error", "detail": detail}])
+            await websocket.close(code=1011)
+        except Exception:
+            pass  # The connection is already gone
+    finally:
+        ended.set()
+        if transcription is not None:
+            transcription.cancel()
+        realtime_sessions -= 1
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5500)
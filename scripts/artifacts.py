@@ -0,0 +1,264 @@
+# Standard library imports
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import AudioBuffer
+from .model_registry import model_registry
+from .metrics import stage
+from .pitch_engine import PitchTrack
+from .voice_activity import SpeechRegions
+from .result_cache import audio_cache_key, file_digest
+from .forced_alignment import compute_acoustic_features
+from .formant_engine import compute_formant_track
+from .mora_mapping import load_mora_table
+from .speech_symbol_timestamps import (assemble_audio_query, compute_utterance_pitch, transcribe_audio,
+                                       transcription_path)
+
+# Version of the artifact formats and of the stages producing them. Changing it invalidates every artifact.
+ARTIFACT_VERSION = 1
+
+# Variants (one per fingerprint) kept of each artifact of a source; the least recently used ones are removed.
+MAX_VARIANTS = 4
+
+
+def fingerprint(**dependencies):
+    """
+    Returns the fingerprint of an artifact: a short hash of everything its contents depend on.
+
+    Parameters:
+    - **dependencies: The inputs of the stage (digests of other artifacts, parameters...). Values must be JSON
+      serializable.
+
+    Returns:
+    - str: The hex fingerprint.
+    """
+    payload = json.dumps({"version": ARTIFACT_VERSION, **dependencies}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class AnalysisResult(NamedTuple):
+    """Audio query returned by `incremental_audio_query`, with the stages that had to be recomputed."""
+    audio_query: dict
+    duration: float
+    recomputed: list
+
+
+class ArtifactStore:
+    """
+    Directory of intermediate artifacts of the mora pipeline, one subdirectory per audio source:
+
+    - transcript-<fingerprint>.json: the words in Kana with their timestamps (and the speech regions with VAD).
+      It can be corrected by hand: the audio queries depending on it are rebuilt, and the correction is kept until
+      the model, language or audio change.
+    - pitch-<fingerprint>.npz: the pitch contour of the audio.
+    - audio_query-<fingerprint>.json: the audio query built from them with the mapping file.
+
+    Every artifact is stored under the fingerprint of its inputs, so switching between settings (model, VAD,
+    alignment...) reuses the artifacts of each setting instead of overwriting them. Up to MAX_VARIANTS
+    fingerprints are kept per artifact; the least recently used ones are removed.
+    """
+
+    def __init__(self, directory, max_variants=MAX_VARIANTS):
+        """
+        Parameters:
+        - directory (str): Root directory of the artifacts. Created on first write.
+        - max_variants (int): Number of fingerprints kept of each artifact of a source.
+        """
+        self.directory = directory
+        self.max_variants = max_variants
+
+    def path(self, source_key, name, artifact_fingerprint):
+        """
+        Returns the path of the artifact `name` (e.g. "transcript.json") of a source for the given fingerprint.
+        """
+        stem, extension = os.path.splitext(name)
+        return os.path.join(self.directory, source_key[:2], source_key, f"{stem}-{artifact_fingerprint}{extension}")
+
+    def variants(self, source_key, name):
+        """
+        Returns the paths of the stored variants of an artifact of a source, the most recently used first.
+        """
+        stem, extension = os.path.splitext(name)
+        directory = os.path.join(self.directory, source_key[:2], source_key)
+        try:
+            entries = [entry for entry in os.scandir(directory)
+                       if entry.name.startswith(stem + "-") and entry.name.endswith(extension)]
+        except OSError:
+            return []
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        return [entry.path for entry in entries]
+
+    def _touch(self, path):
+        # The modification time orders the variants by last use. It is set explicitly, as the clock of the file
+        # system may be too coarse to order artifacts written in quick succession
+        now = time.time_ns()
+        try:
+            os.utime(path, ns=(now, now))
+        except OSError:
+            pass
+
+    def _write(self, source_key, name, artifact_fingerprint, write):
+        # Written atomically, so an interrupted run never leaves a partial artifact behind
+        path = self.path(source_key, name, artifact_fingerprint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as artifact_file:
+            write(artifact_file)
+        os.replace(temporary_path, path)
+        self._touch(path)
+        others = [other_path for other_path in self.variants(source_key, name) if other_path != path]
+        for stale_path in others[max(self.max_variants - 1, 0):]:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+
+    def load_json(self, source_key, name, expected_fingerprint):
+        """
+        Returns the data of a JSON artifact, or None if it is missing or its fingerprint does not match.
+        """
+        path = self.path(source_key, name, expected_fingerprint)
+        try:
+            with open(path, encoding="utf-8") as artifact_file:
+                artifact = json.load(artifact_file)
+        except (OSError, ValueError):
+            return None
+        if artifact.get("fingerprint") != expected_fingerprint:
+            return None
+        self._touch(path)
+        return artifact["data"]
+
+    def save_json(self, source_key, name, artifact_fingerprint, data):
+        payload = json.dumps({"fingerprint": artifact_fingerprint, "data": data}, ensure_ascii=False, indent=1)
+        self._write(source_key, name, artifact_fingerprint,
+                    lambda artifact_file: artifact_file.write(payload.encode("utf-8")))
+
+    def load_pitch(self, source_key, expected_fingerprint):
+        """
+        Returns the stored pitch contour, or None if it is missing or its fingerprint does not match.
+        """
+        path = self.path(source_key, "pitch.npz", expected_fingerprint)
+        try:
+            with np.load(path) as artifact:
+                if str(artifact["fingerprint"]) != expected_fingerprint:
+                    return None
+                pitch_track = PitchTrack(artifact["times"], artifact["f0"], artifact["voiced"])
+        except (OSError, KeyError, ValueError):
+            return None
+        self._touch(path)
+        return pitch_track
+
+    def save_pitch(self, source_key, artifact_fingerprint, pitch_track):
+        self._write(source_key, "pitch.npz", artifact_fingerprint,
+                    lambda artifact_file: np.savez(artifact_file, fingerprint=np.array(artifact_fingerprint),
+                                                   times=pitch_track.times, f0=pitch_track.f0,
+                                                   voiced=pitch_track.voiced))
+
+
+def _content_digest(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def incremental_audio_query(source, store, mapping_file="files/mapping.json", model_name="default", language="ja",
+                            decimals=4, alignment="equal", formants=False, vad=False, transcriber=None):
+    """
+    Builds the audio query of an audio like `audio_query_json`, reusing the stored artifacts whose inputs did not
+    change.
+
+    After a change of the mapping file (or a corrected transcript), only the audio query is rebuilt from the
+    stored transcript and pitch contour: the audio is not even decoded, unless the acoustic alignment or the
+    formants are requested.
+
+    Parameters:
+    - source (str or AudioBuffer): The path to the audio file (identified by the hash of its contents), or the
+      decoded audio (identified by the hash of its samples).
+    - store (ArtifactStore): Where the artifacts are kept.
+    - mapping_file, model_name, language, decimals, alignment, formants, vad, transcriber: As in
+      `audio_query_json`.
+
+    Returns:
+    - AnalysisResult: The audio query, the duration of the audio and the names of the recomputed artifacts.
+    """
+    if alignment not in ("equal", "acoustic"):
+        raise ValueError(f"Unknown alignment: {alignment}")
+    if isinstance(source, AudioBuffer):
+        source_key, decoded = audio_cache_key(source), source
+    elif not os.path.exists(source):
+        raise FileNotFoundError(f"The audio file was not found at path: {source}")
+    else:
+        source_key, decoded = file_digest(source), None
+
+    def audio():
+        # Decode only if a stage has to run on the samples
+        nonlocal decoded
+        if decoded is None:
+            with stage("decode"):
+                decoded = AudioBuffer.from_file(source)
+        return decoded
+
+    recomputed = []
+
+    # Transcript: depends on the audio, the model, the decoding path, the language and the VAD
+    transcript_fingerprint = fingerprint(source=source_key, model=model_registry.key_for(model_name),
+                                         transcription=transcription_path(transcriber), language=language, vad=vad)
+    transcript = store.load_json(source_key, "transcript.json", transcript_fingerprint)
+    if transcript is None:
+        kana_text, words, speech_regions = transcribe_audio(audio(), model_name, language, transcriber, vad)
+        transcript = {
+            "transcription": kana_text,
+            "words": words,
+            "duration": audio().duration,
+            "speech_regions": None if speech_regions is None else {
+                "starts": speech_regions.starts.tolist(),
+                "ends": speech_regions.ends.tolist(),
+                "separator_seconds": speech_regions.separator_seconds,
+            },
+        }
+        store.save_json(source_key, "transcript.json", transcript_fingerprint, transcript)
+        recomputed.append("transcript")
+    regions = transcript["speech_regions"]
+    speech_regions = None if regions is None else SpeechRegions(regions["starts"], regions["ends"],
+                                                               transcript["duration"],
+                                                               regions["separator_seconds"])
+
+    # Pitch contour: depends on the audio and, with VAD, on the speech regions of the transcript it is mapped through
+    pitch_fingerprint = fingerprint(source=source_key, vad=vad,
+                                    regions=None if regions is None else _content_digest(regions))
+    pitch_track = store.load_pitch(source_key, pitch_fingerprint)
+    if pitch_track is None:
+        with stage("pitch"):
+            pitch_track = compute_utterance_pitch(audio(), speech_regions)
+        store.save_pitch(source_key, pitch_fingerprint, pitch_track)
+        recomputed.append("pitch")
+
+    # Audio query: depends on the contents of the transcript (it may have been corrected), the pitch contour and
+    # the mapping file
+    query_fingerprint = fingerprint(source=source_key, transcript=_content_digest(transcript),
+                                    pitch=pitch_fingerprint, mapping=file_digest(mapping_file), decimals=decimals,
+                                    alignment=alignment, formants=formants)
+    audio_query = store.load_json(source_key, "audio_query.json", query_fingerprint)
+    if audio_query is None:
+        features = formant_track = None
+        if alignment == "acoustic":
+            with stage("alignment_features"):
+                features = compute_acoustic_features(audio(), pitch_track=pitch_track)
+        if formants:
+            with stage("formants"):
+                formant_track = compute_formant_track(audio())
+        with stage("mapping"):
+            mora_table = load_mora_table(mapping_file) or mapping_file
+        with stage("timing"):
+            audio_query = assemble_audio_query(transcript["transcription"], transcript["words"], pitch_track,
+                                               mora_table, transcript["duration"], decimals, features,
+                                               formant_track, speech_regions)
+        store.save_json(source_key, "audio_query.json", query_fingerprint, audio_query)
+        recomputed.append("audio_query")
+
+    return AnalysisResult(audio_query, transcript["duration"], recomputed)
@@ -1,47 +1,55 @@
+import argparse
+import os
+
 import matplotlib
-matplotlib.use('TkAgg')  # Usa el backend 'TkAgg' para interactividad
-import matplotlib.pyplot as plt
-import parselmouth
 import numpy as np
 
-# Rutas a los archivos de audio para cada vocal
+from .formant_analysis import formant_tracks
+
+# Vocales analizadas
 vocales = ["a", "i", "u", "e", "o"]
-archivos = [f"/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/{vocal}_shikoku.wav" for vocal in vocales]
 
-# Crear subplots para cada vocal
-fig, axs = plt.subplots(5, 1, figsize=(10, 20))
 
-for i, archivo in enumerate(archivos):
-    # Cargar el archivo de audio
-    snd = parselmouth.Sound(archivo)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gráfica de F1 y F2 para cada vocal.")
+    parser.add_argument("--audio-dir", default="test_audios", help="Carpeta con los archivos {vocal}_shikoku.wav")
+    parser.add_argument("-o", "--output", help="Guardar la gráfica en este archivo en lugar de mostrarla")
+    args = parser.parse_args(argv)
 
-    # Extraer la duración del audio
-    duracion = snd.get_total_duration()
+    # Sin ventana cuando se guarda a un archivo, para poder ejecutarlo en servidores
+    if args.output:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
 
-    # Definir los tiempos para el análisis desde el inicio hasta el final del audio
-    times = np.linspace(0, duracion, int(duracion * 1000))  # 100 puntos por segundo
+    archivos = [os.path.join(args.audio_dir, f"{vocal}_shikoku.wav") for vocal in vocales]
 
-    # Obtener F1 y F2
-    formants = snd.to_formant_burg()
-    f1 = [formants.get_value_at_time(1, time) for time in times]
-    f2 = [formants.get_value_at_time(2, time) for time in times]
+    # Crear subplots para cada vocal
+    fig, axs = plt.subplots(5, 1, figsize=(10, 20))
 
-    # Dibujar los formantes en el subplot correspondiente
-    axs[i].plot(times, f1, label="F1")
-    axs[i].plot(times, f2, label="F2")
-    axs[i].set_title(f"Formantes para la vocal '{vocales[i]}'")
-    axs[i].set_xlabel("Tiempo (s)")
-    axs[i].set_ylabel("Frecuencia (Hz)")
+    for i, archivo in enumerate(archivos):
+        # Obtener F1 y F2 de todas las tramas del análisis de una sola vez
+        times, f1, f2 = formant_tracks(archivo)
+        duracion = times[-1] if len(times) else 0.0
 
-    # Configurar los ticks del eje X para que estén cada 0.5 segundossudo apt-get install qt5-qmake qt5-default libqt5gui5 libqt5core5a libqt5widgets5 libqt5network5
+        # Dibujar los formantes en el subplot correspondiente
+        axs[i].plot(times, f1, label="F1")
+        axs[i].plot(times, f2, label="F2")
+        axs[i].set_title(f"Formantes para la vocal '{vocales[i]}'")
+        axs[i].set_xlabel("Tiempo (s)")
+        axs[i].set_ylabel("Frecuencia (Hz)")
 
-    axs[i].set_xticks(np.arange(0, duracion + 0.1, 0.1))
+        # Configurar los ticks del eje X cada 0.1 segundos
+        axs[i].set_xticks(np.arange(0, duracion + 0.1, 0.1))
 
-    axs[i].legend()
+        axs[i].legend()
 
-# Ajustar el layout y mostrar la gráfica
-plt.tight_layout()
-plt.show()
+    # Ajustar el layout y mostrar o guardar la gráfica
+    plt.tight_layout()
+    if args.output:
+        plt.savefig(args.output)
+    else:
+        plt.show()
 
-# Write a code to chose a number prime in a alist
 
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,34 @@
-import parselmouth
-import matplotlib.pyplot as plt
-import numpy as np
+import argparse
 
-# Cargar un archivo de sonido
-snd = parselmouth.Sound("/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/a_voice.wav")
+import matplotlib
 
-# Análisis de formantes
-formants = snd.to_formant_burg()
+from .formant_analysis import analyze_segment
 
-times = np.linspace(0, 3, 10000)
-# Obtener los valores de F1 y F2 en un punto específico del tiempo
-f1 = [formants.get_value_at_time(1, time) for time in times]  
-f2 = [formants.get_value_at_time(2, time) for time in times]  
 
-plt.plot(times, f1)
-plt.plot(times, f2, label='f2')
-plt.legend()
-plt.show()
\ No newline at end of file
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gráfica de F1 y F2 de un archivo de sonido.")
+    parser.add_argument("audio", nargs="?", default="test_audios/a_voice.wav", help="Archivo de sonido")
+    parser.add_argument("--start", type=float, default=0.0, help="Inicio en segundos")
+    parser.add_argument("--end", type=float, default=3.0, help="Fin en segundos")
+    parser.add_argument("-o", "--output", help="Guardar la gráfica en este archivo en lugar de mostrarla")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # Análisis de formantes, interpolado en 10000 puntos del rango
+    times, f1, f2 = analyze_segment(args.audio, args.start, args.end,
+                                    points_per_second=10000 / (args.end - args.start))
+
+    plt.plot(times, f1, label='f1')
+    plt.plot(times, f2, label='f2')
+    plt.legend()
+    if args.output:
+        plt.savefig(args.output)
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    main()
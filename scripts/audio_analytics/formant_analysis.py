@@ -0,0 +1,218 @@
+# Standard library imports
+import argparse
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+# Third-party library imports
+import numpy as np
+import parselmouth
+
+# Percentiles reported by default for each formant.
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def formant_tracks(sound, time_step=None, max_number_of_formants=5.0, maximum_formant=5500.0,
+                   window_length=0.025, pre_emphasis_from=50.0):
+    """
+    Runs the Burg formant analysis of Praat once and returns the F1 and F2 of every analysis frame.
+
+    The frame values are read as whole matrices instead of calling `get_value_at_time` for every instant.
+
+    Parameters:
+    - sound (parselmouth.Sound or str): The sound, or the path to the audio file.
+    - time_step (float): Distance between analysis frames in seconds. None uses the Praat default.
+    - max_number_of_formants (float): Number of formants searched for.
+    - maximum_formant (float): Ceiling of the formant search range in Hertz (5500 for women, 5000 for men).
+    - window_length (float): Effective analysis window in seconds.
+    - pre_emphasis_from (float): Frequency in Hertz above which the spectrum is pre-emphasized.
+
+    Returns:
+    - tuple: Arrays (times, f1, f2), with NaN where a formant is not defined.
+    """
+    if not isinstance(sound, parselmouth.Sound):
+        sound = parselmouth.Sound(sound)
+    formant = sound.to_formant_burg(time_step=time_step, max_number_of_formants=max_number_of_formants,
+                                    maximum_formant=maximum_formant, window_length=window_length,
+                                    pre_emphasis_from=pre_emphasis_from)
+    times = np.asarray(formant.xs())
+    # Praat writes 0 for the formants missing from a frame.
+    f1 = formant.to_matrix(1).values[0].astype(np.float64)
+    f2 = formant.to_matrix(2).values[0].astype(np.float64)
+    f1[f1 <= 0] = np.nan
+    f2[f2 <= 0] = np.nan
+    return times, f1, f2
+
+
+def sample_formants(times, f1, f2, sample_times):
+    """
+    Interpolates the formant tracks linearly at arbitrary instants, like `get_value_at_time` in Praat.
+
+    Instants outside the analysed frames, or next to a frame without the formant, get NaN.
+
+    Parameters:
+    - times (np.ndarray): Frame times returned by `formant_tracks`.
+    - f1, f2 (np.ndarray): Formant values of the frames.
+    - sample_times (np.ndarray): Instants where the formants are wanted.
+
+    Returns:
+    - tuple: Arrays (f1, f2) at `sample_times`.
+    """
+    sample_times = np.asarray(sample_times, dtype=np.float64)
+    if len(times) == 0:
+        empty = np.full(len(sample_times), np.nan)
+        return empty, empty.copy()
+    return (np.interp(sample_times, times, f1, left=np.nan, right=np.nan),
+            np.interp(sample_times, times, f2, left=np.nan, right=np.nan))
+
+
+def formant_statistics(f1, f2, percentiles=DEFAULT_PERCENTILES):
+    """
+    Summarises F1 and F2 values, ignoring undefined (NaN) values.
+
+    Parameters:
+    - f1, f2 (np.ndarray): Formant values in Hertz.
+    - percentiles (tuple): Percentiles to report.
+
+    Returns:
+    - dict: For "F1" and "F2", the count of defined values, min, max, mean and the requested percentiles.
+      Formants without defined values get None.
+    """
+    values = np.vstack((f1, f2))
+    counts = (~np.isnan(values)).sum(axis=1)
+    with warnings.catch_warnings():
+        # A formant without defined values gives an all-NaN row; it is reported as None below.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        minimum = np.nanmin(values, axis=1) if values.shape[1] else np.full(2, np.nan)
+        maximum = np.nanmax(values, axis=1) if values.shape[1] else np.full(2, np.nan)
+        mean = np.nanmean(values, axis=1) if values.shape[1] else np.full(2, np.nan)
+        quantiles = (np.nanpercentile(values, percentiles, axis=1) if values.shape[1]
+                     else np.full((len(percentiles), 2), np.nan))
+
+    statistics = {}
+    for row, name in enumerate(("F1", "F2")):
+        if counts[row] == 0:
+            statistics[name] = None
+            continue
+        row_percentiles = quantiles[:, row]
+        statistics[name] = {
+            "count": int(counts[row]),
+            "min": float(minimum[row]),
+            "max": float(maximum[row]),
+            "mean": float(mean[row]),
+            **{f"p{percentile:g}": float(value) for percentile, value in zip(percentiles, row_percentiles)},
+        }
+    return statistics
+
+
+def analyze_segment(path, start=None, end=None, points_per_second=1000, maximum_formant=5500.0):
+    """
+    Samples F1 and F2 of an audio file between two instants.
+
+    Parameters:
+    - path (str): The path to the audio file.
+    - start (float): Start of the analysed range in seconds. Defaults to the start of the audio.
+    - end (float): End of the analysed range in seconds. Defaults to the end of the audio.
+    - points_per_second (int): Density of the sampled instants.
+    - maximum_formant (float): Ceiling of the formant search range in Hertz.
+
+    Returns:
+    - tuple: Arrays (sample_times, f1, f2).
+    """
+    sound = parselmouth.Sound(path)
+    start = 0.0 if start is None else start
+    end = sound.get_total_duration() if end is None else end
+    times, f1, f2 = formant_tracks(sound, maximum_formant=maximum_formant)
+    sample_times = np.linspace(start, end, max(int((end - start) * points_per_second), 1))
+    return (sample_times,) + sample_formants(times, f1, f2, sample_times)
+
+
+def _analyze_item(item):
+    """
+    Worker of `analyze_vowels`: returns the vowel of a manifest item and its sampled formants.
+    """
+    _, f1, f2 = analyze_segment(item["path"], item.get("start"), item.get("end"),
+                                item.get("points_per_second", 1000), item.get("maximum_formant", 5500.0))
+    return item["vowel"], f1, f2
+
+
+def analyze_vowels(items, workers=None, percentiles=DEFAULT_PERCENTILES):
+    """
+    Builds the vowel-space statistics of a set of recordings, analysing the files in parallel processes.
+
+    Parameters:
+    - items (list): Dictionaries with the 'vowel' and the 'path' of each recording, and optionally the 'start'
+      and 'end' of the vowel in seconds, 'points_per_second' and 'maximum_formant' (per speaker).
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+    - percentiles (tuple): Percentiles to report.
+
+    Returns:
+    - dict: The statistics of each vowel (see `formant_statistics`), pooling all the recordings of the vowel.
+    """
+    samples = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for vowel, f1, f2 in executor.map(_analyze_item, items):
+            samples.setdefault(vowel, ([], []))
+            samples[vowel][0].append(f1)
+            samples[vowel][1].append(f2)
+    return {vowel: formant_statistics(np.concatenate(f1), np.concatenate(f2), percentiles)
+            for vowel, (f1, f2) in samples.items()}
+
+
+def read_manifest(manifest_path):
+    """
+    Reads the recordings to analyse from a manifest. Relative paths are relative to the manifest.
+
+    Two formats are accepted:
+    - JSON: {"a": {"path": ..., "start": 1, "end": 8.3}, ...}, with a list of such objects per vowel for several
+      recordings (the keys "archivo", "inicio" and "fin" of the former scripts are also read).
+    - JSONL: one {"vowel": ..., "path": ..., "start": ..., "end": ...} object per line.
+
+    Parameters:
+    - manifest_path (str): Path of the manifest.
+
+    Returns:
+    - list: The items for `analyze_vowels`.
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding="utf-8") as manifest:
+        if manifest_path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in manifest if line.strip()]
+        else:
+            entries = []
+            for vowel, specs in json.load(manifest).items():
+                for spec in specs if isinstance(specs, list) else [specs]:
+                    entries.append({"vowel": vowel, **spec})
+
+    items = []
+    for entry in entries:
+        path = entry.get("path", entry.get("archivo"))
+        items.append({
+            "vowel": entry["vowel"],
+            "path": path if os.path.isabs(path) else os.path.join(base, path),
+            "start": entry.get("start", entry.get("inicio")),
+            "end": entry.get("end", entry.get("fin")),
+            **{key: entry[key] for key in ("points_per_second", "maximum_formant") if key in entry},
+        })
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute F1/F2 statistics per vowel over a set of recordings.")
+    parser.add_argument("manifest", help="JSON or JSONL manifest with the vowel, path and range of each recording")
+    parser.add_argument("-o", "--output", default="results/formant_statistics.json", help="Output JSON file")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("-p", "--percentiles", type=float, nargs="+", default=list(DEFAULT_PERCENTILES),
+                        help="Percentiles to report")
+    args = parser.parse_args(argv)
+
+    statistics = analyze_vowels(read_manifest(args.manifest), args.workers, tuple(args.percentiles))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(statistics, output, indent=4)
+    print(f"Statistics of {len(statistics)} vowels saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,54 @@
-import parselmouth
-import numpy as np
+import argparse
 import json
+import os
 
-# Rutas a los archivos de audio y rangos de tiempo para cada vocal
+from .formant_analysis import analyze_vowels, read_manifest
+
+# Archivos de audio y rangos de tiempo por defecto para cada vocal (relativos a la raíz del repositorio)
 vocales_info = {
-    "a": {"archivo": "/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/a_voice.wav", "inicio": 1, "fin": 8.3},
-    "e": {"archivo": "/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/e.wav", "inicio": 1, "fin": 8.3},
-    "i": {"archivo": "/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/i.wav", "inicio": 1, "fin": 9},
-    "o": {"archivo": "/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/o.wav", "inicio": 1.3, "fin": 6},
-    "u": {"archivo": "/home/andromeda/freelancer/AudioPhoneticsLab/test_audios/u.wav", "inicio": 1.5, "fin": 7.5}
+    "a": {"archivo": "test_audios/a_voice.wav", "inicio": 1, "fin": 8.3},
+    "e": {"archivo": "test_audios/e.wav", "inicio": 1, "fin": 8.3},
+    "i": {"archivo": "test_audios/i.wav", "inicio": 1, "fin": 9},
+    "o": {"archivo": "test_audios/o.wav", "inicio": 1.3, "fin": 6},
+    "u": {"archivo": "test_audios/u.wav", "inicio": 1.5, "fin": 7.5}
 }
 
-# Diccionario para guardar los resultados
-resultados = {}
-
-for vocal, info in vocales_info.items():
-    snd = parselmouth.Sound(info["archivo"])
-    formants = snd.to_formant_burg()
-    
-    # Crear array de tiempos dentro del rango especificado
-    times = np.linspace(info["inicio"], info["fin"], int((info["fin"] - info["inicio"]) * 1000))
-
-    # Obtener los valores de F1 y F2
-    f1_values = [formants.get_value_at_time(1, time) for time in times]
-    f2_values = [formants.get_value_at_time(2, time) for time in times]
-
-    # Filtrar y obtener los valores máximos y mínimos
-    f1_max = np.nanmax(f1_values)
-    f1_min = np.nanmin(f1_values)
-    f2_max = np.nanmax(f2_values)
-    f2_min = np.nanmin(f2_values)
-
-    # Guardar los resultados
-    resultados[vocal] = {
-        "F1_max": f1_max,
-        "F1_min": f1_min,
-        "F2_max": f2_max,
-        "F2_min": f2_min
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Máximos y mínimos de F1 y F2 por vocal.")
+    parser.add_argument("manifest", nargs="?", help="Manifiesto JSON/JSONL (ver formant_analysis.read_manifest); "
+                                                    "por defecto, los archivos de vocales_info")
+    parser.add_argument("-o", "--output", default="results/results_max_min_frecuency_per_vocal.json")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos en paralelo")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        items = read_manifest(args.manifest)
+    else:
+        items = [{"vowel": vocal, "path": info["archivo"], "start": info["inicio"], "end": info["fin"]}
+                 for vocal, info in vocales_info.items()]
+
+    # Los formantes de todos los archivos se extraen en paralelo, una sola vez por archivo
+    estadisticas = analyze_vowels(items, args.workers)
+
+    # Diccionario para guardar los resultados
+    resultados = {
+        vocal: {
+            "F1_max": stats["F1"]["max"] if stats["F1"] else None,
+            "F1_min": stats["F1"]["min"] if stats["F1"] else None,
+            "F2_max": stats["F2"]["max"] if stats["F2"] else None,
+            "F2_min": stats["F2"]["min"] if stats["F2"] else None
+        }
+        for vocal, stats in estadisticas.items()
     }
 
-# Guardar los resultados en un archivo JSON
-with open('/home/andromeda/freelancer/AudioPhoneticsLab/results/results_max_min_frecuency_per_vocal.json', 'w') as fp:
-    json.dump(resultados, fp, indent=4)
+    # Guardar los resultados en un archivo JSON
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w') as fp:
+        json.dump(resultados, fp, indent=4)
+
+    print(f"Análisis completado y guardado en '{args.output}'")
+
 
-print("Análisis completado y guardado en 'resultados_formantes.json'")
+if __name__ == "__main__":
+    main()
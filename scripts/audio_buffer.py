@@ -0,0 +1,264 @@
+# Standard library imports
+import math
+import subprocess
+
+# Third-party library imports
+import numpy as np
+
+# Sample rate used by the whole pipeline. Whisper expects 16 kHz audio (whisper.audio.SAMPLE_RATE), so decoding
+# directly to this rate means the samples never have to be resampled again.
+SAMPLE_RATE = 16000
+
+
+def _ffmpeg_command(audio_path, sample_rate):
+    """
+    Returns the ffmpeg command decoding a file to mono 16-bit PCM on stdout, as whisper.audio.load_audio does.
+    """
+    return ["ffmpeg", "-nostdin", "-threads", "0", "-i", audio_path, "-f", "s16le", "-ac", "1",
+            "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"]
+
+
+def resampling_factors(source_rate, target_rate):
+    """
+    Returns the (up, down) integer factors of a polyphase resampling from `source_rate` to `target_rate`.
+    """
+    source_rate, target_rate = int(round(source_rate)), int(round(target_rate))
+    divisor = math.gcd(source_rate, target_rate)
+    return target_rate // divisor, source_rate // divisor
+
+
+def resample(samples, source_rate, target_rate):
+    """
+    Resamples a mono signal with a polyphase FIR filter (scipy.signal.resample_poly), which removes the
+    frequencies above the new Nyquist frequency before downsampling instead of folding them into the speech band.
+
+    Parameters:
+    - samples (np.ndarray): Mono float32 samples.
+    - source_rate (int): Sample rate of the input samples.
+    - target_rate (int): Desired sample rate.
+
+    Returns:
+    - np.ndarray: The resampled float32 samples, ceil(len(samples) * target_rate / source_rate) of them.
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    # scipy.signal takes most of a second to import, so it is only imported when a signal has to be resampled
+    from scipy.signal import resample_poly
+    up, down = resampling_factors(source_rate, target_rate)
+    return resample_poly(samples, up, down).astype(np.float32)
+
+
+class StreamResampler:
+    """
+    Resamples a live signal chunk by chunk with the same polyphase filter as `resample`.
+
+    Chunks are not resampled on their own: the input keeps a little context before and after each output sample,
+    so the concatenated output equals `resample` applied to the whole signal and the output timeline follows the
+    total input sample count instead of accumulating a rounding per chunk.
+    """
+
+    def __init__(self, source_rate, target_rate):
+        """
+        Parameters:
+        - source_rate (int): Sample rate of the input chunks.
+        - target_rate (int): Desired sample rate.
+        """
+        self.up, self.down = resampling_factors(source_rate, target_rate)
+        # Half length of the resample_poly filter in input samples, rounded up to whole blocks of `down` samples
+        # so the kept input always starts on an output sample
+        half_length = math.ceil(10 * max(self.up, self.down) / self.up) + 1
+        self._margin = math.ceil(half_length / self.down) * self.down
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._start = 0  # Absolute index of the first input sample in the buffer, a multiple of `down`.
+        self._input_count = 0
+        self.output_count = 0
+
+    def _emit(self, end):
+        if self.up == self.down:
+            output = self._buffer[self.output_count - self._start:end - self._start]
+        else:
+            from scipy.signal import resample_poly
+            first = self._start // self.down * self.up  # Absolute index of the first output of the buffer.
+            output = resample_poly(self._buffer, self.up, self.down)[self.output_count - first:end - first]
+        output = output.astype(np.float32)
+        self.output_count += len(output)
+        # Keep the input still needed by the next outputs, starting on a multiple of `down`
+        keep_from = max(self.output_count * self.down // self.up - self._margin, 0) // self.down * self.down
+        if keep_from > self._start:
+            self._buffer = self._buffer[keep_from - self._start:]
+            self._start = keep_from
+        return output
+
+    def feed(self, samples):
+        """
+        Adds a chunk of input and returns the output samples it completes.
+
+        Parameters:
+        - samples (np.ndarray): Mono float32 samples at the source rate.
+
+        Returns:
+        - np.ndarray: The new float32 samples at the target rate.
+        """
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float32)))
+        self._input_count += len(samples)
+        # Outputs whose filter support lies entirely in the input received so far
+        ready = max((self._input_count - self._margin) * self.up // self.down, self.output_count)
+        return self._emit(ready)
+
+    def flush(self):
+        """
+        Returns the remaining output samples, once the input has ended.
+        """
+        return self._emit(-(-self._input_count * self.up // self.down))
+
+
+def integer_to_float(samples):
+    """
+    Scales integer PCM samples to float32 in [-1, 1) like ffmpeg and whisper.audio.load_audio: signed samples are
+    divided by 2 ** (bits - 1) (32768 for 16-bit), unsigned samples are centred on their midpoint first.
+
+    Parameters:
+    - samples (np.ndarray): Integer samples.
+
+    Returns:
+    - np.ndarray: The float32 samples.
+    """
+    info = np.iinfo(samples.dtype)
+    if info.min < 0:
+        return (samples / -float(info.min)).astype(np.float32)
+    midpoint = (info.max + 1) / 2
+    return ((samples - midpoint) / midpoint).astype(np.float32)
+
+
+class AudioBuffer:
+    """
+    Decoded audio shared by every stage of the mora pipeline.
+
+    Holds a mono float32 signal in the range [-1, 1] at a single sample rate, so the audio is decoded (and resampled)
+    once per request and then handed to transcription, pitch analysis and duration calculations.
+    """
+
+    def __init__(self, samples, sample_rate=SAMPLE_RATE):
+        """
+        Parameters:
+        - samples (np.ndarray): Mono float32 samples in the range [-1, 1].
+        - sample_rate (int): Sample rate of the samples in Hz.
+        """
+        self.samples = samples
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_file(cls, audio_path, sample_rate=SAMPLE_RATE):
+        """
+        Decodes an audio file with a single ffmpeg call, mixing it down to mono and resampling it.
+
+        Parameters:
+        - audio_path (str): The path to the audio file.
+        - sample_rate (int): Sample rate of the decoded samples. Defaults to the Whisper sample rate.
+
+        Returns:
+        - AudioBuffer: The decoded audio.
+        """
+        # Same decoding as whisper.audio.load_audio, without importing whisper and torch
+        try:
+            output = subprocess.run(_ffmpeg_command(audio_path, sample_rate), capture_output=True, check=True).stdout
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+        return cls(np.frombuffer(output, np.int16).astype(np.float32) / 32768.0, sample_rate)
+
+    @classmethod
+    def from_array(cls, samples, sample_rate, target_rate=SAMPLE_RATE):
+        """
+        Builds an audio buffer from samples that are already in memory.
+
+        Integer samples are scaled to [-1, 1) as `from_file` does (see `integer_to_float`), multichannel audio with shape (frames, channels) is averaged to mono
+        and the result is resampled to `target_rate`.
+
+        Parameters:
+        - samples (np.ndarray): The samples, either 1-D (mono) or 2-D with shape (frames, channels).
+        - sample_rate (int): Sample rate of the samples in Hz.
+        - target_rate (int): Sample rate of the buffer. Defaults to the Whisper sample rate.
+
+        Returns:
+        - AudioBuffer: The audio, ready for the pipeline.
+        """
+        samples = np.asarray(samples)
+        if np.issubdtype(samples.dtype, np.integer):
+            samples = integer_to_float(samples)
+        else:
+            samples = samples.astype(np.float32, copy=False)
+        if samples.ndim == 2:
+            samples = samples.mean(axis=1, dtype=np.float32)
+        return cls(resample(samples, sample_rate, target_rate), target_rate)
+
+    @property
+    def duration(self):
+        """
+        float: Duration of the audio in seconds.
+        """
+        return len(self.samples) / self.sample_rate
+
+    def segment(self, start, end):
+        """
+        Returns the samples between two instants, without copying them.
+
+        Parameters:
+        - start (float): Start of the segment in seconds.
+        - end (float): End of the segment in seconds.
+
+        Returns:
+        - np.ndarray: A view over the samples of the segment.
+        """
+        start_index = max(int(start * self.sample_rate), 0)
+        end_index = max(int(end * self.sample_rate), start_index)
+        return self.samples[start_index:end_index]
+
+
+def load_audio(audio):
+    """
+    Returns an AudioBuffer for the given audio, decoding it only if it is a path.
+
+    Parameters:
+    - audio (AudioBuffer or str): An already decoded buffer or the path to an audio file.
+
+    Returns:
+    - AudioBuffer: The decoded audio.
+    """
+    if isinstance(audio, AudioBuffer):
+        return audio
+    return AudioBuffer.from_file(audio)
+
+
+def stream_audio(audio, block_seconds=10.0, sample_rate=SAMPLE_RATE):
+    """
+    Yields an audio as consecutive blocks of mono float32 samples, without holding the whole signal in memory.
+
+    Files are decoded by a single ffmpeg process whose output is read block by block.
+
+    Parameters:
+    - audio (AudioBuffer or str): An already decoded buffer or the path to an audio file.
+    - block_seconds (float): Duration of each block in seconds (the last one may be shorter).
+    - sample_rate (int): Sample rate of the decoded samples when `audio` is a path.
+
+    Yields:
+    - np.ndarray: The samples of each block.
+    """
+    if isinstance(audio, AudioBuffer):
+        block_size = int(block_seconds * audio.sample_rate)
+        for start in range(0, len(audio.samples), block_size):
+            yield audio.samples[start:start + block_size]
+        return
+
+    process = subprocess.Popen(_ffmpeg_command(audio, sample_rate), stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    block_bytes = int(block_seconds * sample_rate) * 2
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 2], np.int16).astype(np.float32) / 32768.0
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
@@ -1,19 +1,22 @@
-import whisper
 import requests
 import json
 
+from .model_registry import get_model
+from .voicevox_client import get_voicevox_client
+
 # Function to transcribe audio to text
-def transcribe_audio_to_text(audio_path):
+def transcribe_audio_to_text(audio_path, model_name="default"):
     """
     Transcribes audio to text using the Whisper model.
 
     Args:
     - audio_path (str): The file path to the audio file to be transcribed.
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
 
     Returns:
     - str: The transcribed text.
     """
-    model = whisper.load_model("base")  # Load the base Whisper model
+    model = get_model(model_name)  # Reuse the model loaded by the registry
     result = model.transcribe(audio_path)
     print(result)
     return result["text"]
@@ -30,15 +33,11 @@ def generate_voicevox_audio_query(text, speaker_id=1):
     Returns:
     - dict: The audio query response from VOICEVOX, or None if an error occurs.
     """
-    voicevox_url = "http://127.0.0.1:50021/audio_query"
-    params = {
-        "text": text,
-        "speaker": speaker_id
-    }
-    response = requests.post(voicevox_url, params=params)
-    if response.status_code == 200:
-        return response.json()
-    else:
+    # Pooled keep-alive session with timeout, retries and cache (see scripts/voicevox_client.py)
+    try:
+        return get_voicevox_client().audio_query(text, speaker_id)
+    except requests.RequestException as e:
+        print("VOICEVOX request failed:", e)
         return None
 
 # Main function
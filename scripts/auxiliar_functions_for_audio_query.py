@@ -1,65 +1,39 @@
-import json
-import os
+import threading
+from collections import OrderedDict
 
-import aubio
-import numpy as np
-from pydub import AudioSegment
-import pykakasi 
+from .audio_buffer import load_audio
+from .pitch_engine import compute_pitch_track
+from .mora_mapping import MoraTable, load_mora_table, split_moras
+from .timing_engine import MoraTimeline
 
 
-def calculate_pitch(audio_path, symbols, sample_rate=24000):
+def calculate_pitch(audio, symbols, pitch_track=None):
     """
-    Calculates the average pitch for each symbol in a provided list, using the specified audio file.
+    Calculates the average pitch for each symbol in a provided list, using the specified audio.
     
-    This function processes an audio file to determine the pitch of individual symbols (e.g., phonemes, letters)
-    within specified time intervals. It uses the Aubio library to analyze pitch values and updates each symbol
-    with its average pitch.
+    The pitch is read from the F0 contour of the whole utterance, so the pitch detector runs once per audio
+    instead of once per symbol. Pass the same `pitch_track` for every word of an utterance to reuse it.
     
     Parameters:
-    - audio_path (str): The path to the audio file to be analyzed.
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file to be analyzed.
     - symbols (list): A list of dictionaries, each representing a symbol with 'start' and 'end' keys indicating
       the time interval for pitch analysis.
-    - sample_rate (int): The sample rate to be used for pitch analysis. Defaults to 24000 Hz, which is adequate
-      for most applications.
+    - pitch_track (PitchTrack): The pitch contour of the audio. Computed from `audio` if not provided.
     
     Returns:
     - list: The input list of symbols, updated with a 'pitch' key for each symbol representing its average pitch
-      in Hertz.
+      in kHz.
     """
-    audio = AudioSegment.from_file(audio_path)  # Load the audio file using PyDub.
-    pitch_detector = aubio.pitch("default", 2048, 512, sample_rate)  # Initialize the Aubio pitch detector.
-    pitch_detector.set_unit("Hz")  # Set the unit of pitch detection to Hertz.
-    pitch_detector.set_tolerance(0.8)  # Set the tolerance for pitch detection.
+    if pitch_track is None:
+        pitch_track = compute_pitch_track(audio)  # Analyze the whole audio in a single pass.
 
-    for symbol in symbols:
-        # Convert symbol start and end times from seconds to milliseconds.
-        start_ms = int(symbol["start"] * 1000)
-        end_ms = int(symbol["end"] * 1000)
-        segment = audio[start_ms:end_ms]  # Extract the audio segment for the current symbol.
-        samples = np.array(segment.get_array_of_samples())  # Get the raw audio samples as a NumPy array.
-
-        # Convert samples to float32, as required by Aubio for pitch analysis.
-        samples_float = samples.astype(np.float32)
-        # If the audio segment is stereo, convert it to mono by averaging the two channels.
-        if segment.channels == 2:
-            samples_float = np.mean(samples_float.reshape((-1, 2)), axis=1)
-
-        pitch_list = []  # Initialize a list to hold pitch values for the segment.
-
-        # Analyze pitch for each frame within the segment.
-        buffer_size = 512  # Define the buffer size for pitch analysis.
-        hop_size = buffer_size // 2  # Define the hop size (50% overlap between frames).
-        for i in range(0, len(samples_float) - buffer_size, hop_size):
-            frame = samples_float[i:i+buffer_size]  # Extract the current frame.
-            pitch = pitch_detector(frame)[0]  # Detect pitch for the current frame.
-            if pitch > 0:  # Exclude frames with no detectable pitch.
-                pitch_list.append(pitch)
-
-        # Calculate the average pitch for the segment, or set to 0 if no pitch was detected.
-        avg_pitch = sum(pitch_list) / len(pitch_list) if pitch_list else 0
+    # Average the voiced frames of every symbol at once.
+    mean_pitch = pitch_track.mean_pitch([symbol["start"] for symbol in symbols],
+                                        [symbol["end"] for symbol in symbols])
 
+    for symbol, avg_pitch in zip(symbols, mean_pitch):
         # Update the current symbol with its average pitch.
-        symbol["pitch"] = round(avg_pitch/1000, 7) # The final units are kHz.
+        symbol["pitch"] = round(float(avg_pitch)/1000, 7) # The final units are kHz.
 
     return symbols  # Return the updated list of symbols with pitch information.
 
@@ -67,8 +41,9 @@ def calculate_pitch(audio_path, symbols, sample_rate=24000):
 def distribute_time_equally(start, end, text, decimals=4):
     """
     This function distributes the time evenly among the symbols of a given text. It specifically handles
-    Japanese punctuation symbols by either grouping them with the preceding or following symbol to ensure
-    that time allocation reflects natural speech patterns. Additionally, it checks for interrogative symbols
+    Japanese punctuation symbols by either grouping them with the preceding or following symbol, and small kana
+    by grouping them with the preceding kana (e.g. キョ), to ensure that time allocation reflects natural speech
+    patterns. Additionally, it checks for interrogative symbols
     to mark symbols as part of a question.
 
     Parameters:
@@ -81,31 +56,8 @@ def distribute_time_equally(start, end, text, decimals=4):
     - list: A list of dictionaries, each containing details about the symbol, its start and end time within
       the audio segment, its duration, and whether it is part of an interrogative segment (question).
     """
-    # List of Japanese punctuation symbols that may affect how time is distributed among symbols.
-    punctuation_symbols = ['ー', 'ッ', '゜', '゛', '?', '。', '、', '「', '」', '『', '』', '（', '）', '・', 'ゝ', 'ゞ', 'ヽ', 'ヾ']
-
-    # Initialize the list to store the processed symbols and their time allocations.
-    grouped_symbols = []
-    i = 0  # Index to keep track of the current position in the text.
-    
-    # Handle the case where the first symbol is a punctuation that should be grouped with the following symbol.
-    if text[0] in punctuation_symbols and len(text) > 1:
-        grouped_symbols.append(text[0] + text[1])  # Group the first symbol with the next one.
-        i = 2  # Move the index past the grouped symbols.
-    
-    # Iterate through the text to group symbols as needed.
-    while i < len(text):
-        current_symbol = text[i]  # The current symbol being processed.
-        # Determine the next symbol if it exists, otherwise set it to an empty string.
-        next_symbol = text[i + 1] if i + 1 < len(text) else ""
-        
-        # Check if the current symbol or the next symbol is a punctuation symbol.
-        if next_symbol in punctuation_symbols:
-            grouped_symbols.append(current_symbol + next_symbol)  # Group them together.
-            i += 2  # Skip the next symbol as it has been grouped with the current one.
-        else:
-            grouped_symbols.append(current_symbol)  # No grouping needed; add the symbol as is.
-            i += 1  # Move to the next symbol.
+    # Group the symbols that are timed as a single mora.
+    grouped_symbols = split_moras(text)
     
     # Calculate the total duration of the segment and the duration per grouped symbol.
     duration = end - start
@@ -133,41 +85,35 @@ def add_consonant_vowel_info(symbols, mapping_file):
     """
     Enriches each symbol in the provided list with consonant and vowel information based on a mapping file.
     
-    This function reads a mapping from the given JSON file, which associates each symbol with its corresponding
-    consonant and vowel components. It then updates each symbol dictionary in the list with this phonetic information.
+    The mapping is compiled once into a MoraTable (see `scripts.mora_mapping`) and reused for every call, so
+    the file is only read again when it changes. Multi-kana moras such as キョ are resolved as a single mora.
     If a symbol is punctuation or not found in the mapping, its consonant and vowel values are set to None.
     
     Parameters:
     - symbols (list): A list of dictionaries, each representing a symbol with 'text', and potentially other keys.
-    - mapping_file (str): Path to the JSON file containing the consonant and vowel mapping for symbols.
+    - mapping_file (str or MoraTable): Path to the JSON file containing the consonant and vowel mapping for
+      symbols, or an already compiled table.
     
     Returns:
     - list: The same list of symbols, but updated to include 'consonant' and 'vowel' keys for each symbol.
     """
-    # Define punctuation symbols that do not have consonant/vowel information.
-    punctuation_symbols = ['ー', 'ッ', '゜', '゛', '?', '。', '、', '「', '」', '『', '』', '（', '）', '・', 'ゝ', 'ゞ', 'ヽ', 'ヾ']
+    table = mapping_file if isinstance(mapping_file, MoraTable) else load_mora_table(mapping_file)
 
     # Check if the mapping file exists, warn and proceed with null values if not.
-    if not os.path.exists(mapping_file):
+    if table is None:
         print(f"Mapping file {mapping_file} does not exist. Adding null for consonant and vowel.")
         for symbol in symbols:
             symbol["consonant"] = None
             symbol["vowel"] = None
         return symbols  # Return the symbols list early if the mapping file is missing.
 
-    # Load the mapping from the JSON file.
-    with open(mapping_file, 'r', encoding='utf-8') as file:
-        mapping = json.load(file)
-
     # Iterate over each symbol to add consonant and vowel information.
     for symbol in symbols:
-        # Remove any punctuation from the symbol's text before looking it up in the mapping.
-        symbol_without_punctuation = ''.join([char for char in symbol["text"] if char not in punctuation_symbols])
-        # Fetch the symbol's phonetic information from the mapping, defaulting to an empty dict.
-        char_info = mapping.get(symbol_without_punctuation.strip(), {})
+        # Fetch the symbol's phonetic information, ignoring its punctuation.
+        char_info = table.lookup(symbol["text"])
         # Update the symbol with its consonant and vowel information, defaulting to None if not found.
-        symbol["consonant"] = char_info.get("consonant", None)
-        symbol["vowel"] = char_info.get("vowel", None)
+        symbol["consonant"] = char_info.consonant if char_info else None
+        symbol["vowel"] = char_info.vowel if char_info else None
     
     return symbols  # Return the updated list of symbols with added phonetic information.
 
@@ -222,32 +168,100 @@ def time_for_vowels_and_consonants(symbols):
 
 # Translate the kanji  into hiragana
 
+_kana_converter = None  # pykakasi converter, built on first use and shared by every call.
+_kana_converter_lock = threading.Lock()
+# Converted texts, least recently used first.
+_kana_memo = OrderedDict()
+_KANA_MEMO_SIZE = 8192
+# Joins the texts converted in one call of the converter.
+_KANA_SEPARATOR = "\n"
+
+
+def _get_kana_converter():
+    """
+    Returns the shared pykakasi converter, building it the first time it is needed.
+
+    pykakasi loads its dictionaries when the converter is constructed, so it is built only once per process. It is
+    also imported here, so the timing helpers of this module can be used without loading it.
+
+    Returns:
+    - The pykakasi converter.
+    """
+    global _kana_converter
+    with _kana_converter_lock:
+        if _kana_converter is None:
+            import pykakasi
+            kakasi = pykakasi.kakasi()
+
+            # Set the conversion mode to convert to Kanji
+            kakasi.setMode('H', 'K')  # Convert Hiragana to Kanji
+            kakasi.setMode('K', 'K')  # Keep Katakana as Katakana
+            kakasi.setMode('J', 'K')  # Convert Japanese (Kanji and Hiragana) to Kanji
+
+            # Create a converter
+            _kana_converter = kakasi.getConverter()
+        return _kana_converter
+
+
 def text_to_kanji(text):
     """
     Detects the language of the input text and converts it to Kanji if it is Japanese.
 
+    Results are memoized, so repeated words (particles, fillers...) are converted only once.
+
     Parameters:
     - text (str): The text to analyze and possibly convert.
 
     Returns:
     - str: The original text if it's not Japanese, or the converted text in Kanji if it is Japanese.
     """
-    
-    kakasi = pykakasi.kakasi()
+    return texts_to_kanji([text])[0]
 
-    # Set the conversion mode to convert to Kanji
-    kakasi.setMode('H', 'K')  # Convert Hiragana to Kanji
-    kakasi.setMode('K', 'K')  # Keep Katakana as Katakana
-    kakasi.setMode('J', 'K')  # Convert Japanese (Kanji and Hiragana) to Kanji
 
-    # Create a converter
-    converter = kakasi.getConverter()
+def texts_to_kanji(texts):
+    """
+    Converts several texts at once, e.g. all the words of a transcription.
 
-    # Convert the input text to Kanji
-    kanji_text = converter.do(text)
-    
-    return kanji_text
-    
+    The texts that are not memoized yet are joined with line breaks and converted in a single call of the shared
+    converter (line breaks separate words for pykakasi, so every text converts as it would alone). Each distinct
+    text is converted a single time, however many times it appears, and the results are memoized.
+
+    Parameters:
+    - texts (iterable): The texts to convert.
+
+    Returns:
+    - list: The converted texts, in the same order as `texts`.
+    """
+    texts = list(texts)
+    converter = _get_kana_converter()
+    converted = {}
+    # The converter keeps state between calls, so calls are serialized
+    with _kana_converter_lock:
+        for text in dict.fromkeys(texts):
+            if text in _kana_memo:
+                _kana_memo.move_to_end(text)
+                converted[text] = _kana_memo[text]
+        missing = [text for text in dict.fromkeys(texts) if text not in converted]
+        batch = [text for text in missing if _KANA_SEPARATOR not in text]
+        results = converter.do(_KANA_SEPARATOR.join(batch)).split(_KANA_SEPARATOR) if batch else []
+        if len(results) != len(batch):
+            results = [converter.do(text) for text in batch]
+        converted.update(zip(batch, results))
+        # Texts that contain the separator themselves are converted one by one
+        converted.update((text, converter.do(text)) for text in missing if _KANA_SEPARATOR in text)
+        for text in missing:
+            _kana_memo[text] = converted[text]
+        while len(_kana_memo) > _KANA_MEMO_SIZE:
+            _kana_memo.popitem(last=False)
+    return [converted[text] for text in texts]
+
+
+def clear_kana_memo():
+    """
+    Forgets the memoized conversions of `texts_to_kanji`, e.g. to measure the conversion itself.
+    """
+    with _kana_converter_lock:
+        _kana_memo.clear()
 
 
 def calculate_total_vowel_and_pause_time(audio_query): 
@@ -260,25 +274,16 @@ def calculate_total_vowel_and_pause_time(audio_query):
     Returns: 
     - float: El tiempo total en segundos de las vocales y las pausas no nulas. 
     """ 
-    total_time = 0.0 
-
-    for phrase in audio_query['accent_phrases']: 
-        for mora in phrase['moras']: 
-        # Sum the duration of the vowels        
-            total_time += mora['vowel_consonant_length']
-        if phrase['pause_mora'] is not None:
-            # Sum the duration of the pause
-            total_time += phrase['pause_mora']['vowel_length']
-            if phrase['pause_mora']['consonant_length'] is not None:
-                total_time += phrase['pause_mora']['consonant_length']  
-    # Sum the duration of the final pause
-    total_time += audio_query['final_pause'] if audio_query['final_pause'] is not None else 0
-    return total_time 
+    # Sum the moras, the pauses and the final pause as arrays
+    return MoraTimeline.from_audio_query(audio_query).total_time()
 
 def number_of_vowels_and_pauses(audio_query): 
     """
     Returns the number of vowels and pauses in the audio query.
 
+    Every mora counts once per key of its dictionary, every pause mora twice (plus its consonant, if it has
+    one) and the final pause once: this is the divisor `distribute_time_error_in_all_vowels_and_pauses` uses.
+
     Parameters:
     - audio_query (dict): A dictionary representing the JSON with the transcription and phonetic details.
 
@@ -286,79 +291,39 @@ def number_of_vowels_and_pauses(audio_query):
     - int: The number of vowels and pauses in the audio query.
 
     """
-    number = 0 
-
-    for phrase in audio_query['accent_phrases']: 
-        for mora in phrase['moras']: 
-            # Sum the number of vowels        
-            number += len(mora)
-        if phrase['pause_mora'] is not None:
-            # Sum the number of pauses
-            number += 1 
-        if phrase['pause_mora'] is not None:
-            # Sum the number of pauses for consonants if they are not None
-            number += 1
-            if phrase['pause_mora']['consonant_length'] is not None:
-                number += 1  
-    # Sum the number of the final pause
-    if audio_query['final_pause'] is not None:
-            number += 1
-    return number 
-
-def get_audio_duration(file_path): 
+    return MoraTimeline.from_audio_query(audio_query).count_timed_items()
+
+def get_audio_duration(audio): 
     """ 
-    Returns the duration of an audio file in seconds. 
+    Returns the duration of an audio in seconds. 
 
     Parameters: 
-    - file_path (str): Path to the audio file. 
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file. 
 
     Returns: 
-    - float: Duration of the audio file in seconds. 
+    - float: Duration of the audio in seconds. 
     """ 
-    # Load the audio file using PyDub.
-    audio = AudioSegment.from_file(file_path) 
-    duration_seconds = len(audio) / 1000.0 # AudioSegment.length is in milliseconds 
-    return duration_seconds 
+    # Reuse the decoded audio, decoding it only if a path was given.
+    return load_audio(audio).duration 
 
-def distribute_time_error_in_all_vowels_and_pauses(audio_query, audio_path):
+def distribute_time_error_in_all_vowels_and_pauses(audio_query, audio):
     """
     Distribute the error in the total time of the audio query in all the vowels and pauses.
 
     Parameters:
     - audio_query (dict): A dictionary representing the JSON with the transcription and phonetic details.
-    - audio_path (str): The path to the audio file.
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file.
 
     Returns:
     - dict: The input audio query
     """
-    # Total time of vowels and pauses
-    total_duration = calculate_total_vowel_and_pause_time(audio_query)
-
-    # Total time of the audio
-    audio_duration = get_audio_duration(audio_path)
-
-    # Calculate the error
-    error = audio_duration - total_duration
-
-    # Number of vowels and pauses
-    vowels_and_pauses = number_of_vowels_and_pauses(audio_query)
-
-    # Distribute the error in all the vowels and pauses
-    error_per_vowel_or_pause = error / vowels_and_pauses
+    # Read all the lengths into arrays once, shift them together and write them back
+    timeline = MoraTimeline.from_audio_query(audio_query)
+    error_per_vowel_or_pause = timeline.redistribute_error(get_audio_duration(audio))
 
     print("Error per vowel or pause:", error_per_vowel_or_pause)
 
-    # Distribute the error in all the vowels and pauses
-    for phrase in audio_query['accent_phrases']:
-        for mora in phrase['moras']:
-            mora['vowel_consonant_length'] = mora['vowel_consonant_length'] + error_per_vowel_or_pause if mora['vowel_consonant_length'] is not None else None
-            mora['vowel_length'] = mora['vowel_length'] + error_per_vowel_or_pause if mora['vowel_length'] is not None else None
-
-        if phrase['pause_mora'] is not None:
-            phrase['pause_mora']['vowel_length'] = phrase['pause_mora']['vowel_length'] + error_per_vowel_or_pause
-            if phrase['pause_mora']['consonant_length'] is not None:
-                phrase['pause_mora']['consonant_length'] = phrase['pause_mora']['consonant_length'] + error_per_vowel_or_pause
-    return audio_query
+    return timeline.apply_to(audio_query)
 
 # Example usage 
 if __name__ == "__main__": 
@@ -0,0 +1,260 @@
+# Standard library imports
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Local application imports
+from .audio_buffer import AudioBuffer
+from .model_registry import model_registry
+from .speech_symbol_timestamps import audio_query_json
+from .columnar import save_npz
+from .artifacts import ArtifactStore, incremental_audio_query
+
+# Extensions considered audio when a directory is given as input.
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aac", ".opus", ".webm")
+
+
+def collect_audio_files(inputs):
+    """
+    Expands the inputs of the batch command into a sorted list of audio files.
+
+    Parameters:
+    - inputs (list): Directories (searched recursively), glob patterns, audio files, or manifests (.txt with one
+      path per line, or .jsonl with a "path" key per line). Relative paths in a manifest are relative to it.
+
+    Returns:
+    - list: The unique paths of the audio files.
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+        elif item.endswith((".txt", ".jsonl")) and os.path.isfile(item):
+            base = os.path.dirname(item)
+            with open(item, encoding="utf-8") as manifest:
+                for line in manifest:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    path = json.loads(line)["path"] if item.endswith(".jsonl") else line
+                    files.append(path if os.path.isabs(path) else os.path.join(base, path))
+        elif os.path.isfile(item):
+            files.append(item)
+        else:
+            files.extend(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+    return sorted(set(files))
+
+
+def output_path_for(audio_path, output_dir, root=None, extension=".json"):
+    """
+    Returns the output path of an audio file, mirroring its location below `root`.
+
+    Parameters:
+    - audio_path (str): Path of the audio file.
+    - output_dir (str): Directory where the outputs are written.
+    - root (str): Common directory of the inputs. Defaults to the directory of the audio file.
+    - extension (str): Extension of the output file.
+
+    Returns:
+    - str: The path of the output.
+    """
+    relative = os.path.relpath(audio_path, root) if root else os.path.basename(audio_path)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + extension)
+
+
+def _init_worker(model_name, threads, load_model=True):
+    """
+    Initializer of the worker processes: limits torch to `threads` intra-op threads and loads the model once.
+
+    Parameters:
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
+    - threads (int): Number of intra-op threads of each worker.
+    - load_model (bool): Whether to load the model now. Incremental runs load it only if a file needs it.
+    """
+    import torch
+    torch.set_num_threads(threads)
+    if load_model:
+        model_registry.get(model_name)
+
+
+def _process_file(audio_path, mapping_file, model_name, language, artifacts_dir=None):
+    """
+    Runs the mora pipeline on one file inside a worker, reusing the artifacts of `artifacts_dir` if given.
+
+    Returns:
+    - tuple: (path, audio query or None, audio duration in seconds, error message or None).
+    """
+    try:
+        if artifacts_dir is not None:
+            result = incremental_audio_query(audio_path, ArtifactStore(artifacts_dir), mapping_file=mapping_file,
+                                             model_name=model_name, language=language)
+            return audio_path, result.audio_query, result.duration, None
+        audio = AudioBuffer.from_file(audio_path)
+        data = audio_query_json(audio, mapping_file=mapping_file, model_name=model_name, language=language,
+                                use_cache=False)
+        return audio_path, data, audio.duration, None
+    except Exception as e:
+        return audio_path, None, 0.0, f"{type(e).__name__}: {e}"
+
+
+def _write_output(path, data):
+    """
+    Writes a JSON or NPZ file atomically, so an interrupted run never leaves a partial output behind.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as output_file:
+        if path.endswith(".npz"):
+            save_npz(output_file, data)
+        else:
+            output_file.write(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+    os.replace(temporary_path, path)
+
+
+class _ShardWriter:
+    """
+    Appends results to numbered JSONL shards of at most `shard_size` lines, continuing after existing shards.
+    """
+
+    def __init__(self, output_dir, shard_size):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.done = set()
+        shards = sorted(glob.glob(os.path.join(output_dir, "shard-*.jsonl")))
+        for shard in shards:
+            with open(shard, encoding="utf-8") as lines:
+                for line in lines:
+                    try:
+                        self.done.add(json.loads(line)["path"])
+                    except (ValueError, KeyError):
+                        pass  # A line cut by an interrupted run; the file is processed again.
+        self._index = len(shards)
+        self._file = None
+        self._lines = 0
+
+    def write(self, audio_path, data):
+        if self._file is None or self._lines >= self.shard_size:
+            if self._file is not None:
+                self._file.close()
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._file = open(os.path.join(self.output_dir, f"shard-{self._index:05d}.jsonl"), "w", encoding="utf-8")
+            self._index += 1
+            self._lines = 0
+        self._file.write(json.dumps({"path": audio_path, "audio_query": data}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._lines += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def run_batch(inputs, output_dir, workers=1, threads_per_worker=1, output_format="json", shard_size=1000,
+              mapping_file="files/mapping.json", model_name="default", language="ja", artifacts_dir=None):
+    """
+    Runs the mora pipeline over many audio files with a pool of worker processes.
+
+    Each worker loads the model once and uses `threads_per_worker` torch threads, so `workers * threads_per_worker`
+    should not exceed the number of cores. Files whose output already exists are skipped, which makes interrupted
+    runs resumable.
+
+    With `artifacts_dir`, every file is processed again, but only the stages whose inputs changed are recomputed
+    (see `scripts.artifacts`): after a mapping update, the audio queries are rebuilt from the stored transcripts
+    and pitch contours without running Whisper. JSONL shards are only appended to, so files already in a shard
+    are still skipped.
+
+    Parameters:
+    - inputs (list): Directories, glob patterns, audio files or manifests (see `collect_audio_files`).
+    - output_dir (str): Directory where the results are written.
+    - workers (int): Number of worker processes.
+    - threads_per_worker (int): Number of torch intra-op threads of each worker.
+    - output_format (str): "json" for one JSON file per audio file, "npz" for one columnar NPZ file per audio
+      file (see `scripts.columnar`), "jsonl" for JSONL shards.
+    - shard_size (int): Number of results per JSONL shard.
+    - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
+    - language (str): Language of the audio.
+    - artifacts_dir (str): Directory of the intermediate artifacts, for incremental runs.
+
+    Returns:
+    - dict: Counts of processed, skipped and failed files, and the throughput of the run.
+    """
+    files = collect_audio_files(inputs)
+    extension = ".npz" if output_format == "npz" else ".json"
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files]) if files else None
+
+    shards = _ShardWriter(output_dir, shard_size) if output_format == "jsonl" else None
+    if shards is not None:
+        pending = [path for path in files if path not in shards.done]
+    elif artifacts_dir is not None:
+        pending = files
+    else:
+        pending = [path for path in files
+                   if not os.path.exists(output_path_for(os.path.abspath(path), output_dir, root, extension))]
+    print(f"{len(files)} files found, {len(files) - len(pending)} already done, {len(pending)} to process")
+
+    processed, failed, audio_seconds = 0, 0, 0.0
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_name, threads_per_worker, artifacts_dir is None)) as executor:
+            futures = [executor.submit(_process_file, path, mapping_file, model_name, language, artifacts_dir)
+                       for path in pending]
+            for future in as_completed(futures):
+                audio_path, data, duration, error = future.result()
+                if error is not None:
+                    failed += 1
+                    print(f"Failed: {audio_path}: {error}")
+                    continue
+                if shards is not None:
+                    shards.write(audio_path, data)
+                else:
+                    _write_output(output_path_for(os.path.abspath(audio_path), output_dir, root, extension), data)
+                processed += 1
+                audio_seconds += duration
+                elapsed = time.perf_counter() - start_time
+                print(f"[{processed + failed}/{len(pending)}] {audio_path} "
+                      f"({processed / elapsed:.2f} files/s, {audio_seconds / elapsed:.2f} audio s/s)")
+    finally:
+        if shards is not None:
+            shards.close()
+
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "processed": processed,
+        "skipped": len(files) - len(pending),
+        "failed": failed,
+        "wall_seconds": round(elapsed, 3),
+        "audio_seconds": round(audio_seconds, 3),
+        "files_per_second": round(processed / elapsed, 3) if elapsed else 0.0,
+        "real_time_factor": round(audio_seconds / elapsed, 3) if elapsed else 0.0,
+    }
+    print("Summary:", json.dumps(summary))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract moras from many audio files with a pool of workers.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns, audio files or manifests (.txt/.jsonl)")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory where the results are written")
+    parser.add_argument("-w", "--workers", type=int, default=max((os.cpu_count() or 1) // 2, 1),
+                        help="Number of worker processes")
+    parser.add_argument("-t", "--threads-per-worker", type=int, default=2, help="Torch threads of each worker")
+    parser.add_argument("--format", choices=["json", "npz", "jsonl"], default="json", dest="output_format",
+                        help="One JSON or NPZ file per audio file, or JSONL shards")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Results per JSONL shard")
+    parser.add_argument("--mapping-file", default="files/mapping.json", help="Consonant and vowel mapping")
+    parser.add_argument("--model", default="default", dest="model_name", help="Name of the registered Whisper model, e.g. int8 or fast for the quantized modes")
+    parser.add_argument("--language", default="ja", help="Language of the audio")
+    parser.add_argument("--artifacts", dest="artifacts_dir",
+                        help="Keep the transcripts and pitch contours here and recompute only what changed")
+    args = parser.parse_args(argv)
+    run_batch(**vars(args))
+
+
+if __name__ == "__main__":
+    main()
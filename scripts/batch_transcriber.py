@@ -0,0 +1,199 @@
+# Standard library imports
+import threading
+import time
+from concurrent.futures import Future
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import SAMPLE_RATE
+from .model_registry import get_model
+from .speech_symbol_timestamps import transcribe_samples
+
+# Longest clip decoded in a batch: one Whisper window (whisper.audio.N_SAMPLES), without importing whisper.
+BATCH_WINDOW_SAMPLES = 30 * SAMPLE_RATE
+
+
+def _words_to_timestamped_format(words):
+    """
+    Converts the word timings produced by `whisper.timing` to the word format of whisper_timestamped.
+
+    Parameters:
+    - words (list): Dictionaries with 'word', 'start', 'end' and 'probability' keys.
+
+    Returns:
+    - list: Dictionaries with 'text', 'start', 'end' and 'confidence' keys.
+    """
+    return [{"text": word["word"].strip(), "start": word["start"], "end": word["end"],
+             "confidence": round(float(word["probability"]), 3)} for word in words if word["word"].strip()]
+
+
+def transcribe_batch(model, clips, language="ja"):
+    """
+    Transcribes several clips together, with word timestamps.
+
+    Clips of up to 30 seconds are padded to a single 30 s Whisper window and decoded in one batched call, so the
+    encoder and every autoregressive decoder step run as batched matrix multiplications. Word timestamps are then
+    aligned for each clip with the cross-attention of its decoded tokens. Longer clips need the sequential seeking
+    of whisper_timestamped and are transcribed one by one.
+
+    Parameters:
+    - model (whisper.model.Whisper): The Whisper model.
+    - clips (list): Mono float32 16 kHz sample arrays.
+    - language (str): Language of the audio.
+
+    Returns:
+    - list: One whisper_timestamped-style result (with 'text' and 'segments', each segment with 'words') per clip,
+      in the order of `clips`.
+    """
+    import torch
+    import whisper
+    import whisper.timing
+    import whisper_timestamped
+
+    results = [None] * len(clips)
+    short = [i for i, clip in enumerate(clips) if len(clip) <= whisper.audio.N_SAMPLES]
+
+    for i, clip in enumerate(clips):
+        if i not in short:
+            results[i] = whisper_timestamped.transcribe(model, clip, language=language)
+
+    if not short:
+        return results
+
+    device = next(model.parameters()).device
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.asarray(clips[i], dtype=np.float32))),
+                                    model.dims.n_mels)
+        for i in short
+    ]).to(device)
+    options = whisper.DecodingOptions(language=language, without_timestamps=True, fp16=device.type != "cpu")
+    decoded = whisper.decode(model, mels, options)
+
+    tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                                language=language, task="transcribe")
+    for mel, i, result in zip(mels, short, decoded):
+        duration = len(clips[i]) / whisper.audio.SAMPLE_RATE
+        segment = {"id": 0, "seek": 0, "start": 0.0, "end": round(duration, 2), "text": result.text,
+                   "tokens": result.tokens}
+        num_frames = min(len(clips[i]) // whisper.audio.HOP_LENGTH, whisper.audio.N_FRAMES)
+        if result.tokens and num_frames > 0:
+            whisper.timing.add_word_timestamps(segments=[segment], model=model, tokenizer=tokenizer, mel=mel,
+                                               num_frames=num_frames, last_speech_timestamp=0.0)
+        segment["words"] = _words_to_timestamped_format(segment.get("words", []))
+        del segment["tokens"]
+        results[i] = {"text": result.text, "segments": [segment], "language": language}
+    return results
+
+
+class BatchTranscriber:
+    """
+    Scheduler that groups concurrent transcription requests into batches.
+
+    Callers (typically the threads of the inference pool) block in `transcribe`. A dispatcher thread waits for the
+    first request, keeps collecting requests in the same language for up to `max_wait_ms` milliseconds or until
+    `max_batch` of them are waiting, runs them through `transcribe_batch` and hands every caller its own result.
+    Clips longer than one Whisper window cannot be batched; they are transcribed in the caller's thread, so they
+    never hold up the short clips queued behind them.
+    """
+
+    # Name of the decoding path, part of the result cache key and of the transcript fingerprint: the batched
+    # decoding (no temperature fallback, timestamps from whisper.timing) gives different words and timestamps from
+    # whisper_timestamped.
+    transcription_path = "batched"
+
+    def __init__(self, model_name="default", max_batch=8, max_wait_ms=20, language="ja"):
+        """
+        Parameters:
+        - model_name (str): Name of the Whisper model in the process-wide model registry.
+        - max_batch (int): Maximum number of clips decoded in the same batch.
+        - max_wait_ms (float): Maximum time the first request of a batch waits for more requests.
+        - language (str): Language of the clips transcribed without an explicit language.
+        """
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.language = language
+        self._queue = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch, name="batch-transcriber", daemon=True)
+        self._thread.start()
+
+    def transcribe(self, samples, language=None):
+        """
+        Transcribes a clip as part of the next batch of its language and waits for its result.
+
+        Parameters:
+        - samples (np.ndarray): Mono float32 16 kHz samples.
+        - language (str): Language of the audio. Defaults to the language of the scheduler.
+
+        Returns:
+        - dict: The whisper_timestamped-style transcription of the clip.
+        """
+        language = language or self.language
+        if len(samples) > BATCH_WINDOW_SAMPLES:
+            # Long clips need the sequential seeking of whisper_timestamped, which does not batch
+            return transcribe_samples(samples, self.model_name, language)
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The batch transcriber is closed")
+            self._queue.append((samples, language, future))
+            self._condition.notify()
+        return future.result()
+
+    def _next_batch(self):
+        """
+        Waits for the first request and collects the rest of the batch among the requests in its language.
+
+        Returns:
+        - tuple: The language and the (samples, language, future) entries of the batch, or (None, []) once the
+          scheduler is closed.
+        """
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None, []
+            language = self._queue[0][1]
+            deadline = time.monotonic() + self.max_wait
+            while sum(entry[1] == language for entry in self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, rest = [], []
+            for entry in self._queue:
+                (batch if entry[1] == language and len(batch) < self.max_batch else rest).append(entry)
+            self._queue = rest
+            return language, batch
+
+    def _dispatch(self):
+        while True:
+            language, batch = self._next_batch()
+            if not batch:
+                return
+            # Requests cancelled while waiting are not transcribed.
+            batch = [(samples, future) for samples, _, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = transcribe_batch(get_model(self.model_name), [samples for samples, _ in batch],
+                                           language=language)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self):
+        """
+        Stops the dispatcher once the pending requests have been transcribed.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
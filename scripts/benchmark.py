@@ -0,0 +1,417 @@
+# Standard library imports
+import argparse
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import AudioBuffer
+from .model_registry import model_registry
+from .pitch_engine import compute_pitch_track
+from .mora_mapping import load_mora_table
+from .speech_symbol_timestamps import audio_query_json, build_accent_phrases, transcribe_samples, words_in_kana
+from .auxiliar_functions_for_audio_query import (add_consonant_vowel_info, calculate_pitch, clear_kana_memo,
+                                                 distribute_time_equally,
+                                                 distribute_time_error_in_all_vowels_and_pauses, text_to_kanji,
+                                                 texts_to_kanji, time_for_vowels_and_consonants)
+from .batch_mora import collect_audio_files
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Name under which the benchmark registers its Whisper model, so its settings never depend on the environment.
+BENCHMARK_MODEL = "benchmark"
+
+# Sentence repeated by the synthetic transcript of clips without a recorded one.
+SYNTHETIC_WORDS = ("今日", "は", "とても", "いい", "天気", "です", "ね", "散歩", "に", "行き", "ましょう", "か")
+
+
+def synthetic_transcript(duration, words_per_second=2.5):
+    """
+    Builds a deterministic whisper_timestamped-style transcription covering an audio, for clips without a
+    recorded transcript. The words are evenly spaced and leave short gaps, so the pause moras are exercised.
+
+    Parameters:
+    - duration (float): Duration of the audio in seconds.
+    - words_per_second (float): Density of the words.
+
+    Returns:
+    - dict: The transcription, with 'text' and 'segments' (each with 'words').
+    """
+    count = max(int(duration * words_per_second), 1)
+    step = duration / count
+    words = [{"text": SYNTHETIC_WORDS[index % len(SYNTHETIC_WORDS)],
+              "start": round(index * step, 2), "end": round(index * step + step * 0.8, 2)}
+             for index in range(count)]
+    return {"text": "".join(word["text"] for word in words), "segments": [{"words": words}]}
+
+
+def recorded_transcriber(transcript):
+    """
+    Returns a transcriber that replays a recorded transcription instead of running Whisper, so the stages after
+    the transcription are benchmarked deterministically.
+
+    Parameters:
+    - transcript (dict): The whisper_timestamped-style transcription of the clip.
+
+    Returns:
+    - callable: Function receiving the samples and the language (both ignored) and returning a copy of the
+      transcription.
+    """
+    return lambda samples, language=None: copy.deepcopy(transcript)
+
+
+def load_transcripts(path):
+    """
+    Reads the recorded transcripts, keyed by the clip file name. A missing file gives no transcripts.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as transcripts_file:
+        return json.load(transcripts_file)
+
+
+def record_transcripts(clips, path, model_name=BENCHMARK_MODEL, language="ja"):
+    """
+    Transcribes the clips with Whisper once and saves the transcriptions for `recorded_transcriber`.
+
+    Parameters:
+    - clips (list): Paths of the audio files.
+    - path (str): JSON file where the transcripts are written, keyed by the clip file name.
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
+    - language (str): Language of the audio.
+    """
+    transcripts = load_transcripts(path)
+    for clip in clips:
+        audio = AudioBuffer.from_file(clip)
+        result = transcribe_samples(audio.samples, model_name, language)
+        # Only the fields read by the pipeline are kept, so the file stays small and readable
+        transcripts[os.path.basename(clip)] = {
+            "text": result["text"],
+            "segments": [{"words": [{"text": word["text"], "start": word["start"], "end": word["end"]}
+                                    for word in segment.get("words", [])]}
+                         for segment in result["segments"]],
+        }
+        print(f"Transcript recorded: {clip}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as transcripts_file:
+        json.dump(transcripts, transcripts_file, ensure_ascii=False, indent=2)
+
+
+def _peak_rss_bytes():
+    """
+    Returns the peak resident set size of the current process, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+
+def _clip_stages(clip, transcriber, mapping_file, model_name, language):
+    """
+    Returns the stages benchmarked on a clip, in pipeline order, as (name, function) pairs.
+
+    Every function runs on inputs prepared beforehand, so each stage is measured alone. The caches of the
+    pipeline (result cache, kana memo) are bypassed or cleared, so every repetition does the full work.
+    """
+    audio = AudioBuffer.from_file(clip)
+    transcription = transcriber(audio.samples)
+    words = words_in_kana(transcription)
+    word_texts = [word["text"] for segment in transcription["segments"] for word in segment.get("words", [])]
+    mora_table = load_mora_table(mapping_file) or mapping_file
+    pitch_track = compute_pitch_track(audio)
+
+    def symbols():
+        # The per-symbol path of the former pipeline: equal split, mapping lookup and consonant/vowel split
+        return [symbol for word in words for symbol in distribute_time_equally(word["start"], word["end"],
+                                                                              word["text"])]
+
+    def with_phonetics():
+        return add_consonant_vowel_info(symbols(), mora_table)
+
+    accent_phrases, final_time = build_accent_phrases(words, pitch_track, mora_table)
+    audio_query = {"accent_phrases": accent_phrases, "final_pause": max(audio.duration - final_time, 0) or None}
+
+    def kana():
+        clear_kana_memo()
+        return text_to_kanji(transcription["text"]), texts_to_kanji(word_texts)
+
+    return [
+        ("decode", lambda: AudioBuffer.from_file(clip)),
+        ("transcription", lambda: transcriber(audio.samples)),
+        ("text_to_kanji", kana),
+        ("pitch_track", lambda: compute_pitch_track(audio)),
+        ("calculate_pitch", lambda: calculate_pitch(audio, symbols(), pitch_track)),
+        ("distribute_time_equally", symbols),
+        ("add_consonant_vowel_info", with_phonetics),
+        ("time_for_vowels_and_consonants", lambda: time_for_vowels_and_consonants(with_phonetics())),
+        ("build_accent_phrases", lambda: build_accent_phrases(words, pitch_track, mora_table)),
+        ("distribute_time_error", lambda: distribute_time_error_in_all_vowels_and_pauses(
+            copy.deepcopy(audio_query), audio)),
+        ("audio_query_json", lambda: audio_query_json(audio, mapping_file=mapping_file, model_name=model_name,
+                                                      transcriber=transcriber, language=language,
+                                                      use_cache=False)),
+    ], audio.duration
+
+
+def benchmark_clip(clip, transcript=None, repeats=5, mapping_file="files/mapping.json",
+                   model_name=BENCHMARK_MODEL, language="ja", trace_allocations=True):
+    """
+    Benchmarks the pipeline and each of its stages on one clip.
+
+    Each stage runs `repeats` times for the wall time and once more under tracemalloc for the allocations, so
+    the tracing overhead never inflates the timings. The output of the pipeline (prints) is discarded.
+
+    Parameters:
+    - clip (str): Path of the audio file.
+    - transcript (dict): Recorded transcription of the clip. When None, Whisper transcribes the clip with the
+      `model_name` model.
+    - repeats (int): Number of timed runs of each stage.
+    - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
+    - language (str): Language of the audio.
+    - trace_allocations (bool): Whether to measure the allocations of each stage.
+
+    Returns:
+    - dict: The audio duration, the peak RSS of the process and, for each stage, the median and minimum wall
+      time, the real-time factor (audio seconds processed per wall second), the peak of the memory allocated by
+      the stage and the number of blocks still allocated after it (its output included).
+    """
+    if transcript is not None:
+        transcriber = recorded_transcriber(transcript)
+    else:
+        transcriber = lambda samples, language=language: transcribe_samples(samples, model_name, language)
+
+    rss_before = _peak_rss_bytes()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stages, duration = _clip_stages(clip, transcriber, mapping_file, model_name, language)
+        results = {}
+        for name, function in stages:
+            times = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - start_time)
+            median = statistics.median(times)
+            results[name] = {
+                "wall_seconds": round(median, 6),
+                "min_seconds": round(min(times), 6),
+                "real_time_factor": round(duration / median, 3) if median else None,
+            }
+            if trace_allocations:
+                tracemalloc.start()
+                try:
+                    output = function()
+                    _, peak = tracemalloc.get_traced_memory()
+                    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+                finally:
+                    tracemalloc.stop()
+                del output
+                results[name]["peak_traced_bytes"] = peak
+                results[name]["retained_blocks"] = blocks
+
+    return {
+        "audio_seconds": round(duration, 3),
+        "transcript": "recorded" if transcript is not None else "whisper",
+        "rss_before_bytes": rss_before,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "stages": results,
+    }
+
+
+def _benchmark_clip_worker(arguments):
+    """
+    Worker of `run_benchmark`: benchmarks one clip in a fresh process, so its peak RSS is its own.
+    """
+    clip, options = arguments
+    if options["transcript"] is None:
+        _register_benchmark_model(options["model_size"], options["threads"], options["dtype"])
+    return benchmark_clip(clip, **{key: value for key, value in options.items()
+                                   if key not in ("model_size", "threads", "dtype")})
+
+
+def _register_benchmark_model(model_size, threads, dtype="fp32"):
+    """
+    Fixes the Whisper settings of the benchmark: model size, CPU, compute dtype and the number of torch threads.
+    """
+    import torch
+    torch.set_num_threads(threads)
+    torch.manual_seed(0)
+    model_registry.register(BENCHMARK_MODEL, model_size, "cpu", dtype)
+
+
+def run_benchmark(inputs, transcripts_path="files/benchmark_transcripts.json", use_whisper=False,
+                  model_size="base", threads=1, repeats=5, mapping_file="files/mapping.json", language="ja",
+                  isolate=True, trace_allocations=True, dtype="fp32"):
+    """
+    Benchmarks the mora pipeline over a set of clips, by default the bundled `test_audios` corpus.
+
+    Without `use_whisper`, every clip replays its recorded transcript (see `record_transcripts`), or a synthetic
+    one if none was recorded, so the results only measure the stages after the transcription.
+
+    Parameters:
+    - inputs (list): Directories, glob patterns, audio files or manifests (see `collect_audio_files`).
+    - transcripts_path (str): JSON file with the recorded transcripts, keyed by the clip file name.
+    - use_whisper (bool): Whether to transcribe the clips with Whisper instead of replaying transcripts.
+    - model_size (str): Whisper checkpoint used with `use_whisper`, always on CPU.
+    - threads (int): Number of torch intra-op threads used with `use_whisper`.
+    - repeats (int): Number of timed runs of each stage.
+    - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+    - language (str): Language of the audio.
+    - isolate (bool): Whether to benchmark each clip in a fresh process, so the peak RSS of each clip is its own.
+    - trace_allocations (bool): Whether to measure the allocations of each stage.
+    - dtype (str): Compute precision of the Whisper model, "fp32" or "int8" (see `load_whisper_model`).
+
+    Returns:
+    - dict: The environment of the run, the results of each clip (see `benchmark_clip`) and the total wall time
+      of each stage over all the clips.
+    """
+    clips = collect_audio_files(inputs)
+    transcripts = load_transcripts(transcripts_path)
+    tasks = []
+    for clip in clips:
+        transcript = None
+        if not use_whisper:
+            transcript = transcripts.get(os.path.basename(clip))
+            if transcript is None:
+                transcript = synthetic_transcript(AudioBuffer.from_file(clip).duration)
+        tasks.append((clip, {"transcript": transcript, "repeats": repeats, "mapping_file": mapping_file,
+                             "language": language, "trace_allocations": trace_allocations,
+                             "model_size": model_size, "threads": threads, "dtype": dtype}))
+
+    results = {}
+    for task in tasks:
+        clip = task[0]
+        if isolate:
+            # A spawned process per clip, so no memory of the parent or of the previous clips is inherited
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                result = executor.submit(_benchmark_clip_worker, task).result()
+        else:
+            result = _benchmark_clip_worker(task)
+        if not use_whisper and os.path.basename(clip) not in transcripts:
+            result["transcript"] = "synthetic"
+        results[os.path.basename(clip)] = result
+        print(f"Benchmarked: {clip}")
+
+    totals = {}
+    for result in results.values():
+        for name, stage in result["stages"].items():
+            totals[name] = totals.get(name, 0.0) + stage["wall_seconds"]
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "transcriber": "whisper" if use_whisper else "recorded",
+            "model": {"size": model_size, "device": "cpu", "dtype": dtype, "threads": threads} if use_whisper
+            else None,
+            "repeats": repeats,
+        },
+        "clips": results,
+        "totals": {name: round(seconds, 6) for name, seconds in totals.items()},
+    }
+
+
+def compare_to_baseline(results, baseline, threshold=0.2, min_seconds=0.001):
+    """
+    Compares a benchmark run with a baseline run and lists the regressions.
+
+    A stage regresses when its median wall time, or its peak traced allocations, grow by more than `threshold`
+    relative to the baseline. Wall time differences below `min_seconds` are ignored as noise.
+
+    Parameters:
+    - results (dict): The run, as returned by `run_benchmark`.
+    - baseline (dict): The baseline run.
+    - threshold (float): Allowed relative growth, e.g. 0.2 for 20%.
+    - min_seconds (float): Smallest absolute wall time growth considered a regression.
+
+    Returns:
+    - list: One dictionary per regression, with the clip, stage, metric, baseline and current values.
+    """
+    regressions = []
+    for clip, result in results["clips"].items():
+        baseline_clip = baseline.get("clips", {}).get(clip)
+        if baseline_clip is None:
+            continue
+        for name, stage in result["stages"].items():
+            baseline_stage = baseline_clip["stages"].get(name)
+            if baseline_stage is None:
+                continue
+            for metric, floor in (("wall_seconds", min_seconds), ("peak_traced_bytes", 0)):
+                current, previous = stage.get(metric), baseline_stage.get(metric)
+                if current is None or previous is None:
+                    continue
+                if current > previous * (1 + threshold) and current - previous > floor:
+                    regressions.append({"clip": clip, "stage": name, "metric": metric, "baseline": previous,
+                                        "current": current,
+                                        "change": round(current / previous - 1, 3) if previous else None})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mora pipeline and its stages over audio clips.")
+    parser.add_argument("inputs", nargs="*", default=["test_audios"],
+                        help="Directories, glob patterns, audio files or manifests (default: test_audios)")
+    parser.add_argument("-o", "--output", default="results/benchmark.json", help="Output JSON file")
+    parser.add_argument("--baseline", help="Benchmark JSON to compare with; regressions make the command fail")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative growth over the baseline")
+    parser.add_argument("--transcripts", default="files/benchmark_transcripts.json", dest="transcripts_path",
+                        help="Recorded transcripts replayed instead of running Whisper")
+    parser.add_argument("--record-transcripts", action="store_true",
+                        help="Transcribe the clips with Whisper and save the transcripts, then exit")
+    parser.add_argument("--whisper", action="store_true", dest="use_whisper",
+                        help="Transcribe with Whisper during the benchmark instead of replaying transcripts")
+    parser.add_argument("--model-size", default="base", help="Whisper checkpoint (CPU)")
+    parser.add_argument("--dtype", choices=["fp32", "int8"], default="fp32",
+                        help="Compute precision of Whisper; transcripts are always recorded in fp32")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="Torch threads used by Whisper")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="Timed runs of each stage")
+    parser.add_argument("--mapping-file", default="files/mapping.json", help="Consonant and vowel mapping")
+    parser.add_argument("--language", default="ja", help="Language of the audio")
+    parser.add_argument("--no-isolate", action="store_false", dest="isolate",
+                        help="Run every clip in this process (the peak RSS then accumulates)")
+    parser.add_argument("--no-allocations", action="store_false", dest="trace_allocations",
+                        help="Skip the tracemalloc pass")
+    args = parser.parse_args(argv)
+
+    if args.record_transcripts:
+        _register_benchmark_model(args.model_size, args.threads)
+        record_transcripts(collect_audio_files(args.inputs), args.transcripts_path, language=args.language)
+        return
+
+    results = run_benchmark(args.inputs, args.transcripts_path, args.use_whisper, args.model_size, args.threads,
+                            args.repeats, args.mapping_file, args.language, args.isolate, args.trace_allocations,
+                            args.dtype)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results of {len(results['clips'])} clips saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print("Regression:", json.dumps(regression, ensure_ascii=False))
+        if regressions:
+            sys.exit(1)
+        print(f"No regression over {args.threshold:.0%} compared to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# Standard library imports
+import argparse
+import io
+import json
+
+# Third-party library imports
+import numpy as np
+
+# Keys of an accent phrase that hold nested records rather than plain values.
+_PHRASE_RECORD_KEYS = ("moras", "pause_mora")
+
+
+def _column_kind(values):
+    """
+    Returns the storage kind of a column: "bool", "int", "float" or "str".
+    """
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        return "bool"
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return "int"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return "float"
+    return "str"
+
+
+_EMPTY_VALUES = {"bool": False, "int": 0, "float": 0.0, "str": ""}
+_DTYPES = {"bool": np.bool_, "int": np.int64, "float": np.float64, "str": np.str_}
+
+
+def _encode_records(records, prefix, columns, schema):
+    """
+    Stores a list of flat records as one array per key plus a validity mask for null values.
+
+    Parameters:
+    - records (list): Dictionaries with scalar values.
+    - prefix (str): Prefix of the column names.
+    - columns (dict): Output dictionary receiving the arrays.
+    - schema (dict): Output dictionary receiving the ordered keys and their kinds under `prefix`.
+    """
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    kinds = {}
+    for key in keys:
+        values = [record.get(key) for record in records]
+        kind = _column_kind(values)
+        kinds[key] = kind
+        empty = _EMPTY_VALUES[kind]
+        columns[prefix + key] = np.array([empty if value is None else value for value in values],
+                                         dtype=_DTYPES[kind])
+        columns[prefix + key + ".valid"] = np.array([value is not None for value in values], dtype=np.bool_)
+        columns[prefix + key + ".present"] = np.array([key in record for record in records], dtype=np.bool_)
+    schema[prefix] = [[key, kinds[key]] for key in keys]
+
+
+def _decode_records(columns, prefix, schema, count):
+    """
+    Rebuilds the records stored by `_encode_records`.
+
+    Returns:
+    - list: The records, with their keys in the original order.
+    """
+    records = [{} for _ in range(count)]
+    for key, kind in schema[prefix]:
+        values = columns[prefix + key].tolist()
+        valid = columns[prefix + key + ".valid"].tolist()
+        present = columns[prefix + key + ".present"].tolist()
+        for record, value, is_valid, is_present in zip(records, values, valid, present):
+            if is_present:
+                record[key] = value if is_valid else None
+    return records
+
+
+def to_columns(audio_query):
+    """
+    Converts an audio query (as returned by `audio_query_json`) to columnar arrays.
+
+    Moras of all the accent phrases are stored back to back, one array per field (text, start, end, consonant,
+    vowel, lengths, pitch...), and `phrase_offsets` tells where the moras of each phrase start and end. Phrase
+    fields and pause moras get their own arrays, and the remaining metadata is kept as JSON.
+
+    Parameters:
+    - audio_query (dict): The audio query.
+
+    Returns:
+    - dict: Name -> np.ndarray. No array uses Python objects, so the result can be saved without pickling.
+    """
+    phrases = audio_query.get("accent_phrases", [])
+    columns, schema = {}, {}
+
+    moras = [mora for phrase in phrases for mora in phrase["moras"]]
+    columns["phrase_offsets"] = np.cumsum([0] + [len(phrase["moras"]) for phrase in phrases], dtype=np.int64)
+    _encode_records(moras, "mora.", columns, schema)
+
+    _encode_records([{key: value for key, value in phrase.items() if key not in _PHRASE_RECORD_KEYS}
+                     for phrase in phrases], "phrase.", columns, schema)
+
+    pauses = [phrase.get("pause_mora") for phrase in phrases]
+    columns["pause.has"] = np.array([pause is not None for pause in pauses], dtype=np.bool_)
+    _encode_records([pause for pause in pauses if pause is not None], "pause.", columns, schema)
+
+    schema["phrase_keys"] = [list(phrase) for phrase in phrases[:1]]
+    metadata = {key: value for key, value in audio_query.items() if key != "accent_phrases"}
+    schema["keys"] = list(audio_query)
+    columns["schema"] = np.array(json.dumps(schema, ensure_ascii=False))
+    columns["metadata"] = np.array(json.dumps(metadata, ensure_ascii=False))
+    return columns
+
+
+def from_columns(columns):
+    """
+    Rebuilds the VOICEVOX-style audio query from the arrays of `to_columns`. The conversion is lossless.
+
+    Parameters:
+    - columns (dict): Name -> array, e.g. a loaded NPZ file.
+
+    Returns:
+    - dict: The audio query.
+    """
+    schema = json.loads(str(columns["schema"]))
+    metadata = json.loads(str(columns["metadata"]))
+    offsets = columns["phrase_offsets"].tolist()
+    phrase_count = len(offsets) - 1
+
+    moras = _decode_records(columns, "mora.", schema, offsets[-1])
+    phrase_fields = _decode_records(columns, "phrase.", schema, phrase_count)
+    has_pause = columns["pause.has"].tolist()
+    pauses = iter(_decode_records(columns, "pause.", schema, sum(has_pause)))
+
+    phrase_keys = schema["phrase_keys"][0] if schema["phrase_keys"] else []
+    phrases = []
+    for index, fields in enumerate(phrase_fields):
+        values = dict(fields, moras=moras[offsets[index]:offsets[index + 1]],
+                      pause_mora=next(pauses) if has_pause[index] else None)
+        phrases.append({key: values[key] for key in phrase_keys + [key for key in values if key not in phrase_keys]})
+
+    values = dict(metadata, accent_phrases=phrases)
+    return {key: values[key] for key in schema["keys"]}
+
+
+def save_npz(path, audio_query, compressed=True):
+    """
+    Saves an audio query as a compact NPZ file.
+
+    Parameters:
+    - path (str or file): Destination of the NPZ data.
+    - audio_query (dict): The audio query.
+    - compressed (bool): Whether to compress the arrays.
+    """
+    (np.savez_compressed if compressed else np.savez)(path, **to_columns(audio_query))
+
+
+def load_npz(path):
+    """
+    Loads an audio query saved with `save_npz`.
+
+    Parameters:
+    - path (str or file): Source of the NPZ data.
+
+    Returns:
+    - dict: The audio query.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return from_columns({name: data[name] for name in data.files})
+
+
+def to_npz_bytes(audio_query):
+    """
+    Returns an audio query as NPZ bytes, e.g. for an API response.
+    """
+    buffer = io.BytesIO()
+    save_npz(buffer, audio_query)
+    return buffer.getvalue()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The Arrow/Parquet output requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def to_arrow(audio_queries):
+    """
+    Converts audio queries to an Arrow table with one row per accent phrase.
+
+    Mora fields are list columns ("mora.start", "mora.pitch"...), whose flattened values are the mora arrays of
+    the whole corpus and whose offsets are the phrase offsets. The "source" column names the audio query of each
+    row, and the metadata of each query is kept in the schema metadata.
+
+    Parameters:
+    - audio_queries (dict): Source name (e.g. audio file path) -> audio query.
+
+    Returns:
+    - pyarrow.Table: The table.
+    """
+    pa = _require_pyarrow()
+    sources, parts = [], []
+    for source, audio_query in audio_queries.items():
+        columns = to_columns(audio_query)
+        sources.extend([source] * (len(columns["phrase_offsets"]) - 1))
+        parts.append(columns)
+
+    arrays = {"source": pa.array(sources, pa.string())}
+    schemas = {source: json.loads(str(columns["schema"])) for source, columns in zip(audio_queries, parts)}
+    metadata = {source: json.loads(str(columns["metadata"])) for source, columns in zip(audio_queries, parts)}
+
+    for prefix in ("mora.", "phrase.", "pause."):
+        names = list(dict.fromkeys(prefix + key for schema in schemas.values() for key, _ in schema[prefix]))
+        for name in names:
+            flat, valid, present, offsets = [], [], [], [0]
+            for columns in parts:
+                count = _record_count(columns, prefix)
+                if name in columns:
+                    flat.extend(columns[name].tolist())
+                    valid.extend(columns[name + ".valid"].tolist())
+                    present.extend(columns[name + ".present"].tolist())
+                else:
+                    flat.extend([None] * count)
+                    valid.extend([False] * count)
+                    present.extend([False] * count)
+                offsets.extend(_row_offsets(columns, prefix, offsets[-1]))
+            values = pa.array([value if is_valid else None for value, is_valid in zip(flat, valid)])
+            present = pa.array(present)
+            if prefix == "phrase.":
+                arrays[name], arrays[name + ".present"] = values, present
+            else:
+                offsets = pa.array(offsets, pa.int32())
+                arrays[name] = pa.ListArray.from_arrays(offsets, values)
+                arrays[name + ".present"] = pa.ListArray.from_arrays(offsets, present)
+    arrays["pause.has"] = pa.array([has for columns in parts for has in columns["pause.has"].tolist()])
+
+    table = pa.table(arrays)
+    return table.replace_schema_metadata({
+        "audio_query_schema": json.dumps(schemas, ensure_ascii=False),
+        "audio_query_metadata": json.dumps(metadata, ensure_ascii=False),
+    })
+
+
+def _record_count(columns, prefix):
+    if prefix == "mora.":
+        return int(columns["phrase_offsets"][-1])
+    if prefix == "pause.":
+        return int(columns["pause.has"].sum())
+    return len(columns["phrase_offsets"]) - 1
+
+
+def _row_offsets(columns, prefix, base):
+    """
+    Returns the list offsets (after the first one) of the rows of one audio query, shifted by `base`.
+    """
+    if prefix == "mora.":
+        return (columns["phrase_offsets"][1:] + base).tolist()
+    if prefix == "pause.":
+        return (np.cumsum(columns["pause.has"], dtype=np.int64) + base).tolist()
+    return []
+
+
+def from_arrow(table):
+    """
+    Rebuilds the audio queries stored in an Arrow table created by `to_arrow`.
+
+    Parameters:
+    - table (pyarrow.Table): The table.
+
+    Returns:
+    - dict: Source name -> audio query.
+    """
+    schemas = json.loads(table.schema.metadata[b"audio_query_schema"])
+    metadata = json.loads(table.schema.metadata[b"audio_query_metadata"])
+    sources = table.column("source").to_pylist()
+
+    audio_queries = {}
+    for source, schema in schemas.items():
+        rows = [index for index, row_source in enumerate(sources) if row_source == source]
+        part = table.take(rows) if rows else table.slice(0, 0)
+        columns = {
+            "schema": np.array(json.dumps(schema, ensure_ascii=False)),
+            "metadata": np.array(json.dumps(metadata[source], ensure_ascii=False)),
+            "pause.has": np.array(part.column("pause.has").to_pylist(), dtype=np.bool_),
+        }
+        mora_counts = [0]
+        for prefix in ("mora.", "phrase.", "pause."):
+            for key, kind in schema[prefix]:
+                name = prefix + key
+                values = part.column(name).to_pylist()
+                present = part.column(name + ".present").to_pylist()
+                if prefix != "phrase.":
+                    if prefix == "mora.":
+                        mora_counts = [0] + [len(row) for row in values]
+                    values = [value for row in values for value in row]
+                    present = [value for row in present for value in row]
+                empty = _EMPTY_VALUES[kind]
+                columns[name] = np.array([empty if value is None else value for value in values], dtype=_DTYPES[kind])
+                columns[name + ".valid"] = np.array([value is not None for value in values], dtype=np.bool_)
+                columns[name + ".present"] = np.array(present, dtype=np.bool_)
+        if not schema["mora."]:
+            mora_counts = [0] * (part.num_rows + 1)
+        columns["phrase_offsets"] = np.cumsum(mora_counts, dtype=np.int64)
+        audio_queries[source] = from_columns(columns)
+    return audio_queries
+
+
+def write_parquet(path, audio_queries):
+    """
+    Writes audio queries to a Parquet file (one row per accent phrase, see `to_arrow`).
+
+    Parameters:
+    - path (str): Destination of the Parquet file.
+    - audio_queries (dict): Source name -> audio query.
+    """
+    pa = _require_pyarrow()
+    pa.parquet.write_table(to_arrow(audio_queries), path)
+
+
+def read_parquet(path):
+    """
+    Reads the audio queries of a Parquet file written by `write_parquet`.
+
+    Parameters:
+    - path (str): The Parquet file.
+
+    Returns:
+    - dict: Source name -> audio query.
+    """
+    pa = _require_pyarrow()
+    return from_arrow(pa.parquet.read_table(path))
+
+
+def _read_queries(path):
+    """
+    Reads audio queries from JSON (one query), JSONL shards (batch command output), NPZ or Parquet.
+    """
+    if path.endswith(".npz"):
+        return {path: load_npz(path)}
+    if path.endswith(".parquet"):
+        return read_parquet(path)
+    with open(path, encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            return {record["path"]: record["audio_query"] for record in map(json.loads, file) if record}
+        return {path: json.load(file)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert audio queries between JSON, NPZ and Parquet.")
+    parser.add_argument("inputs", nargs="+", help="JSON, JSONL shard, NPZ or Parquet files")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.json, .npz or .parquet)")
+    args = parser.parse_args(argv)
+
+    audio_queries = {}
+    for path in args.inputs:
+        audio_queries.update(_read_queries(path))
+
+    if args.output.endswith(".parquet"):
+        write_parquet(args.output, audio_queries)
+    elif len(audio_queries) != 1:
+        parser.error("JSON and NPZ outputs hold a single audio query; use .parquet for several")
+    elif args.output.endswith(".npz"):
+        save_npz(args.output, next(iter(audio_queries.values())))
+    else:
+        with open(args.output, "w", encoding="utf-8") as json_file:
+            json.dump(next(iter(audio_queries.values())), json_file, ensure_ascii=False, indent=4)
+    print(f"{len(audio_queries)} audio queries written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
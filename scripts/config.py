@@ -0,0 +1,112 @@
+# Standard library imports
+import os
+
+
+def _env_int(name, default):
+    """
+    Reads an integer setting from the environment.
+
+    Parameters:
+    - name (str): Name of the environment variable.
+    - default (int): Value used when the variable is unset or empty.
+
+    Returns:
+    - int: The parsed value.
+    """
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else default
+
+
+def _env_float(name, default):
+    """
+    Reads a float setting from the environment.
+
+    Parameters:
+    - name (str): Name of the environment variable.
+    - default (float): Value used when the variable is unset or empty.
+
+    Returns:
+    - float: The parsed value.
+    """
+    value = os.environ.get(name, "")
+    return float(value) if value.strip() else default
+
+
+def _env_list(name, default):
+    """
+    Reads a comma separated list setting from the environment.
+
+    Parameters:
+    - name (str): Name of the environment variable.
+    - default (str): Comma separated value used when the variable is unset.
+
+    Returns:
+    - list: The non-empty, stripped items of the list.
+    """
+    value = os.environ.get(name, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Whisper model used by the mora pipeline.
+WHISPER_MODEL_SIZE = os.environ.get("MORA_WHISPER_MODEL", "base")
+WHISPER_DEVICE = os.environ.get("MORA_WHISPER_DEVICE", "cpu")
+WHISPER_DTYPE = os.environ.get("MORA_WHISPER_DTYPE", "fp32")
+
+# Smaller model tier registered as "fast" (see `scripts.model_registry`), quantized to int8 by default.
+WHISPER_FAST_MODEL_SIZE = os.environ.get("MORA_WHISPER_FAST_MODEL", "tiny")
+WHISPER_FAST_DTYPE = os.environ.get("MORA_WHISPER_FAST_DTYPE", "int8")
+
+# Maximum number of Whisper models kept in memory before the least recently used one is evicted.
+MAX_RESIDENT_MODELS = _env_int("MORA_MAX_RESIDENT_MODELS", 2)
+
+# Named models loaded when the FastAPI application starts. Empty means lazy loading on first use.
+PRELOAD_MODELS = _env_list("MORA_PRELOAD_MODELS", "default")
+
+# Whether the warmup also runs the pipeline once on a dummy audio with each preloaded model before /ready reports
+# the application ready (see scripts/warmup.py).
+WARMUP_INFERENCE = os.environ.get("MORA_WARMUP_INFERENCE", "1").strip().lower() in ("1", "true", "yes")
+
+# Inference worker pool of the FastAPI application.
+WORKER_KIND = os.environ.get("MORA_WORKER_KIND", "thread")  # "thread" or "process"
+WORKERS = _env_int("MORA_WORKERS", 1)
+QUEUE_SIZE = _env_int("MORA_QUEUE_SIZE", 4)
+
+# Seconds a request may wait for its result before it is answered with a 504.
+REQUEST_TIMEOUT = _env_float("MORA_REQUEST_TIMEOUT", 120.0)
+
+# Seconds advertised in the Retry-After header when the queue is full.
+RETRY_AFTER = _env_int("MORA_RETRY_AFTER", 5)
+
+# Micro-batching of Whisper inference across concurrent requests (thread workers only). A batch size of 1
+# disables batching. MORA_WORKERS should be at least the batch size, so that enough requests wait together.
+BATCH_SIZE = _env_int("MORA_BATCH_SIZE", 1)
+BATCH_WAIT_MS = _env_float("MORA_BATCH_WAIT_MS", 20.0)
+
+# Result cache of audio_query_json. The disk tier (a SQLite database) is disabled when no path is given.
+RESULT_CACHE_SIZE = _env_int("MORA_RESULT_CACHE_SIZE", 128)
+RESULT_CACHE_PATH = os.environ.get("MORA_RESULT_CACHE_PATH", "")
+RESULT_CACHE_MAX_BYTES = _env_int("MORA_RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+
+# Compression of the /mora responses, negotiated with the Accept-Encoding header (brotli needs the brotli package).
+# Smaller bodies are sent uncompressed, as compressing them saves less than it costs.
+COMPRESS_MIN_BYTES = _env_int("MORA_COMPRESS_MIN_BYTES", 1024)
+GZIP_LEVEL = _env_int("MORA_GZIP_LEVEL", 5)
+BROTLI_QUALITY = _env_int("MORA_BROTLI_QUALITY", 4)
+
+# VOICEVOX engine used to compare the generated moras, and the connections/timeout of its client.
+VOICEVOX_URL = os.environ.get("MORA_VOICEVOX_URL", "http://127.0.0.1:50021")
+VOICEVOX_CONCURRENCY = _env_int("MORA_VOICEVOX_CONCURRENCY", 8)
+VOICEVOX_TIMEOUT = _env_float("MORA_VOICEVOX_TIMEOUT", 30.0)
+
+# Placement of the mora boundaries inside each word: "equal" or "acoustic" (see scripts/forced_alignment.py).
+ALIGNMENT = os.environ.get("MORA_ALIGNMENT", "equal")
+
+# Realtime WebSocket sessions: how long before the live edge a word must end to be committed, how often the
+# live window is transcribed, the audio kept per connection and the number of simultaneous connections.
+REALTIME_LATENCY = _env_float("MORA_REALTIME_LATENCY", 1.0)
+REALTIME_STEP = _env_float("MORA_REALTIME_STEP", 1.0)
+REALTIME_BUFFER = _env_float("MORA_REALTIME_BUFFER", 30.0)
+REALTIME_MAX_SESSIONS = _env_int("MORA_REALTIME_MAX_SESSIONS", 4)
+
+# Voice activity detection before transcription (see scripts/voice_activity.py): "1" transcribes only the speech.
+VAD = os.environ.get("MORA_VAD", "0").strip().lower() in ("1", "true", "yes")
@@ -0,0 +1,213 @@
+# Third-party library imports
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Local application imports
+from .audio_buffer import load_audio
+
+# Frames whose spectrum is computed at once, to bound the memory used on long recordings.
+_SPECTRUM_CHUNK = 4096
+
+
+def _standardize(values):
+    """
+    Centers an array on its median and scales it by its median absolute deviation, so scores of different
+    features and recordings are comparable.
+    """
+    if len(values) == 0:
+        return values
+    median = np.median(values)
+    deviation = np.median(np.abs(values - median))
+    return (values - median) / (deviation if deviation > 0 else 1.0)
+
+
+class AcousticFeatures:
+    """
+    Frame-level features of a whole utterance used to place mora boundaries: log energy, spectral flux and voicing.
+
+    Computed once per utterance, like the PitchTrack, and then queried for every word.
+    """
+
+    def __init__(self, times, energy, flux, voiced, hop_seconds):
+        """
+        Parameters:
+        - times (np.ndarray): Center time of each frame in seconds, in increasing order.
+        - energy (np.ndarray): Log energy of each frame.
+        - flux (np.ndarray): Spectral flux of each frame (increase of the spectrum from the previous frame).
+        - voiced (np.ndarray): Boolean mask of the voiced frames.
+        - hop_seconds (float): Distance between consecutive frames in seconds.
+        """
+        self.times = times
+        self.energy = energy
+        self.flux = flux
+        self.voiced = voiced
+        self.hop_seconds = hop_seconds
+
+    def shifted(self, offset):
+        """
+        Returns the same features with their frame times moved, e.g. from window time to absolute time.
+        """
+        return AcousticFeatures(self.times + offset, self.energy, self.flux, self.voiced, self.hop_seconds)
+
+    def boundary_score(self, energy_weight=0.5, voicing_weight=1.0):
+        """
+        Scores how likely each frame is to start a new mora: spectral changes, energy dips (closures) and
+        voicing changes all mark boundaries.
+
+        Parameters:
+        - energy_weight (float): Weight of the energy dips.
+        - voicing_weight (float): Weight of the voicing changes.
+
+        Returns:
+        - np.ndarray: The score of each frame, higher for more likely boundaries.
+        """
+        voicing_change = np.abs(np.diff(self.voiced.astype(np.float64), prepend=self.voiced[:1].astype(np.float64)))
+        return (_standardize(self.flux) - energy_weight * _standardize(self.energy)
+                + voicing_weight * voicing_change)
+
+    def onset_score(self):
+        """
+        Scores how likely each frame is to start a vowel: rising energy and voicing onsets.
+
+        Returns:
+        - np.ndarray: The score of each frame.
+        """
+        rise = _standardize(np.diff(self.energy, prepend=self.energy[:1]))
+        voiced = self.voiced.astype(np.float64)
+        onset = np.clip(np.diff(voiced, prepend=voiced[:1]), 0, None)
+        return rise + onset
+
+
+def compute_acoustic_features(audio, hop_seconds=0.01, window_seconds=0.025, pitch_track=None):
+    """
+    Computes the alignment features of a whole audio in one pass.
+
+    Parameters:
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file.
+    - hop_seconds (float): Distance between consecutive frames in seconds.
+    - window_seconds (float): Length of the analysis window of each frame in seconds.
+    - pitch_track (PitchTrack): The pitch contour of the audio, used for the voicing of each frame. Without it,
+      frames with energy above the median and a low zero-crossing rate are considered voiced.
+
+    Returns:
+    - AcousticFeatures: The features of every frame.
+    """
+    audio = load_audio(audio)
+    samples = audio.samples.astype(np.float32, copy=False)
+    hop = max(int(round(hop_seconds * audio.sample_rate)), 1)
+    window = max(int(round(window_seconds * audio.sample_rate)), 2)
+    n_fft = 1 << (window - 1).bit_length()
+
+    # Frames centered on multiples of the hop, without copying the samples.
+    frame_count = len(samples) // hop + 1
+    padded = np.pad(samples, (window // 2, window // 2 + hop))
+    frames = sliding_window_view(padded, window)[::hop][:frame_count]
+
+    energy = np.log10(np.einsum("ij,ij->i", frames, frames) / window + 1e-10)
+
+    # Spectral flux on log-compressed magnitudes, chunk by chunk; each chunk carries the last spectrum of the
+    # previous one so the flux is continuous.
+    taper = np.hanning(window).astype(np.float32)
+    flux = np.zeros(frame_count)
+    previous = None
+    for start in range(0, frame_count, _SPECTRUM_CHUNK):
+        spectrum = np.log1p(100 * np.abs(np.fft.rfft(frames[start:start + _SPECTRUM_CHUNK] * taper, n_fft)))
+        if previous is None:
+            previous = spectrum[:1]
+        increase = np.diff(np.concatenate((previous, spectrum)), axis=0)
+        flux[start:start + len(spectrum)] = np.clip(increase, 0, None).sum(axis=1)
+        previous = spectrum[-1:]
+
+    times = np.arange(frame_count) * hop / audio.sample_rate
+    if pitch_track is not None and len(pitch_track.times):
+        index = np.clip(np.searchsorted(pitch_track.times, times, side="right") - 1, 0, len(pitch_track.times) - 1)
+        voiced = pitch_track.voiced[index]
+    else:
+        signs = np.signbit(frames)
+        crossing_rate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / window
+        voiced = (energy > np.median(energy)) & (crossing_rate < 0.1)
+
+    return AcousticFeatures(times, energy, flux, voiced, hop / audio.sample_rate)
+
+
+def segment_span(score, first, last, count, min_frames=3, prior_weight=2.0):
+    """
+    Splits the frames first..last into `count` consecutive segments with dynamic programming.
+
+    Each of the count - 1 boundaries is placed on a frame, rewarded by its boundary score and penalized by its
+    squared distance to the position of an equal split (in units of the equal segment length), with every segment
+    at least `min_frames` long. The minimum over the previous boundary is a running minimum, so the cost is linear
+    in the number of frames for each boundary.
+
+    Parameters:
+    - score (np.ndarray): Boundary score of every frame of the utterance.
+    - first (int): First frame of the span.
+    - last (int): Frame after the end of the span.
+    - count (int): Number of segments (moras).
+    - min_frames (int): Minimum length of each segment in frames.
+    - prior_weight (float): Weight of the equal-split prior against the acoustic score.
+
+    Returns:
+    - np.ndarray: The count + 1 segment edges in frames (first, the boundaries, last), or None if the span is too
+      short for `count` segments.
+    """
+    frames = last - first
+    if count <= 1:
+        return np.array([first, last])
+    min_frames = max(min(min_frames, frames // count), 1)
+    if frames < count * min_frames:
+        return None
+
+    candidates = np.arange(first, last)
+    segment = frames / count
+    local_score = score[first:last]
+    best_previous = None
+    choices = []
+    for k in range(1, count):
+        cost = -local_score + prior_weight * ((candidates - (first + k * segment)) / segment) ** 2
+        # The k-th boundary leaves room for k segments before it and count - k after it.
+        valid = (candidates >= first + k * min_frames) & (candidates <= last - (count - k) * min_frames)
+        if best_previous is not None:
+            # Best previous boundary at least min_frames before each candidate.
+            shifted_cost = np.full(frames, np.inf)
+            shifted_cost[min_frames:] = best_previous[0][:frames - min_frames]
+            shifted_index = np.zeros(frames, dtype=np.int64)
+            shifted_index[min_frames:] = best_previous[1][:frames - min_frames]
+            cost = cost + shifted_cost
+            choices.append(shifted_index)
+        cost = np.where(valid, cost, np.inf)
+        running = np.minimum.accumulate(cost)
+        running_index = np.maximum.accumulate(np.where(cost == running, np.arange(frames), 0))
+        best_previous = (running, running_index)
+
+    # Backtrack from the best last boundary.
+    boundaries = [int(best_previous[1][-1])]
+    for choice in reversed(choices):
+        boundaries.append(int(choice[boundaries[-1]]))
+    return np.concatenate(([first], first + np.array(boundaries[::-1]), [last]))
+
+
+def consonant_ends(onset, starts, ends, max_fraction=0.5):
+    """
+    Finds where the vowel of each mora starts: the frame with the highest onset score in the first part of it.
+
+    Parameters:
+    - onset (np.ndarray): Vowel onset score of every frame of the utterance.
+    - starts (np.ndarray): First frame of each mora.
+    - ends (np.ndarray): Frame after the end of each mora.
+    - max_fraction (float): Largest fraction of the mora that the consonant may take.
+
+    Returns:
+    - np.ndarray: The frame where the vowel of each mora starts, always after its first frame. Moras shorter
+      than two frames get -1.
+    """
+    limits = starts + np.maximum(((ends - starts) * max_fraction).astype(np.int64), 1)
+    width = int((limits - starts).max()) if len(starts) else 0
+    if width == 0:
+        return np.full(len(starts), -1)
+    # One row of candidate frames per mora, masked beyond its own limit.
+    candidates = starts[:, None] + 1 + np.arange(width)[None, :]
+    valid = (candidates <= limits[:, None]) & (candidates < ends[:, None])
+    scores = np.where(valid, onset[np.clip(candidates, 0, len(onset) - 1)], -np.inf)
+    best = candidates[np.arange(len(starts)), np.argmax(scores, axis=1)]
+    return np.where(valid.any(axis=1), best, -1)
@@ -0,0 +1,112 @@
+# Standard library imports
+import importlib.util
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import load_audio
+
+
+class FormantTrack:
+    """
+    F1, F2 and intensity contours of a whole utterance.
+
+    Like the PitchTrack, it is computed once per audio and then summarised over any number of intervals (the vowel
+    of every mora) with array operations.
+    """
+
+    def __init__(self, times, f1, f2, intensity):
+        """
+        Parameters:
+        - times (np.ndarray): Center time of each frame in seconds, in increasing order.
+        - f1, f2 (np.ndarray): First and second formant of each frame in Hertz, NaN where undefined.
+        - intensity (np.ndarray): Intensity of each frame in dB, NaN where undefined.
+        """
+        self.times = times
+        self.values = np.vstack((f1, f2, intensity))
+        defined = ~np.isnan(self.values)
+        # Cumulative sums of the defined values and of their counts, one row per contour.
+        self._sums = np.concatenate((np.zeros((3, 1)), np.cumsum(np.where(defined, self.values, 0.0), axis=1)),
+                                    axis=1)
+        self._counts = np.concatenate((np.zeros((3, 1), dtype=np.int64), np.cumsum(defined, axis=1)), axis=1)
+
+    def shifted(self, offset):
+        """
+        Returns the same contours with their frame times moved, e.g. from window time to absolute time.
+        """
+        return FormantTrack(self.times + offset, *self.values)
+
+    def means(self, starts, ends):
+        """
+        Averages F1, F2 and intensity over several intervals at once.
+
+        Intervals holding no frame (shorter than the analysis step) take the contours interpolated at their
+        center; intervals without defined values get NaN.
+
+        Parameters:
+        - starts (array-like): Start time of each interval in seconds.
+        - ends (array-like): End time of each interval in seconds.
+
+        Returns:
+        - np.ndarray: Array of shape (3, intervals) with the mean F1, F2 and intensity of each interval.
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        first = np.searchsorted(self.times, starts, side="left")
+        last = np.maximum(np.searchsorted(self.times, ends, side="left"), first)
+        counts = self._counts[:, last] - self._counts[:, first]
+        sums = self._sums[:, last] - self._sums[:, first]
+        means = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+        empty = last == first
+        if empty.any() and len(self.times):
+            centers = (starts[empty] + ends[empty]) / 2
+            for row in range(3):
+                means[row, empty] = np.interp(centers, self.times, self.values[row], left=np.nan, right=np.nan)
+        return means
+
+
+def formants_available():
+    """
+    Returns whether praat-parselmouth is installed, so callers can refuse formant features up front.
+    """
+    return importlib.util.find_spec("parselmouth") is not None
+
+
+def compute_formant_track(audio, maximum_formant=5500.0):
+    """
+    Computes the formant and intensity contours of a whole audio with Praat (requires praat-parselmouth).
+
+    The decoded samples are handed to Praat directly, so the audio is not decoded a second time.
+
+    Parameters:
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file.
+    - maximum_formant (float): Ceiling of the formant search range in Hertz (5500 for women, 5000 for men).
+
+    Returns:
+    - FormantTrack: The contours of the audio.
+    """
+    try:
+        import parselmouth
+    except ImportError as e:
+        raise ImportError("Formant features require praat-parselmouth: pip install praat-parselmouth") from e
+    from .audio_analytics.formant_analysis import formant_tracks
+
+    audio = load_audio(audio)
+    sound = parselmouth.Sound(audio.samples.astype(np.float64), sampling_frequency=audio.sample_rate)
+    times, f1, f2 = formant_tracks(sound, maximum_formant=maximum_formant)
+
+    # Intensity is read at the formant frames, so every contour shares the same time axis.
+    try:
+        intensity = sound.to_intensity()
+        intensity_values = intensity.values[0].astype(np.float64)
+    except parselmouth.PraatError:
+        intensity_values = np.zeros(0)  # The audio is shorter than the intensity window.
+    intensity_values[~np.isfinite(intensity_values)] = np.nan
+    if len(intensity_values):
+        intensity_at_frames = np.interp(times, np.asarray(intensity.xs()), intensity_values,
+                                        left=np.nan, right=np.nan)
+    else:
+        intensity_at_frames = np.full(len(times), np.nan)
+    return FormantTrack(times, f1, f2, intensity_at_frames)
@@ -0,0 +1,238 @@
+# Standard library imports
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Local application imports
+from . import config
+from .warmup import warmup
+
+
+class PoolFullError(Exception):
+    """
+    Raised when a job is submitted while every worker is busy and the waiting queue is full.
+    """
+
+
+def _warm_up_worker(names, inference):
+    """
+    Initializer of process workers: loads the configured models once per worker process and warms them up.
+
+    Parameters:
+    - names (list): Names of registered models to load.
+    - inference (bool): Whether to run a dummy inference with each model (see `scripts.warmup`).
+    """
+    warmup(names, inference=inference)
+
+
+def _worker_pid():
+    """
+    Job of `InferencePool.warm_up`: returns the process id of the worker once it is warm. The short sleep keeps a
+    worker from taking every job, so the jobs spread over all the workers.
+    """
+    time.sleep(0.1)
+    return os.getpid()
+
+
+class Reservation:
+    """
+    Slot of an InferencePool held by a long-running request (a stream, a realtime session) for its whole duration.
+
+    The jobs of the request run one after the other on the slot, in threads of this process, so they may use
+    state that cannot be sent to a process worker (generators, sessions). `release` gives the slot back; it is
+    idempotent, so it can be called from every exit path.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._released = False
+        self._lock = threading.Lock()
+
+    async def run(self, function, *args, timeout=None, **kwargs):
+        """
+        Runs a blocking function on the reserved slot, like `InferencePool.run` but without taking another slot.
+
+        Raises:
+        - RuntimeError: If the reservation has been released.
+        - asyncio.TimeoutError: If the result is not ready within `timeout` seconds.
+        """
+        if self._released:
+            raise RuntimeError("The reservation has been released")
+        return await self._pool._wait(self._pool._local_executor.submit(function, *args, **kwargs), timeout)
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._pool._release(None)
+
+
+class InferencePool:
+    """
+    Bounded pool that runs the blocking inference work (Whisper, Aubio, decoding) outside the event loop.
+
+    At most `max_workers` jobs run at the same time and at most `max_queue` more wait for a free worker. Jobs
+    submitted beyond that are rejected immediately with PoolFullError, so the caller can answer with a 503 instead
+    of letting the latency of every request grow. Requests made of many jobs hold a slot with `reserve`.
+    """
+
+    def __init__(self, max_workers=1, max_queue=4, kind="thread", preload_models=(), warmup_inference=True):
+        """
+        Parameters:
+        - max_workers (int): Number of jobs that run concurrently.
+        - max_queue (int): Number of jobs allowed to wait for a free worker.
+        - kind (str): "thread" to run jobs in threads of this process, "process" to run them in worker processes.
+          Process workers load their own copy of the models.
+        - preload_models (iterable): Names of registered models each process worker loads when it starts.
+        - warmup_inference (bool): Whether process workers also run a dummy inference with each model when they
+          start.
+        """
+        if kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+            self._local_executor = self._executor
+        elif kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_up_worker,
+                                                 initargs=(list(preload_models), warmup_inference))
+            # Reservations and `run_local` jobs use state of this process; they run in threads bounded like the workers
+            self._local_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        else:
+            raise ValueError(f"Unknown worker kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """
+        int: Number of jobs running or waiting in the pool.
+        """
+        return self._pending
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            raise PoolFullError(f"Inference queue is full ({self.max_workers} running, {self.max_queue} waiting)")
+        with self._pending_lock:
+            self._pending += 1
+
+    def _release(self, _future):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    async def _wait(self, future, timeout):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            future.cancel()
+            raise
+
+    def reserve(self):
+        """
+        Takes a slot of the pool for a request made of several jobs, e.g. the windows of a stream.
+
+        Returns:
+        - Reservation: The slot. It counts as a pending job until it is released.
+
+        Raises:
+        - PoolFullError: If every worker is busy and the queue is full.
+        """
+        self._acquire()
+        return Reservation(self)
+
+    async def run(self, function, *args, timeout=None, **kwargs):
+        """
+        Runs a blocking function in the pool and waits for its result without blocking the event loop.
+
+        If the timeout expires, or the awaiting request is cancelled (e.g. the client disconnected), a job that is
+        still waiting in the queue is dropped. A job that is already running cannot be interrupted; it finishes in
+        the background and its result is discarded.
+
+        Parameters:
+        - function (callable): The function to run. It must be picklable for process pools.
+        - *args: Positional arguments of the function.
+        - timeout (float): Maximum number of seconds to wait for the result. None waits forever.
+        - **kwargs: Keyword arguments of the function.
+
+        Returns:
+        - The value returned by the function.
+
+        Raises:
+        - PoolFullError: If every worker is busy and the queue is full.
+        - asyncio.TimeoutError: If the result is not ready within `timeout` seconds.
+        """
+        self._acquire()
+        try:
+            future = self._executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await self._wait(future, timeout)
+
+    async def run_local(self, function, *args, timeout=None, **kwargs):
+        """
+        Runs a blocking function in a thread of this process, taking a slot of the pool like `run`.
+
+        For jobs that use state of this process and cannot be sent to a process worker, e.g. the transcription
+        passes of a realtime session. With thread workers they share the same threads as `run`.
+
+        Raises:
+        - PoolFullError: If every worker is busy and the queue is full.
+        - asyncio.TimeoutError: If the result is not ready within `timeout` seconds.
+        """
+        self._acquire()
+        try:
+            future = self._local_executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await self._wait(future, timeout)
+
+    async def warm_up(self, names, inference=True):
+        """
+        Loads and warms up the models of every worker (see `scripts.warmup`) and waits until they are all ready.
+
+        Thread workers share the models of this process, which are warmed up once. Process workers warm up in
+        their initializer; a job only runs once its worker is warm, so this waits until jobs came back from every
+        worker process.
+
+        The warmup jobs bypass the admission control: requests arriving during startup cannot make the warmup fail
+        with PoolFullError, they are only answered once a worker is free.
+
+        Parameters:
+        - names (list): Names of registered models to load.
+        - inference (bool): Whether to run a dummy inference with each model.
+        """
+        if self.kind == "thread":
+            await asyncio.wrap_future(self._executor.submit(warmup, names, inference=inference))
+            return
+        ready_workers = set()
+        while len(ready_workers) < self.max_workers:
+            ready_workers.update(await asyncio.gather(*(asyncio.wrap_future(self._executor.submit(_worker_pid))
+                                                        for _ in range(self.max_workers))))
+
+    def shutdown(self):
+        """
+        Stops the workers, dropping the jobs that did not start yet.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._local_executor is not self._executor:
+            self._local_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_inference_pool():
+    """
+    Builds the inference pool described by the service configuration.
+
+    Returns:
+    - InferencePool: A pool sized with the MORA_WORKER_* settings of `scripts.config`.
+    """
+    return InferencePool(max_workers=config.WORKERS, max_queue=config.QUEUE_SIZE, kind=config.WORKER_KIND,
+                         preload_models=config.PRELOAD_MODELS, warmup_inference=config.WARMUP_INFERENCE)
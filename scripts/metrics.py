@@ -0,0 +1,200 @@
+# Standard library imports
+import contextlib
+import contextvars
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets, from 5 ms to 2 minutes.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Stage timings of the request being processed by the current thread (or task), if any.
+_current_timings = contextvars.ContextVar("mora_stage_timings", default=None)
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """
+    Collects the duration of every pipeline stage run inside the block, in the current thread.
+
+    Yields:
+    - dict: Seconds spent in each stage, filled in as the stages finish. A stage run several times accumulates.
+    """
+    timings = {}
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Times a pipeline stage (decode, transcription, pitch...) for the timings being collected, if any.
+
+    Outside `collect_timings` (batch runs, scripts) it only costs two clock reads.
+
+    Parameters:
+    - name (str): Name of the stage.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start_time
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (name + '="' + str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+               for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, (), value) for labels, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """
+    Value read from a function when the metrics are exported, e.g. the queue depth. With kind "counter" it exports
+    a counter kept by another component, e.g. the hits of a cache.
+    """
+
+    def __init__(self, name, documentation, function, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ()
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, (), (), self.function())]
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, optionally split by labels.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # labels -> [bucket counts, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((self.name + "_bucket", labels, (("le", _format_value(bound)),), cumulative))
+                samples.append((self.name + "_sum", labels, (), total))
+                samples.append((self.name + "_count", labels, (), cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Set of metrics exported together in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, function, kind="gauge"):
+        return self.register(Gauge(name, documentation, function, kind))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+        - str: The metrics, ready to be served on /metrics.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of the FastAPI application. Gauges reading other components are registered by the application.
+registry = MetricsRegistry()
+stage_seconds = registry.histogram("mora_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+request_seconds = registry.histogram("mora_request_seconds", "Time to answer each request", ["endpoint"])
+requests_total = registry.counter("mora_requests_total", "Requests answered", ["endpoint", "status"])
+audio_seconds_total = registry.counter("mora_audio_seconds_total", "Seconds of audio processed")
+
+
+def observe_stages(timings):
+    """
+    Adds the stage timings of a request to the stage histogram.
+
+    Parameters:
+    - timings (dict): Seconds per stage, as collected by `collect_timings`.
+    """
+    for name, seconds in timings.items():
+        stage_seconds.observe(seconds, name)
@@ -0,0 +1,253 @@
+# Standard library imports
+import threading
+from collections import OrderedDict
+
+# Local application imports
+from . import config
+from .metrics import stage
+
+
+# Compute precisions accepted by `load_whisper_model`.
+DTYPES = ("fp32", "fp16", "int8")
+
+
+def quantize_linear_layers(model):
+    """
+    Applies dynamic int8 quantization to the linear layers of a Whisper model, in place.
+
+    The weights of the linear layers (attention projections, MLPs) are stored as int8 and the activations are
+    quantized on the fly, which roughly halves the memory of the model and speeds up CPU inference. Convolutions,
+    embeddings and layer norms stay in fp32.
+
+    Parameters:
+    - model (whisper.model.Whisper): A model loaded in fp32 on the CPU.
+
+    Returns:
+    - whisper.model.Whisper: The quantized model.
+    """
+    import torch
+    from whisper.model import Linear as WhisperLinear
+
+    # Whisper subclasses nn.Linear only to cast the weights to the input dtype, which is a no-op in fp32; the
+    # quantization only converts modules that are exactly nn.Linear
+    for module in model.modules():
+        if type(module) is WhisperLinear:
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_whisper_model(model_size, device, dtype):
+    """
+    Loads a Whisper model with the requested size, device and compute dtype.
+
+    Parameters:
+    - model_size (str): Name of the Whisper checkpoint (e.g. "tiny", "base", "small").
+    - device (str): Torch device where the weights are placed (e.g. "cpu", "cuda").
+    - dtype (str): Compute precision, one of DTYPES. Half precision is only honoured on GPU devices; int8 (dynamic
+      quantization of the linear layers) is only available on the CPU.
+
+    Returns:
+    - whisper.model.Whisper: The loaded model, ready for inference.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported compute dtype: {dtype}")
+    if dtype == "int8" and device != "cpu":
+        raise ValueError("int8 quantization is only available on the cpu device")
+
+    # Imported on first load: torch takes seconds to import, and the registry is imported by every entry point
+    import whisper_timestamped
+    model = whisper_timestamped.load_model(model_size, device=device)
+    if dtype == "fp16" and device != "cpu":
+        model = model.half()
+    elif dtype == "int8":
+        model = quantize_linear_layers(model.eval())
+    return model
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of Whisper models.
+
+    Models are registered under a name and identified by the key (model size, device, compute dtype), so two names
+    pointing to the same configuration share a single copy of the weights. A model is loaded lazily the first time
+    it is requested, or eagerly through `preload`. When more than `max_models` models are resident, the least
+    recently used one is evicted.
+    """
+
+    def __init__(self, max_models=2, loader=load_whisper_model):
+        """
+        Parameters:
+        - max_models (int): Maximum number of models kept in memory at the same time.
+        - loader (callable): Function receiving (model_size, device, dtype) and returning a loaded model.
+        """
+        if max_models < 1:
+            raise ValueError("max_models must be at least 1")
+        self.max_models = max_models
+        self._loader = loader
+        self._names = {}
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, model_size="base", device="cpu", dtype="fp32"):
+        """
+        Registers (or replaces) a named model configuration. The model is not loaded until it is requested.
+
+        Parameters:
+        - name (str): Name used to request the model.
+        - model_size (str): Name of the Whisper checkpoint.
+        - device (str): Torch device where the weights are placed.
+        - dtype (str): Compute precision of the model.
+
+        Returns:
+        - tuple: The (model size, device, dtype) key of the registered configuration.
+        """
+        key = (model_size, device, dtype)
+        with self._lock:
+            self._names[name] = key
+        return key
+
+    def key_for(self, name):
+        """
+        Returns the (model size, device, dtype) key registered under a name.
+
+        Parameters:
+        - name (str): Name of a registered model.
+
+        Returns:
+        - tuple: The key of the model configuration.
+        """
+        with self._lock:
+            if name not in self._names:
+                raise KeyError(f"No model registered under the name: {name}")
+            return self._names[name]
+
+    def names(self):
+        """
+        Returns the registered model names.
+
+        Returns:
+        - list: The names, in registration order.
+        """
+        with self._lock:
+            return list(self._names)
+
+    def get(self, name="default"):
+        """
+        Returns the model registered under a name, loading it if it is not resident.
+
+        Parameters:
+        - name (str): Name of a registered model.
+
+        Returns:
+        - whisper.model.Whisper: The loaded model.
+        """
+        return self.get_by_key(*self.key_for(name))
+
+    def get_by_key(self, model_size, device="cpu", dtype="fp32"):
+        """
+        Returns the model for a (model size, device, dtype) configuration, loading it if it is not resident.
+
+        Concurrent requests for a model that is still loading wait for the same load instead of loading the
+        weights twice.
+
+        Parameters:
+        - model_size (str): Name of the Whisper checkpoint.
+        - device (str): Torch device where the weights are placed.
+        - dtype (str): Compute precision of the model.
+
+        Returns:
+        - whisper.model.Whisper: The loaded model.
+        """
+        key = (model_size, device, dtype)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another thread may have finished loading the model while we were waiting.
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key]
+                self.misses += 1
+
+            with stage("model_load"):
+                model = self._loader(model_size, device, dtype)
+
+            with self._lock:
+                self._models[key] = model
+                self._models.move_to_end(key)
+                while len(self._models) > self.max_models:
+                    evicted_key, _ = self._models.popitem(last=False)
+                    print("Evicted Whisper model:", evicted_key)
+                self._load_locks.pop(key, None)
+        return model
+
+    def preload(self, names):
+        """
+        Eagerly loads the given named models, e.g. when the application starts.
+
+        Parameters:
+        - names (iterable): Names of registered models.
+        """
+        for name in names:
+            self.get(name)
+
+    def evict(self, name):
+        """
+        Removes the model registered under a name from memory. It is loaded again on the next request.
+
+        Parameters:
+        - name (str): Name of a registered model.
+
+        Returns:
+        - bool: True if the model was resident and has been evicted.
+        """
+        key = self.key_for(name)
+        with self._lock:
+            return self._models.pop(key, None) is not None
+
+    def resident(self):
+        """
+        Returns the keys of the models currently in memory, from least to most recently used.
+
+        Returns:
+        - list: The (model size, device, dtype) keys of the resident models.
+        """
+        with self._lock:
+            return list(self._models)
+
+    def clear(self):
+        """
+        Removes every model from memory. Registered names are kept.
+        """
+        with self._lock:
+            self._models.clear()
+
+
+# Registry shared by the whole process.
+model_registry = ModelRegistry(max_models=config.MAX_RESIDENT_MODELS)
+model_registry.register("default", config.WHISPER_MODEL_SIZE, config.WHISPER_DEVICE, config.WHISPER_DTYPE)
+# Reduced-precision inference modes, selected by name like any other model.
+model_registry.register("int8", config.WHISPER_MODEL_SIZE, "cpu", "int8")
+model_registry.register("fast", config.WHISPER_FAST_MODEL_SIZE, "cpu", config.WHISPER_FAST_DTYPE)
+
+
+def get_model(name="default"):
+    """
+    Returns a named model from the process-wide registry.
+
+    Parameters:
+    - name (str): Name of a registered model. Defaults to the pipeline model configured in `scripts.config`.
+
+    Returns:
+    - whisper.model.Whisper: The loaded model.
+    """
+    return model_registry.get(name)
@@ -0,0 +1,199 @@
+# Standard library imports
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+# Japanese punctuation symbols that carry no consonant/vowel information of their own.
+PUNCTUATION_SYMBOLS = frozenset(['ー', 'ッ', '゜', '゛', '?', '。', '、', '「', '」', '『', '』', '（', '）', '・', 'ゝ',
+                                 'ゞ', 'ヽ', 'ヾ'])
+
+# Translation table that deletes the punctuation symbols from a string.
+PUNCTUATION_TABLE = str.maketrans("", "", "".join(PUNCTUATION_SYMBOLS))
+
+# Small kana that form a single mora with the preceding kana (e.g. きゃ, シェ, ファ).
+SMALL_Y_KANA = frozenset("ゃゅょャュョ")
+SMALL_VOWEL_KANA = frozenset("ぁぃぅぇぉァィゥェォ")
+SMALL_KANA = SMALL_Y_KANA | SMALL_VOWEL_KANA
+
+# Consonants that are already palatal, so the glide of a small ゃ/ゅ/ょ does not add a "y" (しゃ -> sh + a).
+_PALATAL_CONSONANTS = frozenset(["sh", "ch", "j"])
+
+# Offset between a hiragana and its katakana counterpart in Unicode.
+_KATAKANA_OFFSET = ord("ア") - ord("あ")
+
+
+class MoraInfo(NamedTuple):
+    """
+    Phonetic information of a mora: its consonant and vowel strings and the number of symbols in each, which
+    weights the time given to the consonant and the vowel.
+    """
+    consonant: Optional[str]
+    vowel: Optional[str]
+    consonant_count: int
+    vowel_count: int
+
+
+def _mora_info(consonant, vowel):
+    return MoraInfo(consonant, vowel, len(consonant) if consonant else 0, len(vowel) if vowel else 0)
+
+
+def _counterpart(kana):
+    """
+    Returns the kana in the other syllabary (hiragana <-> katakana), or None for other characters.
+    """
+    code = ord(kana)
+    if ord("ぁ") <= code <= ord("ゖ"):
+        return chr(code + _KATAKANA_OFFSET)
+    if ord("ァ") <= code <= ord("ヶ"):
+        return chr(code - _KATAKANA_OFFSET)
+    return None
+
+
+def _combine(base, small):
+    """
+    Builds the mora of a kana followed by a small kana.
+
+    Parameters:
+    - base (MoraInfo): The full-size kana (e.g. き).
+    - small (MoraInfo): The small kana (e.g. ゃ).
+
+    Returns:
+    - MoraInfo: The combined mora (e.g. ky + a), or None if the combination is not a valid mora.
+    """
+    if small.vowel is None:
+        return None
+    if small.consonant == "y":
+        # Youon: only i-row kana with a consonant take a small ゃ/ゅ/ょ.
+        if base.vowel != "i" or not base.consonant:
+            return None
+        consonant = base.consonant if base.consonant in _PALATAL_CONSONANTS else base.consonant + "y"
+    else:
+        # Small vowels replace the vowel of the base kana (ファ -> f + a, ウィ -> w + i, イェ -> y + e).
+        consonant = base.consonant or {"u": "w", "i": "y"}.get(base.vowel)
+    return _mora_info(consonant, small.vowel)
+
+
+class MoraTable:
+    """
+    Immutable lookup table from moras to their consonant and vowel information.
+
+    Compiled once from the mapping file: every entry is precomputed as a MoraInfo, kana missing in one syllabary
+    are filled in from the other one, and multi-kana moras (youon such as きゃ and combinations such as ファ)
+    are added for every pair that the file does not define explicitly.
+    """
+
+    def __init__(self, mapping):
+        """
+        Parameters:
+        - mapping (dict): The contents of the mapping file, from text to {"consonant": ..., "vowel": ...}.
+        """
+        table = {text: _mora_info(info.get("consonant"), info.get("vowel")) for text, info in mapping.items()}
+
+        for text in list(table):
+            counterpart = _counterpart(text) if len(text) == 1 else None
+            if counterpart is not None and counterpart not in table:
+                table[counterpart] = table[text]
+
+        small_kana = [text for text in table if text in SMALL_KANA]
+        for base_text, base in list(table.items()):
+            if len(base_text) != 1 or base_text in SMALL_KANA or base_text in PUNCTUATION_SYMBOLS:
+                continue
+            # Youon need the consonant of the base kana; take it from the other syllabary if this one lacks it.
+            counterpart = table.get(_counterpart(base_text))
+            if not base.consonant and counterpart is not None and counterpart.vowel == base.vowel:
+                base = counterpart
+            for small_text in small_kana:
+                combined = _combine(base, table[small_text])
+                if combined is not None and base_text + small_text not in table:
+                    table[base_text + small_text] = combined
+
+        self._table = MappingProxyType(table)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, text):
+        return text in self._table
+
+    def lookup(self, text):
+        """
+        Returns the phonetic information of a symbol, ignoring its punctuation.
+
+        Parameters:
+        - text (str): The symbol, e.g. "キョ" or "た。".
+
+        Returns:
+        - MoraInfo: The information of the symbol, or None if it is not in the table.
+        """
+        return self._table.get(text.translate(PUNCTUATION_TABLE).strip())
+
+
+def split_moras(text):
+    """
+    Splits a word in Kana into the symbols that are timed as one mora.
+
+    Small kana are grouped with the preceding kana (e.g. キョ), a following punctuation symbol is grouped with the
+    current symbol, and a leading punctuation symbol with the first one (e.g. 「シャ).
+
+    Parameters:
+    - text (str): The word in Kana.
+
+    Returns:
+    - list: The symbols of the word, in order.
+    """
+    symbols = []
+    i = 0  # Index to keep track of the current position in the text.
+    prefix = ""  # Leading punctuation to be grouped with the following symbol.
+    if text and text[0] in PUNCTUATION_SYMBOLS and len(text) > 1:
+        prefix = text[0]
+        i = 1  # Move the index past the leading punctuation.
+
+    while i < len(text):
+        symbol = prefix + text[i]
+        prefix = ""
+        i += 1
+        # Small kana form a single mora with the preceding kana (e.g. キョ).
+        if i < len(text) and text[i] in SMALL_KANA:
+            symbol += text[i]
+            i += 1
+        # A following punctuation symbol is grouped with the current one.
+        if i < len(text) and text[i] in PUNCTUATION_SYMBOLS:
+            symbol += text[i]
+            i += 1
+        symbols.append(symbol)
+    return symbols
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def load_mora_table(mapping_file):
+    """
+    Returns the compiled MoraTable of a mapping file.
+
+    The table is compiled the first time the file is requested and reused afterwards; it is compiled again only if
+    the file is modified.
+
+    Parameters:
+    - mapping_file (str): Path to the JSON file containing the consonant and vowel mapping for symbols.
+
+    Returns:
+    - MoraTable: The compiled table, or None if the file does not exist.
+    """
+    if not os.path.exists(mapping_file):
+        return None
+    path = os.path.abspath(mapping_file)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    with open(path, 'r', encoding='utf-8') as file:
+        table = MoraTable(json.load(file))
+    with _tables_lock:
+        _tables[path] = (version, table)
+    return table
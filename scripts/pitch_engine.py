@@ -0,0 +1,159 @@
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import load_audio
+
+
+def _pitch_detector(method, buffer_size, hop_size, sample_rate, tolerance):
+    """
+    Creates an Aubio pitch detector returning Hz. Aubio is imported here, so importing this module stays cheap.
+    """
+    import aubio
+    pitch_detector = aubio.pitch(method, buffer_size, hop_size, sample_rate)
+    pitch_detector.set_unit("Hz")
+    pitch_detector.set_tolerance(tolerance)
+    return pitch_detector
+
+
+class PitchTrack:
+    """
+    F0 contour of a whole utterance.
+
+    Stores one pitch estimate per analysis frame, so any number of time intervals (moras, words, vowels) can be
+    summarised afterwards with array indexing instead of running the pitch detector again.
+    """
+
+    def __init__(self, times, f0, voiced):
+        """
+        Parameters:
+        - times (np.ndarray): Start time of each frame in seconds, in increasing order.
+        - f0 (np.ndarray): Pitch of each frame in Hertz, 0 for unvoiced frames.
+        - voiced (np.ndarray): Boolean mask of the frames where a pitch was detected.
+        """
+        self.times = times
+        self.f0 = f0
+        self.voiced = voiced
+        # Cumulative sums make the sum over any frame range a single subtraction.
+        self._voiced_cumsum = np.concatenate(([0], np.cumsum(voiced, dtype=np.int64)))
+        self._f0_cumsum = np.concatenate(([0.0], np.cumsum(f0, dtype=np.float64)))
+
+    def shifted(self, offset):
+        """
+        Returns the same contour with its frame times moved, e.g. from window time to absolute time.
+
+        Parameters:
+        - offset (float): Seconds added to every frame time.
+
+        Returns:
+        - PitchTrack: The shifted contour.
+        """
+        return PitchTrack(self.times + offset, self.f0, self.voiced)
+
+    def frame_ranges(self, starts, ends):
+        """
+        Returns the range of frames that fall inside each interval.
+
+        Parameters:
+        - starts (array-like): Start time of each interval in seconds.
+        - ends (array-like): End time of each interval in seconds.
+
+        Returns:
+        - tuple: Two integer arrays (first, last) so that frames first[i]:last[i] belong to interval i.
+        """
+        first = np.searchsorted(self.times, np.asarray(starts, dtype=np.float64), side="left")
+        last = np.searchsorted(self.times, np.asarray(ends, dtype=np.float64), side="left")
+        return first, np.maximum(last, first)
+
+    def mean_pitch(self, starts, ends):
+        """
+        Calculates the mean pitch of several intervals at once.
+
+        Only voiced frames contribute to the mean. Intervals without voiced frames get 0.
+
+        Parameters:
+        - starts (array-like): Start time of each interval in seconds.
+        - ends (array-like): End time of each interval in seconds.
+
+        Returns:
+        - np.ndarray: The mean pitch of each interval in Hertz.
+        """
+        first, last = self.frame_ranges(starts, ends)
+        voiced_frames = self._voiced_cumsum[last] - self._voiced_cumsum[first]
+        f0_sum = self._f0_cumsum[last] - self._f0_cumsum[first]
+        return np.divide(f0_sum, voiced_frames, out=np.zeros(len(first)), where=voiced_frames > 0)
+
+
+def compute_pitch_track(audio, buffer_size=2048, hop_size=512, tolerance=0.8, method="default"):
+    """
+    Computes the F0 contour of a whole audio in a single pass of the Aubio pitch detector.
+
+    The detector is fed consecutive hops of `hop_size` samples, which is the input size it was configured for, so
+    every frame is analysed with the same window and overlap.
+
+    Parameters:
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file to be analyzed.
+    - buffer_size (int): Analysis window of the detector in samples.
+    - hop_size (int): Distance between consecutive frames in samples.
+    - tolerance (float): Tolerance of the pitch detector.
+    - method (str): Aubio pitch detection method.
+
+    Returns:
+    - PitchTrack: The pitch of every frame of the audio.
+    """
+    audio = load_audio(audio)
+    pitch_detector = _pitch_detector(method, buffer_size, hop_size, audio.sample_rate, tolerance)
+
+    # Pad the signal with zeros so that it splits into whole hops.
+    frame_count = -(-len(audio.samples) // hop_size)
+    samples = np.zeros(frame_count * hop_size, dtype=np.float32)
+    samples[:len(audio.samples)] = audio.samples
+    hops = samples.reshape(frame_count, hop_size)
+
+    f0 = np.fromiter((pitch_detector(hop)[0] for hop in hops), dtype=np.float64, count=frame_count)
+    voiced = f0 > 0
+    f0[~voiced] = 0.0
+    times = np.arange(frame_count) * hop_size / audio.sample_rate
+    return PitchTrack(times, f0, voiced)
+
+
+class PitchTracker:
+    """
+    Streaming version of `compute_pitch_track`: the Aubio pitch detector is fed the samples as they arrive and
+    returns the pitch of every complete hop, so live audio gets its contour without waiting for the whole signal.
+
+    Fed the same samples, it returns the same frames as `compute_pitch_track` (except the zero padding of the last
+    hop, which only happens at the end of the audio).
+    """
+
+    def __init__(self, sample_rate, buffer_size=2048, hop_size=512, tolerance=0.8, method="default"):
+        """
+        Parameters:
+        - sample_rate (int): Sample rate of the samples in Hz.
+        - buffer_size, hop_size, tolerance, method: As in `compute_pitch_track`.
+        """
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self._detector = _pitch_detector(method, buffer_size, hop_size, sample_rate, tolerance)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.frame_count = 0
+
+    def feed(self, samples):
+        """
+        Analyses new samples.
+
+        Parameters:
+        - samples (np.ndarray): The next mono float32 samples of the audio.
+
+        Returns:
+        - tuple: Arrays (times, f0) of the frames completed by these samples; f0 is 0 for unvoiced frames.
+        """
+        samples = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        frame_count = len(samples) // self.hop_size
+        self._pending = samples[frame_count * self.hop_size:]
+        hops = samples[:frame_count * self.hop_size].reshape(frame_count, self.hop_size)
+        f0 = np.fromiter((self._detector(hop)[0] for hop in hops), dtype=np.float64, count=frame_count)
+        f0[f0 < 0] = 0.0
+        times = (self.frame_count + np.arange(frame_count)) * self.hop_size / self.sample_rate
+        self.frame_count += frame_count
+        return times, f0
@@ -0,0 +1,201 @@
+# Standard library imports
+import argparse
+import difflib
+import io
+import json
+import os
+import sys
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import AudioBuffer
+from .model_registry import model_registry
+from .speech_symbol_timestamps import transcribe_samples, words_in_kana
+from .batch_mora import collect_audio_files
+
+# Names under which the guard registers the compared models, so their settings never depend on the environment.
+REFERENCE_MODEL = "guard_reference"
+CANDIDATE_MODEL = "guard_candidate"
+
+
+def match_words(reference, candidate):
+    """
+    Pairs the words two transcriptions agree on, in order.
+
+    Parameters:
+    - reference, candidate (list): Words with their 'text', 'start' and 'end'.
+
+    Returns:
+    - list: (reference word, candidate word) pairs with the same text.
+    """
+    matcher = difflib.SequenceMatcher(None, [word["text"] for word in reference],
+                                      [word["text"] for word in candidate], autojunk=False)
+    return [(reference[block.a + offset], candidate[block.b + offset])
+            for block in matcher.get_matching_blocks() for offset in range(block.size)]
+
+
+def timestamp_drift(reference, candidate):
+    """
+    Measures how far the word timestamps of a transcription are from a reference transcription.
+
+    Parameters:
+    - reference, candidate (list): Words with their 'text', 'start' and 'end'.
+
+    Returns:
+    - dict: The word counts, the agreement (fraction of the reference words found in the candidate) and the mean,
+      95th percentile and maximum absolute drift of the starts and ends of the matched words, in seconds.
+    """
+    pairs = match_words(reference, candidate)
+    drift = {}
+    for edge in ("start", "end"):
+        differences = np.array([abs(word[edge] - other[edge]) for word, other in pairs])
+        drift[edge] = {
+            "mean": round(float(differences.mean()), 4),
+            "p95": round(float(np.percentile(differences, 95)), 4),
+            "max": round(float(differences.max()), 4),
+        } if len(differences) else None
+    return {
+        "reference_words": len(reference),
+        "candidate_words": len(candidate),
+        "matched_words": len(pairs),
+        "agreement": round(len(pairs) / len(reference), 4) if reference else 1.0,
+        "drift": drift,
+    }
+
+
+def model_bytes(model):
+    """
+    Returns the size of the serialized weights of a model, packed int8 weights included.
+    """
+    import torch
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def _transcribe_words(samples, model_name, language):
+    """
+    Transcribes samples and returns their words in Kana with the wall time of the transcription.
+    """
+    start_time = time.perf_counter()
+    result = transcribe_samples(samples, model_name, language)
+    return words_in_kana(result), time.perf_counter() - start_time
+
+
+def run_guard(inputs, model_size="base", dtype="int8", candidate_size=None, threads=1, language="ja"):
+    """
+    Transcribes every clip with the fp32 reference model and with a reduced-precision candidate, and reports the
+    drift of the candidate word timestamps and the speed and size of both models.
+
+    Parameters:
+    - inputs (list): Directories, glob patterns, audio files or manifests (see `collect_audio_files`).
+    - model_size (str): Whisper checkpoint of the reference, always on CPU in fp32.
+    - dtype (str): Compute precision of the candidate (see `load_whisper_model`).
+    - candidate_size (str): Whisper checkpoint of the candidate, e.g. a smaller tier. Defaults to `model_size`.
+    - threads (int): Number of torch intra-op threads.
+    - language (str): Language of the audio.
+
+    Returns:
+    - dict: The settings, the results of each clip and the totals over all the clips.
+    """
+    import torch
+    torch.set_num_threads(threads)
+    torch.manual_seed(0)
+    candidate_size = candidate_size or model_size
+    model_registry.register(REFERENCE_MODEL, model_size, "cpu", "fp32")
+    model_registry.register(CANDIDATE_MODEL, candidate_size, "cpu", dtype)
+
+    # Loaded before the clips, so the load time is not counted as transcription time
+    sizes = {name: model_bytes(model_registry.get(name)) for name in (REFERENCE_MODEL, CANDIDATE_MODEL)}
+
+    clips = {}
+    all_reference, all_candidate = [], []
+    seconds = {"audio": 0.0, "reference": 0.0, "candidate": 0.0}
+    for clip in collect_audio_files(inputs):
+        audio = AudioBuffer.from_file(clip)
+        reference, reference_seconds = _transcribe_words(audio.samples, REFERENCE_MODEL, language)
+        candidate, candidate_seconds = _transcribe_words(audio.samples, CANDIDATE_MODEL, language)
+        clips[os.path.basename(clip)] = {
+            "audio_seconds": round(audio.duration, 3),
+            "reference_seconds": round(reference_seconds, 3),
+            "candidate_seconds": round(candidate_seconds, 3),
+            **timestamp_drift(reference, candidate),
+        }
+        # Offset the words of every clip so the totals never match words across clips
+        offset = len(all_reference)
+        all_reference.extend({**word, "text": (offset, word["text"])} for word in reference)
+        all_candidate.extend({**word, "text": (offset, word["text"])} for word in candidate)
+        seconds["audio"] += audio.duration
+        seconds["reference"] += reference_seconds
+        seconds["candidate"] += candidate_seconds
+        print(f"Compared: {clip}")
+
+    return {
+        "reference": {"size": model_size, "dtype": "fp32", "bytes": sizes[REFERENCE_MODEL]},
+        "candidate": {"size": candidate_size, "dtype": dtype, "bytes": sizes[CANDIDATE_MODEL]},
+        "threads": threads,
+        "clips": clips,
+        "totals": {
+            **timestamp_drift(all_reference, all_candidate),
+            "audio_seconds": round(seconds["audio"], 3),
+            "reference_seconds": round(seconds["reference"], 3),
+            "candidate_seconds": round(seconds["candidate"], 3),
+            "speedup": round(seconds["reference"] / seconds["candidate"], 3) if seconds["candidate"] else None,
+            "size_ratio": round(sizes[CANDIDATE_MODEL] / sizes[REFERENCE_MODEL], 3),
+        },
+    }
+
+
+def check_guard(results, max_drift=0.1, min_agreement=0.9):
+    """
+    Lists the failures of a guard run: a mean start or end drift above `max_drift` seconds, or an agreement below
+    `min_agreement`, over all the clips.
+
+    Returns:
+    - list: Descriptions of the failures. Empty when the candidate is accurate enough.
+    """
+    totals = results["totals"]
+    failures = []
+    if totals["agreement"] < min_agreement:
+        failures.append(f"Word agreement {totals['agreement']:.1%} is below {min_agreement:.1%}")
+    for edge, drift in totals["drift"].items():
+        if drift is not None and drift["mean"] > max_drift:
+            failures.append(f"Mean {edge} drift {drift['mean']:.3f} s is above {max_drift:.3f} s")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the word timestamps of a reduced-precision Whisper model "
+                                                 "with the fp32 model.")
+    parser.add_argument("inputs", nargs="*", default=["test_audios"],
+                        help="Directories, glob patterns, audio files or manifests (default: test_audios)")
+    parser.add_argument("-o", "--output", default="results/quantization_guard.json", help="Output JSON file")
+    parser.add_argument("--model-size", default="base", help="Whisper checkpoint of the fp32 reference")
+    parser.add_argument("--dtype", choices=["fp32", "int8"], default="int8", help="Precision of the candidate")
+    parser.add_argument("--candidate-size", help="Whisper checkpoint of the candidate (default: --model-size)")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="Torch threads used by Whisper")
+    parser.add_argument("--language", default="ja", help="Language of the audio")
+    parser.add_argument("--max-drift", type=float, default=0.1, help="Allowed mean timestamp drift in seconds")
+    parser.add_argument("--min-agreement", type=float, default=0.9,
+                        help="Fraction of the reference words the candidate must transcribe identically")
+    args = parser.parse_args(argv)
+
+    results = run_guard(args.inputs, args.model_size, args.dtype, args.candidate_size, args.threads, args.language)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, ensure_ascii=False, indent=2)
+    print("Totals:", json.dumps(results["totals"], ensure_ascii=False))
+
+    failures = check_guard(results, args.max_drift, args.min_agreement)
+    for failure in failures:
+        print("Failure:", failure)
+    if failures:
+        sys.exit(1)
+    print(f"The {args.dtype} candidate is within {args.max_drift} s and {args.min_agreement:.0%} agreement")
+
+
+if __name__ == "__main__":
+    main()
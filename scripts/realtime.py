@@ -0,0 +1,266 @@
+# Standard library imports
+import threading
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import SAMPLE_RATE, StreamResampler
+from .pitch_engine import PitchTrack, PitchTracker
+from .mora_mapping import load_mora_table
+from .speech_symbol_timestamps import transcribe_samples, words_in_kana, build_accent_phrases, audio_query_metadata
+
+# Sample formats accepted from live clients, as the numpy dtype of their little-endian samples and their scale.
+PCM_ENCODINGS = {"pcm_s16le": ("<i2", 32768.0), "pcm_f32le": ("<f4", 1.0)}
+
+
+def decode_pcm(data, encoding="pcm_s16le"):
+    """
+    Converts a chunk of raw PCM bytes to mono float32 samples in the range [-1, 1].
+
+    Parameters:
+    - data (bytes): The raw samples. A trailing partial sample is ignored.
+    - encoding (str): One of PCM_ENCODINGS.
+
+    Returns:
+    - np.ndarray: The samples.
+    """
+    dtype, scale = PCM_ENCODINGS[encoding]
+    size = np.dtype(dtype).itemsize
+    samples = np.frombuffer(data[:len(data) - len(data) % size], dtype=dtype).astype(np.float32)
+    return samples / scale if scale != 1.0 else samples
+
+
+class RingBuffer:
+    """
+    Last `capacity` samples of a live stream, addressed by absolute sample index.
+
+    Memory does not grow with the duration of the stream: older samples are overwritten.
+    """
+
+    def __init__(self, capacity):
+        self._samples = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        self.end = 0  # Absolute index after the last written sample.
+
+    @property
+    def start(self):
+        """
+        int: Absolute index of the oldest sample still held.
+        """
+        return max(self.end - self.capacity, 0)
+
+    def write(self, samples):
+        count = len(samples)
+        samples = samples[-self.capacity:]
+        position = (self.end + count - len(samples)) % self.capacity
+        head = min(len(samples), self.capacity - position)
+        self._samples[position:position + head] = samples[:head]
+        self._samples[:len(samples) - head] = samples[head:]
+        self.end += count
+
+    def read(self, start, end):
+        """
+        Returns a copy of the samples between two absolute indices, clipped to the samples still held.
+        """
+        start, end = max(start, self.start), min(end, self.end)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+        indices = np.arange(start, end) % self.capacity
+        return self._samples[indices]
+
+
+class RealtimeSession:
+    """
+    Live version of the mora pipeline, for audio that arrives in chunks while it is being recorded.
+
+    `feed` stores each chunk in a ring buffer and returns the pitch frames it completes right away. `transcribe`
+    runs Whisper on a sliding window that starts at the last committed word (with a little context) and ends at the
+    live edge. A word is committed once two consecutive passes agree on it and it ends at least `latency_seconds`
+    before the live edge; committed words become accent phrases and are never revised. The other words are
+    tentative: each pass replaces the tentative words of the previous one, which rolls back those that changed.
+    Words still tentative after half the ring buffer are committed as they are, so the window always fits in the
+    buffer and memory stays bounded by `buffer_seconds`.
+
+    The methods return events, dictionaries with a 'type':
+    - "pitch": 'times' and 'f0' (Hz, 0 when unvoiced) of new pitch frames.
+    - "tentative": the current tentative 'words', replacing the previous ones.
+    - "moras": the 'accent_phrases' of newly committed words.
+    - "end": the metadata of the audio query (final pause, kana...), after `finish`.
+
+    `feed` and `transcribe` may be called from different threads. Passes are serialized: a pass (or `finish`) started
+    while another one is still running waits for it, so an overrunning periodic pass never interleaves with the
+    next one or with the final pass. `feed` must be called from one thread at a time, as the chunks are ordered.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, latency_seconds=1.0, buffer_seconds=30.0, context_seconds=1.0,
+                 agreement_seconds=0.2, mapping_file="files/mapping.json", model_name="default", language="ja",
+                 transcriber=None, decimals=4):
+        """
+        Parameters:
+        - sample_rate (int): Sample rate of the samples given to `feed`. They are resampled to 16 kHz as one
+          continuous signal, so the timestamps follow the total number of samples received.
+        - latency_seconds (float): How long before the live edge a word must end to be committed. Lower values
+          give the moras sooner but commit words Whisper may still revise.
+        - buffer_seconds (float): Audio kept in memory, and the longest window transcribed. 30 s matches the
+          Whisper input window.
+        - context_seconds (float): Committed audio transcribed again before the first tentative word, as context.
+        - agreement_seconds (float): Largest start difference of a word seen by two passes to count as the same.
+        - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+        - model_name (str): Name of the Whisper model in the process-wide model registry.
+        - language (str): Language of the audio.
+        - transcriber (callable): Optional replacement of whisper_timestamped, receiving the samples
+          and the `language` keyword.
+        - decimals (int): Number of decimal places of the symbol timestamps.
+        """
+        self.input_rate = sample_rate
+        self._resampler = StreamResampler(sample_rate, SAMPLE_RATE) if sample_rate != SAMPLE_RATE else None
+        self.latency_seconds = latency_seconds
+        self.context_seconds = context_seconds
+        self.max_tentative_seconds = buffer_seconds / 2
+        self.agreement_seconds = agreement_seconds
+        self.mapping_file = mapping_file
+        self.model_name = model_name
+        self.language = language
+        self.transcriber = transcriber
+        self.decimals = decimals
+
+        self._lock = threading.Lock()  # Guards the ring buffer and the pitch frames.
+        self._transcribe_lock = threading.Lock()  # Held for a whole pass, guards the word state below.
+        self._ring = RingBuffer(int(buffer_seconds * SAMPLE_RATE))
+        self._pitch = PitchTracker(SAMPLE_RATE)
+        # Pitch frames of the audio still in the ring buffer.
+        frame_capacity = self._ring.capacity // self._pitch.hop_size + 1
+        self._pitch_times = np.zeros(frame_capacity)
+        self._pitch_f0 = np.zeros(frame_capacity)
+        self._pitch_count = 0
+
+        self.committed_until = 0.0  # Words whose middle is before this instant have been committed.
+        self.last_word_time = 0.0
+        self.tentative = []
+        self.kana_words = []
+        self._transcribed_end = 0
+
+    @property
+    def duration(self):
+        """
+        float: Seconds of audio received so far.
+        """
+        return self._ring.end / SAMPLE_RATE
+
+    def has_new_audio(self):
+        """
+        Returns whether audio arrived since the last transcription pass.
+        """
+        return self._ring.end > self._transcribed_end
+
+    def feed(self, samples):
+        """
+        Adds a chunk of live audio.
+
+        Parameters:
+        - samples (np.ndarray): Mono float32 samples at the session sample rate.
+
+        Returns:
+        - list: A "pitch" event with the frames completed by the chunk, if any.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if self._resampler is not None:
+            samples = self._resampler.feed(samples)
+        return self._append(samples)
+
+    def _append(self, samples):
+        # Stores 16 kHz samples and computes the pitch frames they complete
+        with self._lock:
+            self._ring.write(samples)
+            times, f0 = self._pitch.feed(samples)
+            # Keep the frames in a ring as well, indexed by frame number
+            positions = (self._pitch_count + np.arange(len(times))) % len(self._pitch_times)
+            self._pitch_times[positions] = times
+            self._pitch_f0[positions] = f0
+            self._pitch_count += len(times)
+        if not len(times):
+            return []
+        return [{"type": "pitch", "times": np.round(times, 3).tolist(), "f0": np.round(f0, 2).tolist()}]
+
+    def _pitch_track(self):
+        """
+        Returns the pitch frames still held as a PitchTrack, in chronological order.
+        """
+        with self._lock:
+            count = min(self._pitch_count, len(self._pitch_times))
+            positions = (self._pitch_count - count + np.arange(count)) % len(self._pitch_times)
+            times, f0 = self._pitch_times[positions], self._pitch_f0[positions]
+        return PitchTrack(times, f0, f0 > 0)
+
+    def _same_word(self, word, other):
+        return word["text"] == other["text"] and abs(word["start"] - other["start"]) <= self.agreement_seconds
+
+    def transcribe(self, final=False):
+        """
+        Runs a transcription pass over the audio received since the last committed word.
+
+        Parameters:
+        - final (bool): Whether the stream has ended. Every word is then committed.
+
+        Returns:
+        - list: The "moras" event of the newly committed words (if any) and the "tentative" event.
+        """
+        with self._transcribe_lock:
+            return self._transcribe(final)
+
+    def _transcribe(self, final):
+        # One pass; the caller holds the transcribe lock
+        with self._lock:
+            end = self._ring.end
+            start = max(int((self.committed_until - self.context_seconds) * SAMPLE_RATE), self._ring.start)
+            window = self._ring.read(start, end)
+        self._transcribed_end = end
+        live_edge = end / SAMPLE_RATE
+
+        words = []
+        if len(window):
+            result = transcribe_samples(window, self.model_name, self.language, self.transcriber)
+            words = [word for word in words_in_kana(result, offset=start / SAMPLE_RATE)
+                     if (word["start"] + word["end"]) / 2 >= self.committed_until]
+
+        # Commit the longest prefix that the previous pass agrees on and that is old enough. Words tentative for
+        # half the buffer are committed in any case, so the window never outgrows the ring buffer
+        commit_count = 0
+        for index, word in enumerate(words):
+            agreed = index < len(self.tentative) and self._same_word(word, self.tentative[index])
+            if final or word["end"] <= live_edge - self.max_tentative_seconds or (
+                    agreed and word["end"] <= live_edge - self.latency_seconds):
+                commit_count = index + 1
+            else:
+                break
+        committed, self.tentative = words[:commit_count], words[commit_count:]
+
+        events = []
+        if committed:
+            mora_table = load_mora_table(self.mapping_file) or self.mapping_file
+            accent_phrases, self.last_word_time = build_accent_phrases(committed, self._pitch_track(), mora_table,
+                                                                       self.decimals, self.last_word_time)
+            self.committed_until = committed[-1]["end"]
+            self.kana_words.extend(word["text"] for word in committed)
+            events.append({"type": "moras", "accent_phrases": accent_phrases})
+        elif not words:
+            # Nothing is being said: the silence does not need to be transcribed again
+            self.committed_until = max(self.committed_until, live_edge - self.latency_seconds - self.context_seconds)
+        events.append({"type": "tentative", "words": self.tentative})
+        return events
+
+    def finish(self):
+        """
+        Ends the stream: commits every remaining word and returns the final events.
+
+        Returns:
+        - list: The last "pitch" and "moras" events (if any) and the "end" event with the audio query metadata.
+        """
+        # The last input samples of a resampled stream are only complete now that no more input follows
+        events = self._append(self._resampler.flush()) if self._resampler is not None else []
+        with self._transcribe_lock:
+            events += [event for event in self._transcribe(final=True) if event["type"] == "moras"]
+            events.append({"type": "end", **audio_query_metadata(self.duration - self.last_word_time,
+                                                                 "".join(self.kana_words))})
+        return events
@@ -0,0 +1,113 @@
+# Standard library imports
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlencode
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import SAMPLE_RATE, AudioBuffer
+from .batch_mora import collect_audio_files
+
+# Duration of a pitch frame hop of the realtime sessions (the default of `PitchTracker`).
+PITCH_HOP_SECONDS = 512 / SAMPLE_RATE
+
+
+async def replay(audio_path, url="ws://127.0.0.1:5500/mora/realtime", chunk_seconds=0.1, speed=1.0, latency=None):
+    """
+    Streams an audio file to the realtime endpoint at the pace it would be recorded, and measures how long after
+    being spoken each pitch frame and each mora arrives.
+
+    Parameters:
+    - audio_path (str): The path to the audio file.
+    - url (str): WebSocket URL of the realtime endpoint.
+    - chunk_seconds (float): Duration of each PCM chunk sent.
+    - speed (float): Replay speed; 1.0 is real time.
+    - latency (float): Commit latency requested from the server. Defaults to the server setting.
+
+    Returns:
+    - dict: The number of moras received, the delays of the moras and of the pitch frames (median and 95th
+      percentile, in seconds of wall time after the end of the mora or frame was sent) and the transcription.
+    """
+    try:
+        import websockets
+    except ImportError as e:
+        raise ImportError("The replay client requires websockets: pip install websockets") from e
+
+    audio = AudioBuffer.from_file(audio_path)
+    pcm = (np.clip(audio.samples, -1.0, 1.0) * 32767).astype("<i2")
+    chunk_size = int(chunk_seconds * SAMPLE_RATE)
+    parameters = {"sample_rate": SAMPLE_RATE, "encoding": "pcm_s16le"}
+    if latency is not None:
+        parameters["latency"] = latency
+
+    mora_delays, pitch_delays, moras = [], [], []
+    metadata = {}
+    async with websockets.connect(f"{url}?{urlencode(parameters)}", max_size=None) as websocket:
+        start_time = time.perf_counter()
+
+        def delay(audio_time):
+            # Wall time elapsed since the audio at `audio_time` was sent
+            return time.perf_counter() - start_time - audio_time / speed
+
+        async def receive():
+            async for message in websocket:
+                event = json.loads(message)
+                if event["type"] == "pitch":
+                    # A frame is complete once its last hop has been sent
+                    pitch_delays.append(delay(event["times"][-1] + PITCH_HOP_SECONDS))
+                elif event["type"] == "moras":
+                    for phrase in event["accent_phrases"]:
+                        moras.extend(phrase["moras"])
+                        mora_delays.extend(delay(mora["end"]) for mora in phrase["moras"])
+                elif event["type"] == "error":
+                    raise RuntimeError(event["detail"])
+                elif event["type"] == "end":
+                    metadata.update(event)
+                    return
+
+        receiver = asyncio.create_task(receive())
+        for start in range(0, len(pcm), chunk_size):
+            await websocket.send(pcm[start:start + chunk_size].tobytes())
+            # Wait until the audio sent so far would have been recorded
+            await asyncio.sleep(max(start_time + (start + chunk_size) / SAMPLE_RATE / speed - time.perf_counter(), 0))
+        await websocket.send("end")
+        await receiver
+
+    def summary(delays):
+        if not delays:
+            return None
+        return {"median": round(statistics.median(delays), 3),
+                "p95": round(float(np.percentile(delays, 95)), 3)}
+
+    return {
+        "path": audio_path,
+        "audio_seconds": round(audio.duration, 3),
+        "moras": len(moras),
+        "mora_delay": summary(mora_delays),
+        "pitch_delay": summary(pitch_delays),
+        "kana": metadata.get("kana"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay audio files to the realtime endpoint as live audio.")
+    parser.add_argument("inputs", nargs="*", default=["test_audios"],
+                        help="Directories, glob patterns, audio files or manifests (default: test_audios)")
+    parser.add_argument("--url", default="ws://127.0.0.1:5500/mora/realtime", help="Realtime endpoint")
+    parser.add_argument("--chunk-ms", type=float, default=100.0, help="Duration of each PCM chunk")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (1.0 is real time)")
+    parser.add_argument("--latency", type=float, default=None, help="Commit latency requested from the server")
+    args = parser.parse_args(argv)
+
+    for audio_path in collect_audio_files(args.inputs):
+        result = asyncio.run(replay(audio_path, args.url, args.chunk_ms / 1000, args.speed, args.latency))
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# Standard library imports
+import gzip
+import json
+import time
+
+# Third-party library imports (optional: the standard json module and gzip are used without them)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Version tag of the compact schema, sent in the response so clients can check what they decode.
+COMPACT_FORMAT = "compact-1"
+
+# Order of the values of each accent phrase in the compact schema.
+COMPACT_PHRASE_FIELDS = ["moras", "accent", "is_interrogative", "complete_word", "pause_length"]
+
+
+def dumps(data):
+    """
+    Serializes a response to UTF-8 JSON bytes without whitespace.
+
+    Uses orjson when it is installed (several times faster on the float-heavy audio queries), and the standard
+    json module otherwise.
+
+    Parameters:
+    - data (dict): The data to serialize.
+
+    Returns:
+    - bytes: The JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compact_audio_query(audio_query):
+    """
+    Converts an audio query to the compact schema, which does not repeat the keys of every mora.
+
+    The mora keys are listed once in "mora_fields", each mora becomes an array of values in that order, and each
+    accent phrase becomes an array ordered as "phrase_fields". Pause moras only carry their length, since the rest
+    of their fields are constant. The metadata keys are kept unchanged.
+
+    Parameters:
+    - audio_query (dict): The audio query returned by `audio_query_json`.
+
+    Returns:
+    - dict: The audio query in the compact schema.
+    """
+    accent_phrases = audio_query["accent_phrases"]
+    mora_fields = list(dict.fromkeys(key for phrase in accent_phrases for mora in phrase["moras"] for key in mora))
+
+    compact = {
+        "format": COMPACT_FORMAT,
+        "mora_fields": mora_fields,
+        "phrase_fields": COMPACT_PHRASE_FIELDS,
+        "accent_phrases": [
+            [
+                [[mora.get(key) for key in mora_fields] for mora in phrase["moras"]],
+                phrase["accent"],
+                phrase["is_interrogative"],
+                phrase["complete_word"],
+                None if phrase["pause_mora"] is None else phrase["pause_mora"]["vowel_length"],
+            ]
+            for phrase in accent_phrases
+        ],
+    }
+    compact.update((key, value) for key, value in audio_query.items() if key != "accent_phrases")
+    return compact
+
+
+def expand_audio_query(compact):
+    """
+    Converts an audio query in the compact schema back to the regular one.
+
+    Parameters:
+    - compact (dict): The audio query returned by `compact_audio_query`.
+
+    Returns:
+    - dict: The audio query, as returned by `audio_query_json`.
+    """
+    mora_fields = compact["mora_fields"]
+    audio_query = {"accent_phrases": [
+        {
+            "moras": [dict(zip(mora_fields, values)) for values in moras],
+            "accent": accent,
+            "is_interrogative": is_interrogative,
+            "complete_word": complete_word,
+            "pause_mora": None if pause_length is None else {
+                "text": " ",
+                "consonant": None,
+                "consonant_length": None,
+                "vowel": "pau",
+                "vowel_length": pause_length,
+                "pitch": 0.0
+            }
+        }
+        for moras, accent, is_interrogative, complete_word, pause_length in compact["accent_phrases"]
+    ]}
+    audio_query.update((key, value) for key, value in compact.items()
+                       if key not in ("format", "mora_fields", "phrase_fields", "accent_phrases"))
+    return audio_query
+
+
+def choose_encoding(accept_encoding):
+    """
+    Picks the content encoding of a response from the Accept-Encoding header of the request.
+
+    Brotli is preferred when the client accepts it and the brotli module is installed, then gzip. Encodings with
+    a quality of 0 are treated as refused.
+
+    Parameters:
+    - accept_encoding (str): Value of the Accept-Encoding header, or None.
+
+    Returns:
+    - str: "br", "gzip" or None for an uncompressed response.
+    """
+    accepted, refused = set(), set()
+    for item in (accept_encoding or "").split(","):
+        name, _, parameters = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = parameters.strip()
+        try:
+            weight = float(quality[2:]) if quality.startswith("q=") else 1.0
+        except ValueError:
+            weight = 0.0
+        (accepted if weight > 0 else refused).add(name)
+
+    def allows(encoding):
+        return encoding in accepted or ("*" in accepted and encoding not in refused)
+
+    if brotli is not None and allows("br"):
+        return "br"
+    if allows("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body, encoding, gzip_level=5, brotli_quality=4):
+    """
+    Compresses a response body.
+
+    The default levels favour speed: on audio queries they reach most of the size reduction of the maximum levels
+    at a fraction of the CPU time.
+
+    Parameters:
+    - body (bytes): The uncompressed body.
+    - encoding (str): "br", "gzip" or None.
+    - gzip_level (int): Compression level of gzip (1 to 9).
+    - brotli_quality (int): Quality of brotli (0 to 11).
+
+    Returns:
+    - bytes: The compressed body, or `body` itself if `encoding` is None.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    return body
+
+
+def encode_response(data, accept_encoding=None, min_compress_bytes=1024, gzip_level=5, brotli_quality=4):
+    """
+    Serializes and, if the client accepts it, compresses a JSON response, timing both steps.
+
+    Parameters:
+    - data (dict): The data of the response.
+    - accept_encoding (str): Value of the Accept-Encoding header of the request.
+    - min_compress_bytes (int): Bodies smaller than this are sent uncompressed.
+    - gzip_level (int): Compression level of gzip.
+    - brotli_quality (int): Quality of brotli.
+
+    Returns:
+    - tuple: (body, content encoding or None, timings) where timings holds 'serialize' and 'compress' in
+      milliseconds and 'json_bytes' and 'body_bytes', the sizes before and after compression.
+    """
+    start_time = time.perf_counter()
+    body = dumps(data)
+    serialized_time = time.perf_counter()
+
+    encoding = choose_encoding(accept_encoding) if len(body) >= min_compress_bytes else None
+    compressed = compress(body, encoding, gzip_level, brotli_quality)
+    end_time = time.perf_counter()
+
+    timings = {
+        "serialize": (serialized_time - start_time) * 1000,
+        "compress": (end_time - serialized_time) * 1000,
+        "json_bytes": len(body),
+        "body_bytes": len(compressed),
+    }
+    return compressed, encoding, timings
+
+
+def server_timing(durations):
+    """
+    Formats durations as a Server-Timing header, which browsers and HTTP clients show next to network timings.
+
+    Parameters:
+    - durations (dict): Milliseconds by metric name.
+
+    Returns:
+    - str: The value of the header, e.g. 'inference;dur=812.4, serialize;dur=3.1'.
+    """
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in durations.items())
@@ -0,0 +1,194 @@
+# Standard library imports
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Local application imports
+from . import config
+
+_file_digests = {}
+
+
+def file_digest(path):
+    """
+    Returns a short content hash of a file, recomputed only when the file is modified.
+
+    Parameters:
+    - path (str): Path to the file.
+
+    Returns:
+    - str: The hex digest of the file contents, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_digests.get(path)
+    if cached is None or cached[0] != version:
+        with open(path, "rb") as file:
+            cached = (version, hashlib.sha256(file.read()).hexdigest()[:16])
+        _file_digests[path] = cached
+    return cached[1]
+
+
+def audio_cache_key(audio, **params):
+    """
+    Builds the cache key of a pipeline run from the decoded audio and the parameters that affect the result.
+
+    Parameters:
+    - audio (AudioBuffer): The decoded audio.
+    - **params: Pipeline parameters (model, language, mapping version, rounding...). Values must be JSON
+      serializable.
+
+    Returns:
+    - str: The hex digest identifying the run.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(audio.sample_rate).encode())
+    digest.update(audio.samples.tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of pipeline results.
+
+    Results are kept as JSON strings in an in-memory LRU tier and, optionally, in a SQLite database that survives
+    restarts and is shared by worker processes. Each `get` returns a fresh copy, so callers may modify it.
+    """
+
+    def __init__(self, max_entries=128, disk_path=None, max_disk_bytes=512 * 1024 * 1024):
+        """
+        Parameters:
+        - max_entries (int): Number of results kept in memory. 0 disables the memory tier.
+        - disk_path (str): Path of the SQLite database of the disk tier. None disables the disk tier.
+        - max_disk_bytes (int): Total size of the stored results above which the least recently used ones are
+          deleted from disk.
+        """
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_path = disk_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def _db(self):
+        """
+        sqlite3.Connection: Connection to the disk tier, opened once per process (connections must not be shared
+        with forked workers). None when the disk tier is disabled.
+        """
+        if not self.disk_path:
+            return None
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.disk_path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+                                     "value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        """
+        Looks up a result, first in memory and then on disk.
+
+        Parameters:
+        - key (str): The cache key of the run.
+
+        Returns:
+        - dict: A copy of the stored result, or None if it is not cached.
+        """
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(value)
+
+            db = self._db
+            if db is not None:
+                row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        """
+        Stores a result in every enabled tier.
+
+        Parameters:
+        - key (str): The cache key of the run.
+        - result (dict): The JSON serializable result.
+        """
+        value = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value)
+            db = self._db
+            if db is not None:
+                db.execute("INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                           (key, value, len(value.encode("utf-8")), time.time()))
+                self._evict_disk(db)
+
+    def _remember(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_disk_bytes:
+            row = db.execute("SELECT key, size FROM results ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            db.execute("DELETE FROM results WHERE key = ?", (row[0],))
+            total -= row[1]
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of the cache.
+
+        Returns:
+        - dict: Memory hits, disk hits, misses, hit rate and number of results kept in memory.
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self):
+        """
+        Removes every result from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            db = self._db
+            if db is not None:
+                db.execute("DELETE FROM results")
+
+
+# Cache shared by the whole process.
+result_cache = ResultCache(max_entries=config.RESULT_CACHE_SIZE, disk_path=config.RESULT_CACHE_PATH or None,
+                           max_disk_bytes=config.RESULT_CACHE_MAX_BYTES)
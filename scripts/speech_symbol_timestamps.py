@@ -1,98 +1,326 @@
 # Standard library imports
 import json
+import os
 
 # Third-party library imports
-import whisper_timestamped
+import numpy as np
 
 # Local application imports
-from .auxiliar_functions_for_audio_query import (distribute_time_equally, add_consonant_vowel_info,
-                                                 calculate_pitch, time_for_vowels_and_consonants, text_to_kanji,
-                                                 distribute_time_error_in_all_vowels_and_pauses, get_audio_duration)
+from .model_registry import get_model, model_registry
+from .result_cache import audio_cache_key, file_digest, result_cache
+from .metrics import stage
+from .audio_buffer import AudioBuffer
+from .pitch_engine import PitchTrack, compute_pitch_track
+from .voice_activity import detect_speech
+from .forced_alignment import compute_acoustic_features
+from .formant_engine import compute_formant_track
+from .mora_mapping import MoraTable, load_mora_table
+from .timing_engine import MoraTimeline
+from .auxiliar_functions_for_audio_query import text_to_kanji, texts_to_kanji, get_audio_duration
 
-def audio_query_json(audio_path, save_to_file=False, json_output_path="speech_symbol_timestamps.json", mapping_file="files/mapping.json"):
+def audio_query_json(audio_path=None, save_to_file=False, json_output_path="speech_symbol_timestamps.json", mapping_file="files/mapping.json",
+                     model_name="default", samples=None, sample_rate=None, transcriber=None, language="ja", decimals=4,
+                     use_cache=True, alignment="equal", formants=False, vad=False):
     """
     Transcribes an audio file to text, enriches each transcribed word with detailed phonetic information 
     (consonants and vowels), calculates the pitch for each symbol, and identifies interrogative sentences.
+
+    The audio is given either as a path (`audio_path`) or as samples already in memory (`samples` and
+    `sample_rate`), e.g. the decoded body of an upload. In-memory samples are never written to disk.
     
     Parameters:
-    - audio_path (str): The path to the audio file for transcription.
+    - audio_path (str or AudioBuffer): The path to the audio file for transcription, or an already decoded buffer.
     - save_to_file (bool): Whether to save the output to a JSON file. Defaults to False.
     - json_output_path (str): Path where the JSON output will be saved if save_to_file is True.
     - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+    - model_name (str): Name of the Whisper model in the process-wide model registry. Defaults to "default". The
+      name selects the inference mode: "int8" runs the same checkpoint with int8 linear layers, "fast" the smaller
+      tier (see `scripts.model_registry`).
+    - samples (np.ndarray): Decoded samples, 1-D (mono) or with shape (frames, channels). Used instead of
+      `audio_path` when given.
+    - sample_rate (int): Sample rate of `samples` in Hz. Required when `samples` is given.
+    - transcriber (callable): Function receiving the mono 16 kHz samples and the `language` keyword and returning a
+      whisper_timestamped-style transcription, e.g. `BatchTranscriber.transcribe`. Defaults to whisper_timestamped
+      with `model_name`.
+    - language (str): Language of the audio. Defaults to Japanese.
+    - decimals (int): Number of decimal places of the symbol timestamps.
+    - use_cache (bool): Whether to look the result up in (and store it into) the process-wide result cache. The
+      cache key covers the decoded samples, the model (size, device and precision), the transcription path (see
+      `transcription_path`), the language, the mapping file contents, `decimals`, `alignment`, `formants` and
+      `vad`.
+    - alignment (str): "equal" splits each word equally among its moras; "acoustic" places the mora and
+      consonant/vowel boundaries on energy, spectral flux and voicing changes (see `scripts.forced_alignment`).
+    - formants (bool): Whether to add the mean F1, F2 and intensity of the vowel of every mora. Requires
+      praat-parselmouth; the contours are computed once for the whole audio.
+    - vad (bool): Whether to detect the speech regions first (see `scripts.voice_activity`). Only the speech is
+      transcribed and analysed for pitch, and the pause moras and the final pause are the silences between the
+      regions. Skips the inference on long silences and keeps Whisper from transcribing text in them.
     
     Returns:
     - dict: A dictionary containing the complete transcription, word details including phonetic information, 
             pitch, and whether each word forms a question, along with some metadata about the audio processing.
     """
-    # Load the model and transcribe the audio
-    import os
+    if alignment not in ("equal", "acoustic"):
+        raise ValueError(f"Unknown alignment: {alignment}")
+
+    # Decode the audio once and share it with every stage of the pipeline
+    with stage("decode"):
+        if samples is not None:
+            if sample_rate is None:
+                raise ValueError("sample_rate is required when samples are given")
+            audio = AudioBuffer.from_array(samples, sample_rate)
+        elif isinstance(audio_path, AudioBuffer):
+            audio = audio_path
+        elif audio_path is None:
+            raise ValueError("Either audio_path or samples must be given")
+        elif not os.path.exists(audio_path):
+            raise FileNotFoundError(f"The audio file was not found at path: {audio_path}")
+        else:
+            audio = AudioBuffer.from_file(audio_path)
+
+    # Identical audio processed with the same parameters gives the same result
+    if use_cache:
+        with stage("cache_lookup"):
+            cache_key = audio_cache_key(audio, model=model_registry.key_for(model_name),
+                                        transcription=transcription_path(transcriber), language=language,
+                                        mapping=file_digest(mapping_file), decimals=decimals, alignment=alignment,
+                                        formants=formants, vad=vad)
+            audio_query_data = result_cache.get(cache_key)
+        if audio_query_data is not None:
+            if save_to_file:
+                save_audio_query(audio_query_data, json_output_path)
+            return audio_query_data
+
+    # Transcribe the audio (or only its speech) and compute its pitch contour once; every mora reads its pitch
+    # from it
+    kana_text, words, speech_regions = transcribe_audio(audio, model_name, language, transcriber, vad)
+    with stage("pitch"):
+        pitch_track = compute_utterance_pitch(audio, speech_regions)
 
-    audio_path = audio_path
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"The audio file was not found at path: {audio_path}")
+    # Alignment features are computed once for the whole audio, like the pitch
+    features = formant_track = None
+    if alignment == "acoustic":
+        with stage("alignment_features"):
+            features = compute_acoustic_features(audio, pitch_track=pitch_track)
+    if formants:
+        with stage("formants"):
+            formant_track = compute_formant_track(audio)
 
-    model = whisper_timestamped.load_model("base", device="cpu")
-    result = whisper_timestamped.transcribe(model, audio_path, language="ja")
-    print("Complete transcription:", text_to_kanji(result["text"]))
+    # Compile the mapping once for every word of the transcription
+    with stage("mapping"):
+        mora_table = load_mora_table(mapping_file) or mapping_file
+
+    with stage("timing"):
+        audio_query_data = assemble_audio_query(kana_text, words, pitch_track, mora_table, get_audio_duration(audio),
+                                                decimals, features, formant_track, speech_regions)
+
+    if use_cache:
+        result_cache.put(cache_key, audio_query_data)
+
+    # Save the results to a file if requested
+    if save_to_file:
+        save_audio_query(audio_query_data, json_output_path)
     
+    return audio_query_data
+
+def transcription_path(transcriber=None):
+    """
+    Returns the name of the decoding path a transcriber follows, so results of different paths are never mixed.
+
+    Parameters:
+    - transcriber (callable): The transcriber given to `audio_query_json`, or None for whisper_timestamped.
+
+    Returns:
+    - str: "whisper_timestamped", the `transcription_path` of the transcriber (or of the object its bound method
+      belongs to, e.g. "batched" for `BatchTranscriber.transcribe`), or "custom".
+    """
+    if transcriber is None:
+        return "whisper_timestamped"
+    return getattr(getattr(transcriber, "__self__", transcriber), "transcription_path", "custom")
+
+def transcribe_audio(audio, model_name="default", language="ja", transcriber=None, vad=False):
+    """
+    Transcribes an audio and returns its words in Kana, with timestamps in the timeline of the audio.
+
+    Parameters:
+    - audio (AudioBuffer): The decoded audio.
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
+    - language (str): Language of the audio.
+    - transcriber (callable): Optional replacement of whisper_timestamped, receiving the samples
+      and the `language` keyword.
+    - vad (bool): Whether to transcribe only the speech regions (see `scripts.voice_activity`).
+
+    Returns:
+    - tuple: The transcription in Kana, the words (see `words_in_kana`) and the SpeechRegions (None without vad).
+    """
+    # Keep only the speech; its timestamps are mapped back to the original timeline below
+    speech_regions = None
+    analysed_audio = audio
+    if vad:
+        with stage("vad"):
+            speech_regions = detect_speech(audio)
+            analysed_audio = speech_regions.extract(audio)
+        print(f"Speech detected: {speech_regions.speech_seconds:.2f} of {audio.duration:.2f} seconds")
+
+    # Load the model and transcribe the audio
+    with stage("transcription"):
+        if len(analysed_audio.samples):
+            result = transcribe_samples(analysed_audio.samples, model_name, language, transcriber)
+        else:
+            result = {"text": "", "segments": []}
+    with stage("kana"):
+        kana_text = text_to_kanji(result["text"])
+        words = words_in_kana(result)
+        if speech_regions is not None:
+            words = speech_regions.words_to_original(words)
+    print("Complete transcription:", kana_text)
+    return kana_text, words, speech_regions
+
+def compute_utterance_pitch(audio, speech_regions=None):
+    """
+    Computes the pitch contour of a whole audio, or only of its speech regions.
+
+    Parameters:
+    - audio (AudioBuffer): The decoded audio.
+    - speech_regions (SpeechRegions): When given, only the speech is analysed and the silences have no pitch.
+
+    Returns:
+    - PitchTrack: The contour, in the timeline of the audio.
+    """
+    if speech_regions is None:
+        return compute_pitch_track(audio)
+    speech_audio = speech_regions.extract(audio)
+    if not len(speech_audio.samples):
+        return PitchTrack(np.zeros(0), np.zeros(0), np.zeros(0, dtype=bool))
+    return speech_regions.map_pitch_track(compute_pitch_track(speech_audio))
+
+def transcribe_samples(samples, model_name="default", language="ja", transcriber=None):
+    """
+    Transcribes mono 16 kHz samples with word timestamps.
+
+    Parameters:
+    - samples (np.ndarray): The samples to transcribe.
+    - model_name (str): Name of the Whisper model in the process-wide model registry.
+    - language (str): Language of the audio.
+    - transcriber (callable): Optional replacement of whisper_timestamped, receiving the samples
+      and the `language` keyword.
+
+    Returns:
+    - dict: The whisper_timestamped-style transcription, with 'text' and 'segments' (each with 'words').
+    """
+    if transcriber is None:
+        import whisper_timestamped
+        return whisper_timestamped.transcribe(get_model(model_name), samples, language=language)
+    return transcriber(samples, language=language)
+
+def words_in_kana(result, offset=0.0):
+    """
+    Returns the words of a transcription with their text converted to Kana.
+
+    Parameters:
+    - result (dict): The whisper_timestamped-style transcription.
+    - offset (float): Seconds added to the word timestamps, e.g. the start of the transcribed window.
+
+    Returns:
+    - list: Dictionaries with the 'text', 'start' and 'end' of each word.
+    """
+    words = [word for segment in result["segments"] for word in segment.get("words", [])]
+    # Convert all the words to Kana at once
+    kana_words = texts_to_kanji(word['text'] for word in words)
+    return [{"text": kana_word, "start": word['start'] + offset, "end": word['end'] + offset}
+            for word, kana_word in zip(words, kana_words) if kana_word]
+
+def build_accent_phrases(words, pitch_track, mora_table, decimals=4, last_word_time=0, features=None,
+                         formant_track=None, speech_regions=None):
+    """
+    Builds the accent phrases (one per word) with the moras, phonetic information, pitch and pauses.
+
+    Parameters:
+    - words (list): Words in Kana with their 'text', 'start' and 'end', in chronological order.
+    - pitch_track (PitchTrack): The pitch contour covering the words.
+    - mora_table (MoraTable or str): The compiled mapping, or the path to the mapping file.
+    - decimals (int): Number of decimal places of the symbol timestamps.
+    - last_word_time (float): End of the word preceding the first one, used for its pause mora.
+    - features (AcousticFeatures): Features of the utterance. When given, the mora and consonant/vowel boundaries
+      inside each word are aligned to them instead of splitting the word equally.
+    - formant_track (FormantTrack): Formant and intensity contours of the utterance. When given, every mora gets
+      the mean 'f1' and 'f2' (Hz) and 'intensity' (dB) of its vowel.
+    - speech_regions (SpeechRegions): Speech regions of the utterance. When given, the pause before each word is
+      the silence between the regions instead of the gap between the words.
+
+    Returns:
+    - tuple: The list of accent phrases and the end time of the last word (or `last_word_time` if there are
+      no words).
+    """
+    # Lay out all the moras of the words at once and time them with array operations
+    timeline = MoraTimeline.from_words(words, mora_table if isinstance(mora_table, MoraTable) else None,
+                                       decimals, last_word_time)
+    if isinstance(mora_table, str):
+        print(f"Mapping file {mora_table} does not exist. Adding null for consonant and vowel.")
+    if speech_regions is not None and words:
+        timeline.pauses = np.round(speech_regions.word_pauses(words, last_word_time), decimals)
+
+    # Move the boundaries inside each word to the acoustic evidence
+    if features is not None:
+        timeline.align(features, decimals)
+
+    # Read the pitch of every mora from the contour in a single query
+    timeline.set_pitch(pitch_track)
+    if formant_track is not None:
+        timeline.set_formants(formant_track)
+
+    if words:
+        last_word_time = words[-1]['end']
+    return timeline.to_accent_phrases(), last_word_time
+
+def assemble_audio_query(kana_text, words, pitch_track, mora_table, duration, decimals=4, features=None,
+                         formant_track=None, speech_regions=None):
+    """
+    Builds the audio query from the outputs of the analysis stages.
+
+    Parameters:
+    - kana_text (str): The transcribed text in Kana.
+    - words (list): Words in Kana with their 'text', 'start' and 'end', in chronological order.
+    - pitch_track (PitchTrack): The pitch contour of the audio.
+    - mora_table (MoraTable or str): The compiled mapping, or the path to the mapping file.
+    - duration (float): Duration of the audio in seconds.
+    - decimals (int): Number of decimal places of the symbol timestamps.
+    - features, formant_track, speech_regions: As in `build_accent_phrases`. With speech regions, the final pause
+      is the silence after the last word.
+
+    Returns:
+    - dict: The audio query.
+    """
     # Initialize the main dictionary to store the transcription and word details
     audio_query_data = {
-        "transcription": text_to_kanji(result["text"]),
+        "transcription": kana_text,
         "accent_phrases": []
     }
-    last_word_time = 0
-    # Process each word in the transcription
-    for segment in result["segments"]:
-        for word in segment.get("words", []):
-            # Convert the word to Kana
-            word['text'] = text_to_kanji(word['text'])
-            # Verify the last word time
-            if word['start'] == last_word_time:
-                pause_mora = None
-            else:
-                pause_mora = word['start'] - last_word_time
-            last_word_time = word['end']
-
-            # Distribute time equally among the symbols of the word
-            symbols_times = distribute_time_equally(word['start'], word['end'], word['text'])
-
-            # Add consonant and vowel information to each symbol
-            symbols_times = add_consonant_vowel_info(symbols_times, mapping_file)
-            
-            # Calculate and add pitch information to each symbol
-            symbols_times = calculate_pitch(audio_path, symbols_times)
-
-            # Calculate the vowels and consonants lenghts for each symbol
-            symbols_times = time_for_vowels_and_consonants(symbols_times)
-           
-            # Create a dictionary for each word with its details
-            word_detail = {
-                "moras": symbols_times,
-                "accent": 0,  # Default accent value
-                "is_interrogative": "か" in word['text'] or "?" in word['text'],  # Check if the word is interrogative
-                "complete_word": word['text'],
-                "pause_mora": None if pause_mora is None else 
-                {
-                        "text": " ",
-                        "consonant": None,
-                        "consonant_length": None,
-                        "vowel": "pau",
-                        "vowel_length": pause_mora,
-                        "pitch": 0.0
-                    }
-            }
-            
-            # Final pause of the word
-            final_time = word['end']
-            
-            # Add the detailed word to the list
-            audio_query_data["accent_phrases"].append(word_detail)
-                     
+    audio_query_data["accent_phrases"], final_time = build_accent_phrases(
+        words, pitch_track, mora_table, decimals, features=features, formant_track=formant_track,
+        speech_regions=speech_regions)
 
     # Add additional metadata related to the audio processing
-    metadata = {
-        "final_pause": get_audio_duration(audio_path) - final_time if 
-                        (get_audio_duration(audio_path) - final_time) > 0 else None,
+    if speech_regions is not None:
+        final_pause = float(speech_regions.silence_between([final_time], [duration])[0])
+    else:
+        final_pause = duration - final_time
+    audio_query_data.update(audio_query_metadata(final_pause, kana_text))
+    return audio_query_data
+
+def audio_query_metadata(final_pause, kana_text):
+    """
+    Returns the metadata that completes an audio query.
+
+    Parameters:
+    - final_pause (float): Time between the end of the last word and the end of the audio.
+    - kana_text (str): The transcribed text in Kana.
+
+    Returns:
+    - dict: The metadata of the audio query.
+    """
+    return {
+        "final_pause": final_pause if final_pause > 0 else None,
         "speedScale": 1.0,
         "pitchScale": 0.0,
         "intonationScale": 1.0,
@@ -101,19 +329,20 @@ def audio_query_json(audio_path, save_to_file=False, json_output_path="speech_sy
         "postPhonemeLength": 0.1,
         "outputSamplingRate": 24000,  # Set the output sampling rate explicitly
         "outputStereo": False,
-        "kana": text_to_kanji(result["text"])  # The transcribed text in Kana
+        "kana": kana_text  # The transcribed text in Kana
     }
 
-    # Update the main dictionary with the metadata
-    audio_query_data.update(metadata)
+def save_audio_query(audio_query_data, json_output_path):
+    """
+    Saves an audio query to a JSON file.
 
-    # Save the results to a file if requested
-    if save_to_file:
-        with open(json_output_path, 'w', encoding='utf-8') as json_file:
-            json.dump(audio_query_data, json_file, ensure_ascii=False, indent=4)
-        print(f"Results saved in: {json_output_path}")
-    
-    return audio_query_data
+    Parameters:
+    - audio_query_data (dict): The audio query returned by `audio_query_json`.
+    - json_output_path (str): Path of the JSON file.
+    """
+    with open(json_output_path, 'w', encoding='utf-8') as json_file:
+        json.dump(audio_query_data, json_file, ensure_ascii=False, indent=4)
+    print(f"Results saved in: {json_output_path}")
 
 # Example usage
 if __name__ == "__main__":
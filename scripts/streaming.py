@@ -0,0 +1,176 @@
+# Standard library imports
+import asyncio
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import SAMPLE_RATE, AudioBuffer, stream_audio
+from .pitch_engine import compute_pitch_track
+from .forced_alignment import compute_acoustic_features
+from .formant_engine import compute_formant_track
+from .mora_mapping import load_mora_table
+from .speech_symbol_timestamps import (transcribe_samples, words_in_kana, build_accent_phrases,
+                                       audio_query_metadata)
+
+
+def quietest_time(samples, sample_rate, start, end, frame_seconds=0.02):
+    """
+    Finds the instant with the lowest energy inside a range, used to cut windows between words.
+
+    Parameters:
+    - samples (np.ndarray): Mono samples, starting at time 0.
+    - sample_rate (int): Sample rate of the samples.
+    - start (float): Start of the range to search, in seconds.
+    - end (float): End of the range to search, in seconds.
+    - frame_seconds (float): Length of the frames whose energy is compared.
+
+    Returns:
+    - float: The center of the quietest frame, in seconds. `end` if the range holds no whole frame.
+    """
+    frame_size = int(frame_seconds * sample_rate)
+    first = max(int(start * sample_rate), 0)
+    frame_count = (min(int(end * sample_rate), len(samples)) - first) // frame_size
+    if frame_count <= 0:
+        return end
+    frames = samples[first:first + frame_count * frame_size].reshape(frame_count, frame_size)
+    energy = np.einsum("ij,ij->i", frames, frames)
+    return (first + (int(np.argmin(energy)) + 0.5) * frame_size) / sample_rate
+
+
+class MoraStream:
+    """
+    Streaming version of `audio_query_json` for long recordings.
+
+    The audio is read block by block and processed in windows of about `window_seconds`. Each window is cut at the
+    quietest point near its end, so words are not split, and is transcribed together with `overlap_seconds` of the
+    previous window as context. Accent phrases are yielded with absolute timestamps as soon as their window is done,
+    and at most one window (plus the overlap) of samples is kept in memory.
+
+    After the iteration, `metadata()` returns the final pause and the rest of the audio query metadata.
+    """
+
+    def __init__(self, audio, mapping_file="files/mapping.json", model_name="default", language="ja",
+                 transcriber=None, window_seconds=30.0, overlap_seconds=2.0, boundary_search_seconds=5.0, decimals=4,
+                 alignment="equal", formants=False):
+        """
+        Parameters:
+        - audio (AudioBuffer or str): An already decoded buffer or the path to an audio file.
+        - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+        - model_name (str): Name of the Whisper model in the process-wide model registry.
+        - language (str): Language of the audio.
+        - transcriber (callable): Optional replacement of whisper_timestamped, receiving the samples
+          and the `language` keyword.
+        - window_seconds (float): Target duration of each window. 30 s matches the Whisper input window.
+        - overlap_seconds (float): Audio of the previous window prepended as context. Words in it are not emitted
+          again.
+        - boundary_search_seconds (float): Duration at the end of each window searched for the cut point.
+        - decimals (int): Number of decimal places of the symbol timestamps.
+        - alignment (str): "equal" or "acoustic", as in `audio_query_json`.
+        - formants (bool): Whether to add the F1, F2 and intensity of every mora, as in `audio_query_json`.
+        """
+        if boundary_search_seconds >= window_seconds:
+            raise ValueError("boundary_search_seconds must be shorter than window_seconds")
+        self.audio = audio
+        self.mapping_file = mapping_file
+        self.model_name = model_name
+        self.language = language
+        self.transcriber = transcriber
+        self.window_seconds = window_seconds
+        self.overlap_seconds = overlap_seconds
+        self.boundary_search_seconds = boundary_search_seconds
+        self.decimals = decimals
+        self.alignment = alignment
+        self.formants = formants
+        self.duration = 0.0
+        self.last_word_time = 0.0
+        self.kana_words = []
+
+    def __iter__(self):
+        sample_rate = self.audio.sample_rate if isinstance(self.audio, AudioBuffer) else SAMPLE_RATE
+        blocks = stream_audio(self.audio, block_seconds=self.boundary_search_seconds)
+        mora_table = load_mora_table(self.mapping_file) or self.mapping_file
+
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = 0.0  # Absolute time of the first sample in the buffer.
+        committed = 0.0  # Words starting before this instant have already been emitted.
+        end_of_audio = False
+
+        while True:
+            # Read until the buffer covers a whole window after the committed instant.
+            while not end_of_audio and buffer_start + len(buffer) / sample_rate < committed + self.window_seconds:
+                block = next(blocks, None)
+                if block is None:
+                    end_of_audio = True
+                else:
+                    buffer = np.concatenate((buffer, block))
+            buffer_end = buffer_start + len(buffer) / sample_rate
+            self.duration = buffer_end
+            if buffer_end <= committed:
+                break
+
+            # Cut the window at the quietest point near its end, or at the end of the audio.
+            if end_of_audio and buffer_end <= committed + self.window_seconds:
+                cut = buffer_end
+            else:
+                window_end = committed + self.window_seconds
+                cut = buffer_start + quietest_time(buffer, sample_rate,
+                                                   window_end - self.boundary_search_seconds - buffer_start,
+                                                   window_end - buffer_start)
+
+            context_start = max(buffer_start, committed - self.overlap_seconds)
+            window = buffer[int((context_start - buffer_start) * sample_rate):int((cut - buffer_start) * sample_rate)]
+
+            # Transcribe the window and keep the words that belong to it (not to the overlap).
+            result = transcribe_samples(window, self.model_name, self.language, self.transcriber)
+            words = [word for word in words_in_kana(result, offset=context_start)
+                     if committed <= (word["start"] + word["end"]) / 2 < cut]
+
+            window_audio = AudioBuffer(window, sample_rate)
+            pitch_track = compute_pitch_track(window_audio)
+            features = None
+            if self.alignment == "acoustic":
+                features = compute_acoustic_features(window_audio, pitch_track=pitch_track).shifted(context_start)
+            formant_track = compute_formant_track(window_audio).shifted(context_start) if self.formants else None
+            accent_phrases, self.last_word_time = build_accent_phrases(words, pitch_track.shifted(context_start),
+                                                                       mora_table, self.decimals,
+                                                                       self.last_word_time, features,
+                                                                       formant_track)
+            self.kana_words.extend(word["text"] for word in words)
+            yield from accent_phrases
+
+            # Keep only the overlap of the next window in memory.
+            committed = cut
+            drop = max(int((committed - self.overlap_seconds - buffer_start) * sample_rate), 0)
+            buffer = buffer[drop:]
+            buffer_start += drop / sample_rate
+
+    def metadata(self):
+        """
+        Returns the metadata of the audio query (final pause, kana...). Complete once the iteration is finished.
+
+        Returns:
+        - dict: The metadata, as in `audio_query_json`.
+        """
+        return audio_query_metadata(self.duration - self.last_word_time, "".join(self.kana_words))
+
+
+async def aiter_accent_phrases(stream, run=asyncio.to_thread):
+    """
+    Iterates a MoraStream from asynchronous code, processing each window in a worker thread.
+
+    Parameters:
+    - stream (MoraStream): The stream to iterate.
+    - run (callable): Coroutine function running a blocking call in a thread, e.g. `Reservation.run` to bound
+      the windows processed at the same time. Defaults to `asyncio.to_thread`.
+
+    Yields:
+    - dict: The accent phrases of the stream.
+    """
+    iterator = iter(stream)
+    end = object()
+    while True:
+        accent_phrase = await run(next, iterator, end)
+        if accent_phrase is end:
+            return
+        yield accent_phrase
@@ -0,0 +1,377 @@
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .mora_mapping import split_moras
+from .forced_alignment import consonant_ends, segment_span
+
+# Time units given to each vowel and each consonant symbol when a mora is split (a vowel lasts four consonants).
+VOWEL_WEIGHT = 4
+CONSONANT_WEIGHT = 1
+
+# Keys of a mora in the audio query, and the keys added when formants are requested.
+MORA_FIELDS = 9
+FORMANT_FIELDS = 3
+
+
+def _optional(values, valid):
+    """
+    Converts an array to a list of Python floats with None where `valid` is False.
+    """
+    return [value if is_valid else None for value, is_valid in zip(values.tolist(), valid.tolist())]
+
+
+def _nullable(values):
+    """
+    Converts a list of floats or None to a float array with NaN for None.
+    """
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+class MoraTimeline:
+    """
+    Timing of every mora and pause of an utterance, stored as NumPy arrays.
+
+    Building an audio query used to walk the per-mora dictionaries once per step (grouping, timing, the 4:1 split,
+    pitch, totals and error redistribution). The timeline lays the moras out once, runs each step as array
+    operations over the whole utterance, and converts back to the dictionary schema only in `to_accent_phrases`
+    and `apply_to`.
+
+    Mora arrays have one entry per mora, word arrays one entry per word (accent phrase); `word_index` maps each
+    mora to its word. Missing values (pauses, lengths of moras without vowel or consonant) are NaN.
+    """
+
+    def __init__(self, texts, word_index, starts, ends, lengths, consonants, vowels, word_texts, pauses,
+                 final_pause=np.nan):
+        """
+        Parameters:
+        - texts (list): Symbols of the moras.
+        - word_index (np.ndarray): Word of each mora.
+        - starts, ends (np.ndarray): Start and end time of each mora in seconds.
+        - lengths (np.ndarray): Duration of each mora ('vowel_consonant_length').
+        - consonants, vowels (list): Consonant and vowel strings of each mora, or None.
+        - word_texts (list): Text of each word.
+        - pauses (np.ndarray): Pause before each word in seconds, NaN where the word follows the previous one.
+        - final_pause (float): Pause after the last word, NaN if there is none.
+        """
+        self.texts = texts
+        self.word_index = np.asarray(word_index, dtype=np.int64)
+        self.starts = starts
+        self.ends = ends
+        self.lengths = lengths
+        self.consonants = consonants
+        self.vowels = vowels
+        self.consonant_counts = np.array([len(consonant) if consonant else 0 for consonant in consonants],
+                                         dtype=np.int64)
+        self.vowel_counts = np.array([len(vowel) if vowel else 0 for vowel in vowels], dtype=np.int64)
+        self.word_texts = word_texts
+        self.pauses = pauses
+        self.pause_consonants = np.full(len(word_texts), np.nan)
+        self.final_pause = final_pause
+        self.pitch = np.zeros(len(texts))
+        self.vowel_lengths = np.full(len(texts), np.nan)
+        self.consonant_lengths = np.full(len(texts), np.nan)
+        self.formants = None  # Mean F1, F2 and intensity of each vowel, when requested.
+        self.field_counts = np.full(len(texts), MORA_FIELDS, dtype=np.int64)  # Keys of each mora dictionary.
+
+    @classmethod
+    def from_words(cls, words, mora_table=None, decimals=4, last_word_time=0):
+        """
+        Lays out the moras of transcribed words, sharing the time of each word equally among its moras.
+
+        Parameters:
+        - words (list): Words in Kana with their 'text', 'start' and 'end', in chronological order.
+        - mora_table (MoraTable): The compiled mapping. Without it, consonants and vowels are None.
+        - decimals (int): Number of decimal places of the mora timestamps.
+        - last_word_time (float): End of the word preceding the first one, used for its pause.
+
+        Returns:
+        - MoraTimeline: The timeline, with the 4:1 split of every mora already computed.
+        """
+        # Grouping symbols and looking them up is the only per-mora work done in Python.
+        texts, word_index, consonants, vowels = [], [], [], []
+        for index, word in enumerate(words):
+            moras = split_moras(word["text"])
+            texts.extend(moras)
+            word_index.extend([index] * len(moras))
+        for text in texts:
+            info = mora_table.lookup(text) if mora_table is not None else None
+            consonants.append(info.consonant if info else None)
+            vowels.append(info.vowel if info else None)
+
+        word_index = np.array(word_index, dtype=np.int64)
+        word_starts = np.array([word["start"] for word in words], dtype=np.float64)
+        word_ends = np.array([word["end"] for word in words], dtype=np.float64)
+
+        # Position of each mora inside its word, and the equal share of the word duration of each mora.
+        counts = np.bincount(word_index, minlength=len(words))
+        position = np.arange(len(texts)) - (np.cumsum(counts) - counts)[word_index]
+        share = ((word_ends - word_starts) / np.maximum(counts, 1))[word_index]
+        starts = word_starts[word_index] + position * share
+        ends = starts + share
+
+        # A pause precedes every word that does not start where the previous one ended.
+        previous_ends = np.concatenate(([last_word_time], word_ends[:-1]))
+        pauses = np.where(word_starts == previous_ends, np.nan, word_starts - previous_ends)
+
+        timeline = cls(texts, word_index, np.round(starts, decimals), np.round(ends, decimals),
+                       np.round(ends - starts, decimals), consonants, vowels, [word["text"] for word in words],
+                       pauses)
+        timeline.split_lengths()
+        return timeline
+
+    @classmethod
+    def from_audio_query(cls, audio_query):
+        """
+        Reads the timing of an existing audio query, e.g. to redistribute its error.
+
+        Parameters:
+        - audio_query (dict): The audio query returned by `audio_query_json`.
+
+        Returns:
+        - MoraTimeline: The timeline, with the lengths of the audio query.
+        """
+        phrases = audio_query["accent_phrases"]
+        moras = [mora for phrase in phrases for mora in phrase["moras"]]
+        word_index = [index for index, phrase in enumerate(phrases) for _ in phrase["moras"]]
+        pause_moras = [phrase["pause_mora"] or {} for phrase in phrases]
+        final_pause = audio_query.get("final_pause")
+
+        timeline = cls([mora["text"] for mora in moras], word_index,
+                       np.array([mora["start"] for mora in moras], dtype=np.float64),
+                       np.array([mora["end"] for mora in moras], dtype=np.float64),
+                       _nullable([mora["vowel_consonant_length"] for mora in moras]),
+                       [mora.get("consonant") for mora in moras], [mora.get("vowel") for mora in moras],
+                       [phrase["complete_word"] for phrase in phrases],
+                       _nullable([pause.get("vowel_length") for pause in pause_moras]),
+                       np.nan if final_pause is None else final_pause)
+        timeline.pause_consonants = _nullable([pause.get("consonant_length") for pause in pause_moras])
+        timeline.pitch = np.array([mora.get("pitch", 0.0) for mora in moras], dtype=np.float64)
+        timeline.vowel_lengths = _nullable([mora.get("vowel_length") for mora in moras])
+        timeline.consonant_lengths = _nullable([mora.get("consonant_length") for mora in moras])
+        timeline.field_counts = np.array([len(mora) for mora in moras], dtype=np.int64)
+        return timeline
+
+    def split_lengths(self):
+        """
+        Splits the duration of every mora between its vowel and its consonant.
+
+        Each vowel symbol weighs VOWEL_WEIGHT and each consonant symbol CONSONANT_WEIGHT. The vowel length is the
+        whole mora duration, as the consonant overlaps its start; moras without vowel or consonant get NaN.
+        """
+        weights = self.vowel_counts * VOWEL_WEIGHT + self.consonant_counts * CONSONANT_WEIGHT
+        unit = np.divide(self.lengths, weights, out=np.zeros(len(weights)), where=weights > 0)
+        self.vowel_lengths = np.where(self.vowel_counts > 0, self.lengths, np.nan)
+        self.consonant_lengths = np.where(self.consonant_counts > 0,
+                                          np.round(unit * self.consonant_counts * CONSONANT_WEIGHT, 4), np.nan)
+
+    def align(self, features, decimals=4, min_mora_seconds=0.03, prior_weight=2.0):
+        """
+        Moves the mora and consonant/vowel boundaries inside each word to the acoustic boundaries.
+
+        The words keep their span; inside it, `segment_span` places the boundaries between moras on spectral
+        changes, energy dips and voicing changes, and the consonant of each mora ends at the strongest vowel onset
+        in its first half. Words too short for their moras keep the equal split.
+
+        Parameters:
+        - features (AcousticFeatures): The features of the utterance (see `scripts.forced_alignment`).
+        - decimals (int): Number of decimal places of the mora timestamps.
+        - min_mora_seconds (float): Minimum duration of a mora.
+        - prior_weight (float): Weight of the equal split against the acoustic evidence.
+        """
+        if len(self.texts) == 0 or len(features.times) == 0:
+            return
+        score = features.boundary_score()
+        min_frames = max(int(round(min_mora_seconds / features.hop_seconds)), 1)
+        frame_times = features.times
+        counts = np.bincount(self.word_index, minlength=len(self.word_texts))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        # Frame edges of every mora; words that cannot be aligned keep their current times.
+        first_frames = np.searchsorted(frame_times, self.starts[offsets[:-1].clip(max=len(self.texts) - 1)])
+        aligned = np.zeros(len(self.texts), dtype=bool)
+        mora_first = np.zeros(len(self.texts), dtype=np.int64)
+        mora_last = np.zeros(len(self.texts), dtype=np.int64)
+        for index in np.flatnonzero(counts):
+            first_mora, last_mora = offsets[index], offsets[index + 1]
+            last_frame = np.searchsorted(frame_times, self.ends[last_mora - 1])
+            edges = segment_span(score, int(first_frames[index]), int(last_frame), int(counts[index]),
+                                 min_frames, prior_weight)
+            if edges is not None:
+                mora_first[first_mora:last_mora] = edges[:-1]
+                mora_last[first_mora:last_mora] = edges[1:]
+                aligned[first_mora:last_mora] = True
+
+        # Inner boundaries move to their frames; the first start and last end of each word stay where they were.
+        word_first = np.zeros(len(self.texts), dtype=bool)
+        word_first[offsets[:-1][counts > 0]] = True
+        word_last = np.zeros(len(self.texts), dtype=bool)
+        word_last[offsets[1:][counts > 0] - 1] = True
+        last_index = len(frame_times) - 1
+        new_starts = np.where(aligned & ~word_first, frame_times[mora_first.clip(max=last_index)], self.starts)
+        new_ends = np.where(aligned & ~word_last, frame_times[mora_last.clip(max=last_index)], self.ends)
+        self.starts = np.round(new_starts, decimals)
+        self.ends = np.round(new_ends, decimals)
+        self.lengths = np.round(self.ends - self.starts, decimals)
+        self.split_lengths()
+
+        # The consonant lasts until the vowel onset of its mora.
+        vowel_starts = consonant_ends(features.onset_score(), mora_first, mora_last)
+        measured = aligned & (vowel_starts >= 0) & (self.consonant_counts > 0)
+        consonant_lengths = frame_times[vowel_starts.clip(0, last_index)] - self.starts
+        measured &= (consonant_lengths > 0) & (consonant_lengths < self.lengths)
+        self.consonant_lengths = np.where(measured, np.round(consonant_lengths, 4), self.consonant_lengths)
+
+    def set_pitch(self, pitch_track):
+        """
+        Reads the mean voiced pitch of every mora from the contour of the utterance in one query.
+
+        Parameters:
+        - pitch_track (PitchTrack): The pitch contour covering the moras.
+        """
+        self.pitch = np.round(pitch_track.mean_pitch(self.starts, self.ends) / 1000, 7)  # In kHz.
+
+    def set_formants(self, formant_track):
+        """
+        Reads the mean F1, F2 and intensity of the vowel of every mora from the contours of the utterance.
+
+        The vowel starts after the consonant of the mora (the whole mora for moras without consonant).
+
+        Parameters:
+        - formant_track (FormantTrack): The contours covering the moras.
+        """
+        vowel_starts = self.starts + np.nan_to_num(self.consonant_lengths)
+        self.formants = formant_track.means(vowel_starts, self.ends)
+        self.field_counts = np.full(len(self.texts), MORA_FIELDS + FORMANT_FIELDS, dtype=np.int64)
+
+    def _timed_items(self):
+        """
+        Returns the durations that make up the timeline: moras, pauses (vowel and consonant) and the final pause.
+        """
+        items = np.concatenate((self.lengths, self.pauses, self.pause_consonants, [self.final_pause]))
+        return items[~np.isnan(items)]
+
+    def total_time(self):
+        """
+        Returns the time covered by the moras and pauses in seconds.
+        """
+        return float(self._timed_items().sum())
+
+    def count_timed_items(self):
+        """
+        Returns the number of items the time error is shared between, counted as the audio query always did.
+
+        Every mora counts once per key of its dictionary, every pause mora twice (three times if it has a
+        consonant) and the final pause once.
+        """
+        has_pause = ~np.isnan(self.pauses)
+        return int(self.field_counts.sum() + 2 * np.count_nonzero(has_pause)
+                   + np.count_nonzero(has_pause & ~np.isnan(self.pause_consonants))
+                   + (0 if np.isnan(self.final_pause) else 1))
+
+    def redistribute_error(self, audio_duration):
+        """
+        Spreads the difference between the audio duration and the total time over the moras and pauses, so that
+        the timeline covers the whole audio.
+
+        The mora lengths, the vowel lengths and the pause lengths (vowel and consonant) are shifted by the error
+        divided by `count_timed_items`; the consonant lengths of the moras and the final pause are left as they are.
+
+        Parameters:
+        - audio_duration (float): Duration of the audio in seconds.
+
+        Returns:
+        - float: The time added to each mora and pause (negative if the timeline was too long).
+        """
+        count = self.count_timed_items()
+        if count == 0:
+            return 0.0
+        error = (audio_duration - self.total_time()) / count
+        # NaN stays NaN, so only the existing lengths change.
+        self.lengths = self.lengths + error
+        self.vowel_lengths = self.vowel_lengths + error
+        self.pauses = self.pauses + error
+        self.pause_consonants = self.pause_consonants + error
+        return error
+
+    def to_accent_phrases(self):
+        """
+        Converts the timeline to the accent phrases of the audio query (one per word).
+
+        Returns:
+        - list: The accent phrases, as built by `build_accent_phrases`.
+        """
+        starts, ends, pitch = self.starts.tolist(), self.ends.tolist(), self.pitch.tolist()
+        lengths = _optional(self.lengths, ~np.isnan(self.lengths))
+        vowel_lengths = _optional(self.vowel_lengths, ~np.isnan(self.vowel_lengths))
+        consonant_lengths = _optional(self.consonant_lengths, ~np.isnan(self.consonant_lengths))
+        pauses = _optional(self.pauses, ~np.isnan(self.pauses))
+        boundaries = np.searchsorted(self.word_index, np.arange(len(self.word_texts) + 1)).tolist()
+        if self.formants is not None:
+            f1, f2 = (_optional(np.round(row, 1), ~np.isnan(row)) for row in self.formants[:2])
+            intensity = _optional(np.round(self.formants[2], 2), ~np.isnan(self.formants[2]))
+
+        accent_phrases = []
+        for index, word_text in enumerate(self.word_texts):
+            moras = [
+                {
+                    "text": self.texts[i],
+                    "start": starts[i],
+                    "end": ends[i],
+                    "vowel_consonant_length": lengths[i],
+                    "consonant": self.consonants[i],
+                    "vowel": self.vowels[i],
+                    "pitch": pitch[i],
+                    "vowel_length": vowel_lengths[i],
+                    "consonant_length": consonant_lengths[i]
+                }
+                for i in range(boundaries[index], boundaries[index + 1])
+            ]
+            if self.formants is not None:
+                for i, mora in enumerate(moras, boundaries[index]):
+                    mora["f1"] = f1[i]
+                    mora["f2"] = f2[i]
+                    mora["intensity"] = intensity[i]
+            accent_phrases.append({
+                "moras": moras,
+                "accent": 0,  # Default accent value
+                "is_interrogative": "か" in word_text or "?" in word_text,  # Check if the word is interrogative
+                "complete_word": word_text,
+                "pause_mora": None if pauses[index] is None else
+                {
+                    "text": " ",
+                    "consonant": None,
+                    "consonant_length": None,
+                    "vowel": "pau",
+                    "vowel_length": pauses[index],
+                    "pitch": 0.0
+                }
+            })
+        return accent_phrases
+
+    def apply_to(self, audio_query):
+        """
+        Writes the lengths of the timeline back into the audio query it was read from.
+
+        Parameters:
+        - audio_query (dict): The audio query given to `from_audio_query`.
+
+        Returns:
+        - dict: The updated audio query.
+        """
+        moras = [mora for phrase in audio_query["accent_phrases"] for mora in phrase["moras"]]
+        for mora, length, vowel_length, consonant_length in zip(
+                moras, _optional(self.lengths, ~np.isnan(self.lengths)),
+                _optional(self.vowel_lengths, ~np.isnan(self.vowel_lengths)),
+                _optional(self.consonant_lengths, ~np.isnan(self.consonant_lengths))):
+            mora["vowel_consonant_length"] = length
+            mora["vowel_length"] = vowel_length
+            mora["consonant_length"] = consonant_length
+        for phrase, pause, pause_consonant in zip(audio_query["accent_phrases"], self.pauses.tolist(),
+                                                  self.pause_consonants.tolist()):
+            if phrase["pause_mora"] is not None:
+                phrase["pause_mora"]["vowel_length"] = pause
+                phrase["pause_mora"]["consonant_length"] = None if np.isnan(pause_consonant) else pause_consonant
+        if audio_query.get("final_pause") is not None:
+            audio_query["final_pause"] = float(self.final_pause)
+        return audio_query
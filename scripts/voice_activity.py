@@ -0,0 +1,213 @@
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import AudioBuffer, load_audio
+from .pitch_engine import PitchTrack
+
+
+class SpeechRegions:
+    """
+    Speech regions of an audio found by `detect_speech`, and the mapping between the original timeline and the
+    speech-only audio built from them.
+
+    The speech-only audio holds the regions one after the other, separated by `separator_seconds` of silence so
+    Whisper does not join words across a removed silence. Times in the speech-only audio are mapped back to the
+    original timeline with `to_original`; times inside a separator go to the end of the preceding region.
+    """
+
+    def __init__(self, starts, ends, duration, separator_seconds=0.2):
+        """
+        Parameters:
+        - starts, ends (np.ndarray): Start and end of each speech region in seconds, sorted and not overlapping.
+        - duration (float): Duration of the whole audio in seconds.
+        - separator_seconds (float): Silence placed between the regions in the speech-only audio.
+        """
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.duration = duration
+        self.separator_seconds = separator_seconds
+        lengths = self.ends - self.starts
+        # Start of each region in the speech-only audio.
+        self.compact_starts = np.concatenate(([0.0], np.cumsum(lengths + separator_seconds)[:-1]))
+        # Speech accumulated at every region edge, to measure the silence inside any interval.
+        self._edges = np.column_stack((self.starts, self.ends)).ravel()
+        self._speech_at_edges = np.column_stack((np.cumsum(lengths) - lengths, np.cumsum(lengths))).ravel()
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def speech_seconds(self):
+        """
+        float: Total duration of the speech regions.
+        """
+        return float(np.sum(self.ends - self.starts))
+
+    def extract(self, audio):
+        """
+        Builds the speech-only audio: the samples of every region, separated by short silences.
+
+        Parameters:
+        - audio (AudioBuffer): The decoded audio the regions were detected on.
+
+        Returns:
+        - AudioBuffer: The speech-only audio, at the sample rate of `audio`.
+        """
+        rate = audio.sample_rate
+        separator = np.zeros(int(round(self.separator_seconds * rate)), dtype=np.float32)
+        pieces = []
+        for index, (start, end) in enumerate(zip(self.starts, self.ends)):
+            if index:
+                pieces.append(separator)
+            pieces.append(audio.samples[int(round(start * rate)):int(round(end * rate))])
+        samples = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+        return AudioBuffer(samples, rate)
+
+    def to_original(self, times):
+        """
+        Maps times of the speech-only audio to the original timeline.
+
+        Parameters:
+        - times (array-like): Times in the speech-only audio, in seconds.
+
+        Returns:
+        - np.ndarray: The same instants in the original audio.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if len(self.starts) == 0:
+            return times
+        region = np.clip(np.searchsorted(self.compact_starts, times, side="right") - 1, 0, len(self.starts) - 1)
+        offset = np.clip(times - self.compact_starts[region], 0.0, self.ends[region] - self.starts[region])
+        return self.starts[region] + offset
+
+    def words_to_original(self, words, decimals=2):
+        """
+        Maps the timestamps of words transcribed from the speech-only audio to the original timeline.
+
+        Parameters:
+        - words (list): Words with their 'text', 'start' and 'end' in the speech-only audio.
+        - decimals (int): Number of decimal places of the mapped timestamps.
+
+        Returns:
+        - list: New word dictionaries with the original 'start' and 'end'.
+        """
+        starts = self.to_original([word["start"] for word in words])
+        ends = self.to_original([word["end"] for word in words])
+        return [{**word, "start": round(float(start), decimals), "end": round(float(end), decimals)}
+                for word, start, end in zip(words, starts, ends)]
+
+    def silence_between(self, starts, ends):
+        """
+        Returns the time outside the speech regions inside several intervals at once.
+
+        Parameters:
+        - starts, ends (array-like): Start and end of each interval in the original timeline, in seconds.
+
+        Returns:
+        - np.ndarray: Seconds of silence inside each interval.
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        if len(self.starts) == 0:
+            return np.maximum(ends - starts, 0.0)
+        speech = (np.interp(ends, self._edges, self._speech_at_edges)
+                  - np.interp(starts, self._edges, self._speech_at_edges))
+        return np.maximum(ends - starts - speech, 0.0)
+
+    def word_pauses(self, words, last_word_time=0.0, min_pause_seconds=0.01):
+        """
+        Returns the pause before each word, taken from the silences between the speech regions.
+
+        Parameters:
+        - words (list): Words with their 'start' and 'end' in the original timeline, in chronological order.
+        - last_word_time (float): End of the word preceding the first one.
+        - min_pause_seconds (float): Shorter silences are not considered pauses.
+
+        Returns:
+        - np.ndarray: Seconds of silence before each word, NaN where no silence separates it from the previous one.
+        """
+        starts = np.array([word["start"] for word in words], dtype=np.float64)
+        previous_ends = np.concatenate(([last_word_time], [word["end"] for word in words[:-1]]))
+        silence = self.silence_between(previous_ends, starts)
+        return np.where(silence >= min_pause_seconds, silence, np.nan)
+
+    def map_pitch_track(self, pitch_track):
+        """
+        Moves a pitch contour computed on the speech-only audio to the original timeline.
+
+        The separator frames land on the end of their region and are unvoiced, so the silences have no pitch.
+
+        Parameters:
+        - pitch_track (PitchTrack): The contour of the speech-only audio.
+
+        Returns:
+        - PitchTrack: The contour in the original timeline.
+        """
+        return PitchTrack(self.to_original(pitch_track.times), pitch_track.f0, pitch_track.voiced)
+
+
+def detect_speech(audio, frame_seconds=0.02, energy_margin_db=12.0, fricative_margin_db=6.0, zcr_threshold=0.25,
+                  min_silence_seconds=0.3, min_speech_seconds=0.1, padding_seconds=0.1, separator_seconds=0.2):
+    """
+    Finds the speech regions of an audio with an energy and zero-crossing detector.
+
+    A frame is speech when its energy is `energy_margin_db` above the noise floor (the 10th percentile of the frame
+    energies), or `fricative_margin_db` above it with a zero-crossing rate above `zcr_threshold`, which keeps the
+    quiet unvoiced consonants (s, sh, h). Silences shorter than `min_silence_seconds` are bridged, regions shorter
+    than `min_speech_seconds` dropped, and the remaining regions padded by `padding_seconds` on each side.
+    Recordings without a clear noise floor (no silence at all) are a single region.
+
+    Parameters:
+    - audio (AudioBuffer or str): The decoded audio, or the path to the audio file.
+    - frame_seconds (float): Length of the analysis frames.
+    - energy_margin_db (float): Energy above the noise floor of a speech frame, in dB.
+    - fricative_margin_db (float): Energy above the noise floor of a speech frame with a high zero-crossing rate.
+    - zcr_threshold (float): Fraction of sign changes between consecutive samples of an unvoiced consonant frame.
+    - min_silence_seconds (float): Shortest silence kept between two regions.
+    - min_speech_seconds (float): Shortest region kept.
+    - padding_seconds (float): Silence kept around each region, so word edges are not cut.
+    - separator_seconds (float): Silence between the regions in the speech-only audio (see `SpeechRegions`).
+
+    Returns:
+    - SpeechRegions: The speech regions of the audio.
+    """
+    audio = load_audio(audio)
+    duration = audio.duration
+    frame_size = max(int(frame_seconds * audio.sample_rate), 1)
+    frame_count = len(audio.samples) // frame_size
+    if frame_count == 0:
+        return SpeechRegions([], [], duration, separator_seconds)
+
+    frames = audio.samples[:frame_count * frame_size].reshape(frame_count, frame_size)
+    energy = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame_size + 1e-10)
+    signs = np.signbit(frames)
+    crossing_rate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_size - 1 or 1)
+
+    noise_floor, loud = np.percentile(energy, [10, 90])
+    if loud - noise_floor < energy_margin_db:
+        # No silence stands out from the rest: everything is speech (or everything is silence)
+        speech = np.full(frame_count, loud > -60.0)
+    else:
+        speech = (energy > noise_floor + energy_margin_db) | (
+            (energy > noise_floor + fricative_margin_db) & (crossing_rate > zcr_threshold))
+
+    # Edges of the runs of speech frames, in seconds
+    changes = np.flatnonzero(np.diff(np.concatenate(([False], speech, [False])).astype(np.int8)))
+    starts = changes[0::2] * frame_seconds
+    ends = np.minimum(changes[1::2] * frame_seconds, duration)
+
+    # Bridge the short silences, then drop the short regions
+    if len(starts):
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] >= min_silence_seconds))
+        starts, ends = starts[keep], np.maximum.reduceat(ends, np.flatnonzero(keep))
+    long_enough = ends - starts >= min_speech_seconds
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    # Pad the regions and merge those that now touch
+    starts = np.maximum(starts - padding_seconds, 0.0)
+    ends = np.minimum(ends + padding_seconds, duration)
+    if len(starts):
+        keep = np.concatenate(([True], starts[1:] > ends[:-1]))
+        starts, ends = starts[keep], np.maximum.reduceat(ends, np.flatnonzero(keep))
+    return SpeechRegions(starts, ends, duration, separator_seconds)
@@ -0,0 +1,280 @@
+# Standard library imports
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party library imports
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# httpx is optional: without it the asynchronous client runs the pooled synchronous one in threads.
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Local application imports
+from . import config
+
+# Status codes worth retrying: the engine is busy, restarting or behind a proxy that failed.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _QueryCache:
+    """
+    Thread-safe LRU cache of audio query responses, keyed by (text, speaker).
+
+    Responses are stored as JSON text and decoded on every hit, so callers can modify the returned query without
+    affecting later hits.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(text)
+
+    def put(self, key, text):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class VoicevoxClient:
+    """
+    Client of the VOICEVOX engine that keeps its connections alive between calls.
+
+    Requests go through one `requests.Session` with a connection pool of `max_connections`, so comparing thousands
+    of sentences does not open a TCP connection per sentence. Failed connections and busy responses are retried
+    with exponential backoff, every request has a timeout, and identical queries are answered from an LRU cache.
+    """
+
+    def __init__(self, base_url=None, max_connections=None, timeout=None, retries=3, backoff=0.5,
+                 cache_size=1024):
+        """
+        Parameters:
+        - base_url (str): URL of the engine. Defaults to MORA_VOICEVOX_URL (http://127.0.0.1:50021).
+        - max_connections (int): Size of the connection pool, and number of parallel requests of the batch methods.
+        - timeout (float): Seconds to wait for a connection or a response.
+        - retries (int): Retries of a request after a connection error or a status in RETRY_STATUSES.
+        - backoff (float): Base delay of the retries; attempt n waits backoff * 2 ** (n - 1) seconds.
+        - cache_size (int): Number of responses kept in the LRU cache. 0 disables the cache.
+        """
+        self.base_url = (base_url or config.VOICEVOX_URL).rstrip("/")
+        self.max_connections = max_connections or config.VOICEVOX_CONCURRENCY
+        self.timeout = timeout or config.VOICEVOX_TIMEOUT
+        self.cache = _QueryCache(cache_size)
+
+        # audio_query does not change the state of the engine, so POST requests are safe to retry.
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset(["GET", "POST"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def audio_query(self, text, speaker=1):
+        """
+        Generates the audio query of a text.
+
+        Parameters:
+        - text (str): The text to synthesize.
+        - speaker (int): The speaker ID for voice synthesis.
+
+        Returns:
+        - dict: The audio query returned by VOICEVOX.
+
+        Raises:
+        - requests.RequestException: If the engine cannot be reached or answers with an error after the retries.
+        """
+        key = (text, speaker)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = self.session.post(f"{self.base_url}/audio_query", params={"text": text, "speaker": speaker},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        self.cache.put(key, response.text)
+        return response.json()
+
+    def audio_queries(self, queries):
+        """
+        Generates the audio queries of many texts in parallel, with at most `max_connections` requests at a time.
+
+        Parameters:
+        - queries (iterable): (text, speaker) pairs.
+
+        Returns:
+        - list: The audio query of each pair, in the same order, or None for the pairs that failed.
+        """
+        queries = list(queries)
+
+        def query_or_none(query):
+            try:
+                return self.audio_query(*query)
+            except requests.RequestException as e:
+                print(f"VOICEVOX query failed for {query!r}: {e}")
+                return None
+
+        # Identical pairs are requested once; the cache answers the repetitions.
+        unique = list(dict.fromkeys(queries))
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            results = dict(zip(unique, executor.map(query_or_none, unique)))
+        return [results[query] for query in queries]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncVoicevoxClient:
+    """
+    Asynchronous version of VoicevoxClient, for callers that already run an event loop.
+
+    Uses a pooled `httpx.AsyncClient` when httpx is installed, and otherwise the pooled synchronous client in worker
+    threads. A semaphore limits the requests in flight to `max_connections` in both cases.
+    """
+
+    def __init__(self, base_url=None, max_connections=None, timeout=None, retries=3, backoff=0.5,
+                 cache_size=1024):
+        """
+        Parameters: as in VoicevoxClient.
+        """
+        self.base_url = (base_url or config.VOICEVOX_URL).rstrip("/")
+        self.max_connections = max_connections or config.VOICEVOX_CONCURRENCY
+        self.timeout = timeout or config.VOICEVOX_TIMEOUT
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = _QueryCache(cache_size)
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+        if httpx is not None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections))
+            self._sync_client = None
+        else:
+            self._client = None
+            self._sync_client = VoicevoxClient(self.base_url, self.max_connections, self.timeout, retries, backoff,
+                                               cache_size=0)
+
+    async def _post(self, params):
+        """
+        Sends one audio_query request, retrying connection errors and busy responses with exponential backoff.
+        """
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self._client.post("/audio_query", params=params)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    response.raise_for_status()
+                    return response.text
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def audio_query(self, text, speaker=1):
+        """
+        Generates the audio query of a text.
+
+        Parameters:
+        - text (str): The text to synthesize.
+        - speaker (int): The speaker ID for voice synthesis.
+
+        Returns:
+        - dict: The audio query returned by VOICEVOX.
+
+        Raises:
+        - httpx.HTTPError or requests.RequestException: If the request fails after the retries.
+        """
+        key = (text, speaker)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        async with self._semaphore:
+            if self._client is not None:
+                body = await self._post({"text": text, "speaker": speaker})
+            else:
+                body = json.dumps(await asyncio.to_thread(self._sync_client.audio_query, text, speaker))
+        self.cache.put(key, body)
+        return json.loads(body)
+
+    async def audio_queries(self, queries):
+        """
+        Generates the audio queries of many texts concurrently.
+
+        Parameters:
+        - queries (iterable): (text, speaker) pairs.
+
+        Returns:
+        - list: The audio query of each pair, in the same order, or None for the pairs that failed.
+        """
+        queries = list(queries)
+        unique = list(dict.fromkeys(queries))
+        results = await asyncio.gather(*(self.audio_query(*query) for query in unique), return_exceptions=True)
+        by_query = {}
+        for query, result in zip(unique, results):
+            if isinstance(result, Exception):
+                print(f"VOICEVOX query failed for {query!r}: {result}")
+                result = None
+            by_query[query] = result
+        return [by_query[query] for query in queries]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        else:
+            self._sync_client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_voicevox_client():
+    """
+    Returns the process-wide VoicevoxClient, created on first use with the configured URL.
+
+    Returns:
+    - VoicevoxClient: The shared client.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = VoicevoxClient()
+        return _default_client
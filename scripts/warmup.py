@@ -0,0 +1,59 @@
+# Standard library imports
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from .audio_buffer import SAMPLE_RATE
+from .model_registry import model_registry
+from .mora_mapping import load_mora_table
+from .speech_symbol_timestamps import audio_query_json
+from .auxiliar_functions_for_audio_query import text_to_kanji
+
+
+def dummy_audio(seconds=1.0, frequency=220.0):
+    """
+    Returns a short tone at 16 kHz, enough to run every stage of the pipeline once.
+    """
+    times = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.1 * np.sin(2 * np.pi * frequency * times)).astype(np.float32)
+
+
+def warmup(model_names=("default",), mapping_file="files/mapping.json", language="ja", inference=True):
+    """
+    Prepares a process to answer requests at full speed: imports the heavy dependencies and loads the Whisper
+    models, the kana converter and the mapping table, then runs the pipeline once on a dummy audio per model so
+    the first request does not pay for the lazy initialisations of torch and Aubio either.
+
+    Parameters:
+    - model_names (iterable): Names of registered models to load and run.
+    - mapping_file (str): Path to the JSON file containing mappings for consonant and vowel information.
+    - language (str): Language of the dummy transcriptions.
+    - inference (bool): Whether to run the dummy inference after loading.
+
+    Returns:
+    - dict: Seconds spent in each warmup step.
+    """
+    timings = {}
+    start_time = time.perf_counter()
+    model_registry.preload(model_names)
+    timings["models"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    text_to_kanji("日本語")  # Builds the shared pykakasi converter
+    timings["kana"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    load_mora_table(mapping_file)
+    timings["mapping"] = time.perf_counter() - start_time
+
+    if inference:
+        start_time = time.perf_counter()
+        for name in model_names:
+            audio_query_json(samples=dummy_audio(), sample_rate=SAMPLE_RATE, mapping_file=mapping_file,
+                             model_name=name, language=language, use_cache=False)
+        timings["inference"] = time.perf_counter() - start_time
+
+    print("Warmup done:", {step: round(seconds, 3) for step, seconds in timings.items()})
+    return timings
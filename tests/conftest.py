@@ -0,0 +1,51 @@
+# Standard library imports
+import copy
+
+# Third-party library imports
+import numpy as np
+import pytest
+
+
+def transcription(*words):
+    """
+    Builds a whisper_timestamped-style transcription from (text, start, end) tuples.
+    """
+    words = [{"text": text, "start": start, "end": end} for text, start, end in words]
+    return {"text": "".join(word["text"] for word in words), "segments": [{"words": words}] if words else []}
+
+
+class ScriptedTranscriber:
+    """
+    Replacement of whisper_timestamped returning a fixed transcription and counting its calls.
+    """
+
+    def __init__(self, result, transcription_path=None):
+        self.result = result
+        self.calls = 0
+        if transcription_path is not None:
+            self.transcription_path = transcription_path
+
+    def __call__(self, samples, language=None):
+        self.calls += 1
+        return copy.deepcopy(self.result)
+
+
+@pytest.fixture
+def tone():
+    """
+    Two seconds of a 220 Hz tone at 16 kHz with a little noise, unique per test so cached results never leak.
+    """
+    times = np.arange(32000) / 16000
+    noise = np.random.default_rng().standard_normal(len(times)) * 0.01
+    return (0.3 * np.sin(2 * np.pi * 220 * times) + noise).astype(np.float32)
+
+
+@pytest.fixture
+def audio_query(tone):
+    """
+    Audio query of the test tone with three scripted words, the second one after a pause.
+    """
+    # Imported here, so the tests of modules that do not need the pipeline do not load it
+    from scripts.speech_symbol_timestamps import audio_query_json
+    transcriber = ScriptedTranscriber(transcription(("キョウ", 0.1, 0.5), ("ハ", 0.7, 0.9), ("ハレ？", 0.9, 1.6)))
+    return audio_query_json(samples=tone, sample_rate=16000, transcriber=transcriber, use_cache=False)
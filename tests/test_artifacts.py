@@ -0,0 +1,123 @@
+# Standard library imports
+import json
+import shutil
+
+# Third-party library imports
+import pytest
+
+# Local application imports
+from scripts.artifacts import ArtifactStore, incremental_audio_query
+from scripts.audio_buffer import AudioBuffer
+from scripts.batch_transcriber import BatchTranscriber
+from scripts.result_cache import audio_cache_key
+from conftest import ScriptedTranscriber, transcription
+
+
+@pytest.fixture
+def setup(tmp_path, tone):
+    mapping_file = tmp_path / "mapping.json"
+    shutil.copy("files/mapping.json", mapping_file)
+    return ArtifactStore(str(tmp_path / "artifacts")), AudioBuffer(tone), str(mapping_file)
+
+
+def query(store, audio, mapping_file, transcriber, **options):
+    return incremental_audio_query(audio, store, mapping_file=mapping_file, transcriber=transcriber, **options)
+
+
+def test_second_run_recomputes_nothing(setup):
+    store, audio, mapping_file = setup
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8), ("は", 0.8, 1.0)))
+    first = query(store, audio, mapping_file, transcriber)
+    second = query(store, audio, mapping_file, transcriber)
+    assert first.recomputed == ["transcript", "pitch", "audio_query"]
+    assert second.recomputed == []
+    assert second.audio_query == first.audio_query
+    assert transcriber.calls == 1
+
+
+def test_mapping_change_rebuilds_only_the_audio_query(setup):
+    store, audio, mapping_file = setup
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    first = query(store, audio, mapping_file, transcriber)
+    with open(mapping_file, "a", encoding="utf-8") as mapping:
+        mapping.write("\n")
+    second = query(store, audio, mapping_file, transcriber)
+    assert second.recomputed == ["audio_query"]
+    assert second.audio_query == first.audio_query
+    assert transcriber.calls == 1
+
+
+def test_corrected_transcript_is_kept(setup):
+    store, audio, mapping_file = setup
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    query(store, audio, mapping_file, transcriber)
+    [path] = store.variants(audio_cache_key(audio), "transcript.json")
+    with open(path, encoding="utf-8") as transcript_file:
+        artifact = json.load(transcript_file)
+    artifact["data"]["words"][0]["text"] = "あした"
+    artifact["data"]["transcription"] = "あした"
+    with open(path, "w", encoding="utf-8") as transcript_file:
+        json.dump(artifact, transcript_file, ensure_ascii=False)
+
+    corrected = query(store, audio, mapping_file, transcriber)
+    assert corrected.recomputed == ["audio_query"]
+    assert corrected.audio_query["kana"] == "あした"
+    assert transcriber.calls == 1
+
+
+def test_parameters_invalidate_their_stages(setup):
+    store, audio, mapping_file = setup
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    query(store, audio, mapping_file, transcriber)
+    assert query(store, audio, mapping_file, transcriber, decimals=2).recomputed == ["audio_query"]
+    # The scripted words do not change with the model, so the audio query of that transcript is reused
+    assert query(store, audio, mapping_file, transcriber, model_name="int8").recomputed == ["transcript"]
+    assert query(store, audio, mapping_file, transcriber, vad=True).recomputed == ["transcript", "pitch",
+                                                                                   "audio_query"]
+
+
+def test_switching_settings_back_reuses_their_artifacts(setup):
+    store, audio, mapping_file = setup
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    query(store, audio, mapping_file, transcriber)
+    query(store, audio, mapping_file, transcriber, vad=True, decimals=2)
+    assert query(store, audio, mapping_file, transcriber).recomputed == []
+    assert query(store, audio, mapping_file, transcriber, vad=True, decimals=2).recomputed == []
+    assert transcriber.calls == 2
+
+
+def test_least_recently_used_variants_are_removed(setup, tmp_path):
+    _, audio, mapping_file = setup
+    store = ArtifactStore(str(tmp_path / "small"), max_variants=2)
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    for decimals in (2, 3, 2, 4):
+        query(store, audio, mapping_file, transcriber, decimals=decimals)
+    assert len(store.variants(audio_cache_key(audio), "audio_query.json")) == 2
+    assert query(store, audio, mapping_file, transcriber, decimals=2).recomputed == []
+    assert query(store, audio, mapping_file, transcriber, decimals=3).recomputed == ["audio_query"]
+
+
+def test_corrected_speech_regions_recompute_the_pitch(setup):
+    store, audio, mapping_file = setup
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    query(store, audio, mapping_file, transcriber, vad=True)
+    [path] = store.variants(audio_cache_key(audio), "transcript.json")
+    with open(path, encoding="utf-8") as transcript_file:
+        artifact = json.load(transcript_file)
+    artifact["data"]["speech_regions"] = {"starts": [0.1], "ends": [1.9], "separator_seconds": 0.1}
+    with open(path, "w", encoding="utf-8") as transcript_file:
+        json.dump(artifact, transcript_file, ensure_ascii=False)
+
+    assert query(store, audio, mapping_file, transcriber, vad=True).recomputed == ["pitch", "audio_query"]
+    assert transcriber.calls == 1
+
+
+def test_transcription_path_is_part_of_the_transcript_fingerprint(setup):
+    store, audio, mapping_file = setup
+    single = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    batched = ScriptedTranscriber(transcription(("きのう", 0.2, 0.8)),
+                                  transcription_path=BatchTranscriber.transcription_path)
+    first = query(store, audio, mapping_file, single)
+    second = query(store, audio, mapping_file, batched)
+    assert second.recomputed == ["transcript", "audio_query"]
+    assert first.audio_query["kana"] != second.audio_query["kana"]
@@ -0,0 +1,76 @@
+# Standard library imports
+import shutil
+import wave
+
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts.audio_buffer import AudioBuffer, StreamResampler, integer_to_float, resample
+
+
+def tone(frequency, seconds, sample_rate, amplitude=0.5):
+    times = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * frequency * times)).astype(np.float32)
+
+
+def rms(samples):
+    return float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+
+
+def test_integer_scaling():
+    assert integer_to_float(np.array([-32768, 0, 16384], dtype=np.int16)).tolist() == [-1.0, 0.0, 0.5]
+    assert integer_to_float(np.array([0, 128, 192], dtype=np.uint8)).tolist() == [-1.0, 0.0, 0.5]
+    assert integer_to_float(np.array([-2 ** 31], dtype=np.int32)).tolist() == [-1.0]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_from_array_matches_from_file(tmp_path):
+    pcm = (tone(440, 1.0, 16000) * 32767).astype(np.int16)
+    path = tmp_path / "tone.wav"
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(pcm.tobytes())
+    decoded = AudioBuffer.from_file(str(path))
+    in_memory = AudioBuffer.from_array(pcm, 16000)
+    assert np.array_equal(decoded.samples, in_memory.samples)
+
+
+def test_from_array_mixes_down_to_mono():
+    stereo = np.stack((np.full(160, 0.5), np.full(160, -0.25)), axis=1).astype(np.float32)
+    audio = AudioBuffer.from_array(stereo, 16000)
+    assert audio.samples.dtype == np.float32
+    assert np.allclose(audio.samples, 0.125)
+
+
+@pytest.mark.parametrize("source_rate", [8000, 22050, 44100, 48000])
+def test_resample_length(source_rate):
+    samples = tone(220, 1.003, source_rate)
+    resampled = resample(samples, source_rate, 16000)
+    assert resampled.dtype == np.float32
+    assert len(resampled) == -(-len(samples) * 16000 // source_rate)
+
+
+def test_resample_removes_frequencies_above_the_new_nyquist():
+    # A 12 kHz tone folds onto 4 kHz when 44.1 kHz audio is decimated without a low-pass filter
+    assert rms(resample(tone(12000, 1.0, 44100), 44100, 16000)) < 0.01
+    assert rms(resample(tone(1000, 1.0, 44100), 44100, 16000)) == pytest.approx(0.5 / np.sqrt(2), rel=0.01)
+
+
+@pytest.mark.parametrize("source_rate", [8000, 16000, 22050, 44100, 48000])
+def test_stream_resampler_matches_resample(source_rate):
+    rng = np.random.default_rng(source_rate)
+    samples = rng.standard_normal(source_rate * 2).astype(np.float32) * 0.1
+    resampler = StreamResampler(source_rate, 16000)
+    chunks, position = [], 0
+    while position < len(samples):
+        size = int(rng.integers(1, 4000))
+        chunks.append(resampler.feed(samples[position:position + size]))
+        position += size
+    chunks.append(resampler.flush())
+    streamed = np.concatenate(chunks)
+    assert resampler.output_count == len(streamed)
+    assert np.allclose(streamed, resample(samples, source_rate, 16000), atol=1e-6)
@@ -0,0 +1,84 @@
+# Standard library imports
+import threading
+import time
+
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts import batch_transcriber as batch_module
+from scripts.batch_transcriber import BATCH_WINDOW_SAMPLES, BatchTranscriber
+from scripts.speech_symbol_timestamps import transcribe_samples
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """
+    Replaces the batched decoding and the sequential path of long clips with stubs, returning the batches decoded.
+    """
+    batches = []
+
+    def transcribe_batch(model, clips, language="ja"):
+        batches.append((language, [len(clip) for clip in clips]))
+        return [{"text": f"{language}:{len(clip)}", "segments": []} for clip in clips]
+
+    def transcribe_long(samples, model_name="default", language="ja", transcriber=None):
+        time.sleep(1.0)
+        return {"text": f"long:{language}", "segments": []}
+
+    monkeypatch.setattr(batch_module, "get_model", lambda name: None)
+    monkeypatch.setattr(batch_module, "transcribe_batch", transcribe_batch)
+    monkeypatch.setattr(batch_module, "transcribe_samples", transcribe_long)
+    return batches
+
+
+def transcribe_concurrently(transcriber, *requests):
+    results = [None] * len(requests)
+
+    def call(index, samples, language):
+        results[index] = transcriber.transcribe(samples, language)
+
+    threads = [threading.Thread(target=call, args=(index, np.zeros(size, dtype=np.float32), language))
+               for index, (size, language) in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_long_clip_does_not_delay_short_clips(batches):
+    transcriber = BatchTranscriber(max_wait_ms=20)
+    try:
+        long_result = []
+        long_call = threading.Thread(target=lambda: long_result.append(
+            transcriber.transcribe(np.zeros(BATCH_WINDOW_SAMPLES + 1, dtype=np.float32))))
+        long_call.start()
+        time.sleep(0.05)
+        start_time = time.perf_counter()
+        assert transcriber.transcribe(np.zeros(16000, dtype=np.float32))["text"] == "ja:16000"
+        assert time.perf_counter() - start_time < 0.5
+        long_call.join()
+        assert long_result == [{"text": "long:ja", "segments": []}]
+        assert batches == [("ja", [16000])]
+    finally:
+        transcriber.close()
+
+
+def test_batches_are_grouped_by_language(batches):
+    transcriber = BatchTranscriber(max_batch=8, max_wait_ms=200)
+    try:
+        results = transcribe_concurrently(transcriber, (100, "ja"), (200, "en"), (300, "ja"), (400, None))
+    finally:
+        transcriber.close()
+    assert [result["text"] for result in results] == ["ja:100", "en:200", "ja:300", "ja:400"]
+    assert sorted((language, sorted(sizes)) for language, sizes in batches) == [("en", [200]),
+                                                                               ("ja", [100, 300, 400])]
+
+
+def test_transcribe_samples_passes_the_language():
+    languages = []
+    transcriber = lambda samples, language=None: languages.append(language) or {"text": "", "segments": []}
+    transcribe_samples(np.zeros(10, dtype=np.float32), language="en", transcriber=transcriber)
+    assert languages == ["en"]
@@ -0,0 +1,47 @@
+# Standard library imports
+import copy
+
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts.columnar import from_columns, load_npz, read_parquet, save_npz, to_columns, to_npz_bytes, write_parquet
+
+
+def test_columns_use_no_python_objects(audio_query):
+    columns = to_columns(audio_query)
+    assert all(array.dtype != object for array in columns.values())
+    assert columns["phrase_offsets"].tolist() == [0, 2, 3, 6]
+    assert columns["mora.start"].tolist()[:3] == [0.1, 0.3, 0.7]
+
+
+def test_npz_round_trip(audio_query, tmp_path):
+    path = tmp_path / "query.npz"
+    save_npz(path, audio_query)
+    assert load_npz(path) == audio_query
+    assert from_columns(to_columns(audio_query)) == audio_query
+    assert len(to_npz_bytes(audio_query)) > 0
+
+
+def test_round_trip_keeps_nulls_and_missing_keys(audio_query):
+    query = copy.deepcopy(audio_query)
+    del query["accent_phrases"][1]["moras"][0]["pitch"]
+    query["accent_phrases"][0]["pause_mora"] = None
+    query["final_pause"] = None
+    assert from_columns(to_columns(query)) == query
+
+
+def test_empty_audio_query_round_trip():
+    query = {"transcription": "", "accent_phrases": [], "final_pause": None}
+    assert from_columns(to_columns(query)) == query
+
+
+def test_parquet_round_trip(audio_query, tmp_path):
+    pytest.importorskip("pyarrow")
+    other = copy.deepcopy(audio_query)
+    other["accent_phrases"] = other["accent_phrases"][:1]
+    queries = {"a.wav": audio_query, "b.wav": other, "silence.wav": {"accent_phrases": [], "final_pause": None}}
+    path = tmp_path / "queries.parquet"
+    write_parquet(str(path), queries)
+    assert read_parquet(str(path)) == queries
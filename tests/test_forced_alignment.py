@@ -0,0 +1,81 @@
+# Standard library imports
+import itertools
+
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts.audio_buffer import AudioBuffer
+from scripts.forced_alignment import compute_acoustic_features, consonant_ends, segment_span
+
+
+def brute_force_span(score, first, last, count, min_frames, prior_weight):
+    """
+    Tries every placement of the boundaries of `segment_span` and returns the cheapest one.
+    """
+    segment = (last - first) / count
+    best, best_cost = None, np.inf
+    for boundaries in itertools.combinations(range(first + min_frames, last - min_frames + 1), count - 1):
+        edges = (first,) + boundaries + (last,)
+        if min(np.diff(edges)) < min_frames:
+            continue
+        cost = sum(-score[boundary] + prior_weight * ((boundary - (first + k * segment)) / segment) ** 2
+                   for k, boundary in enumerate(boundaries, start=1))
+        if cost < best_cost:
+            best, best_cost = edges, cost
+    return list(best)
+
+
+def tone(frequency, seconds, sample_rate=16000, amplitude=0.3):
+    times = np.arange(int(seconds * sample_rate)) / sample_rate
+    return amplitude * np.sin(2 * np.pi * frequency * times)
+
+
+@pytest.mark.parametrize("count", [2, 3, 4])
+def test_segment_span_finds_the_cheapest_boundaries(count):
+    rng = np.random.default_rng(count)
+    for _ in range(20):
+        score = rng.standard_normal(40)
+        first, last = int(rng.integers(0, 8)), int(rng.integers(28, 41))
+        expected = brute_force_span(score, first, last, count, 3, 0.5)
+        assert segment_span(score, first, last, count, min_frames=3, prior_weight=0.5).tolist() == expected
+
+
+def test_segment_span_edge_cases():
+    score = np.zeros(20)
+    assert segment_span(score, 5, 15, 1).tolist() == [5, 15]
+    assert segment_span(score, 5, 7, 3) is None
+    # Without acoustic evidence the boundaries follow the equal split
+    assert segment_span(score, 0, 20, 4).tolist() == [0, 5, 10, 15, 20]
+
+
+def test_segment_span_follows_acoustic_boundaries():
+    # Three "moras" of different pitch separated by short closures, at 0.25 s and 0.6 s instead of the equal
+    # split at 0.3 s and 0.6 s
+    silence = np.zeros(480)
+    samples = np.concatenate((tone(150, 0.22), silence, tone(300, 0.32), silence, tone(500, 0.27)))
+    features = compute_acoustic_features(AudioBuffer(samples.astype(np.float32)))
+    edges = segment_span(features.boundary_score(), 0, len(features.times), 3)
+    boundaries = features.times[edges[1:-1]]
+    assert boundaries == pytest.approx([0.25, 0.6], abs=0.03)
+
+
+def test_consonant_ends():
+    onset = np.zeros(30)
+    onset[[3, 14, 16, 27]] = 1.0
+    starts, ends = np.array([0, 10, 20, 29]), np.array([10, 20, 29, 30])
+    # The third mora has its peak beyond half its length, and the last one is a single frame
+    assert consonant_ends(onset, starts, ends).tolist() == [3, 14, 21, -1]
+    assert consonant_ends(onset, starts[:0], ends[:0]).tolist() == []
+
+
+def test_consonant_ends_find_the_vowel_onset():
+    # A noise burst (the consonant) followed by a voiced vowel starting 0.06 s into the mora
+    rng = np.random.default_rng(0)
+    samples = np.concatenate((np.zeros(1600), 0.02 * rng.standard_normal(960), tone(200, 0.2), np.zeros(1600)))
+    features = compute_acoustic_features(AudioBuffer(samples.astype(np.float32)))
+    start = int(np.searchsorted(features.times, 0.1))
+    end = int(np.searchsorted(features.times, 0.36))
+    vowel = consonant_ends(features.onset_score(), np.array([start]), np.array([end]))[0]
+    assert features.times[vowel] == pytest.approx(0.16, abs=0.02)
@@ -0,0 +1,131 @@
+# Standard library imports
+import asyncio
+import threading
+import time
+
+# Third-party library imports
+import pytest
+
+# Local application imports
+from scripts.inference_pool import InferencePool, PoolFullError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(max_workers=1, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_run_returns_the_result(pool):
+    assert run(pool.run(lambda x, y=0: x + y, 2, y=3)) == 5
+    assert pool.pending == 0
+
+
+def test_rejects_jobs_beyond_workers_and_queue(pool):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        waiting = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert pool.pending == 2
+        with pytest.raises(PoolFullError):
+            await pool.run(time.sleep, 0)
+        release.set()
+        await asyncio.gather(running, waiting)
+
+    run(scenario())
+    assert pool.pending == 0
+
+
+def test_timeout_raises_and_frees_the_slot(pool):
+    with pytest.raises(asyncio.TimeoutError):
+        run(pool.run(time.sleep, 0.3, timeout=0.05))
+    # The running job finishes in the background, then its slot is released
+    time.sleep(0.4)
+    assert pool.pending == 0
+    assert run(pool.run(lambda: "free")) == "free"
+
+
+def test_queued_job_is_dropped_on_timeout(pool):
+    release = threading.Event()
+    calls = []
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(calls.append, "queued", timeout=0.05)
+        release.set()
+        await running
+
+    run(scenario())
+    time.sleep(0.05)
+    assert calls == []
+    assert pool.pending == 0
+
+
+def test_reservation_holds_one_slot_until_released(pool):
+    reservation = pool.reserve()
+    assert pool.pending == 1
+    assert run(reservation.run(lambda: 1)) == 1
+    assert run(reservation.run(lambda: 2)) == 2
+    assert pool.pending == 1  # Jobs of a reservation do not take another slot
+    second = pool.reserve()
+    with pytest.raises(PoolFullError):
+        pool.reserve()
+    reservation.release()
+    reservation.release()  # Idempotent
+    second.release()
+    assert pool.pending == 0
+    with pytest.raises(RuntimeError):
+        run(reservation.run(lambda: 3))
+
+
+def test_reservation_jobs_time_out(pool):
+    reservation = pool.reserve()
+    with pytest.raises(asyncio.TimeoutError):
+        run(reservation.run(time.sleep, 0.3, timeout=0.05))
+    reservation.release()
+
+
+def test_run_local_takes_a_slot(pool):
+    reservation = pool.reserve()
+    second = pool.reserve()
+    with pytest.raises(PoolFullError):
+        run(pool.run_local(lambda: None))
+    reservation.release()
+    assert run(pool.run_local(lambda: "local")) == "local"
+    second.release()
+    assert pool.pending == 0
+
+
+def test_warm_up_ignores_the_admission_control(monkeypatch):
+    warmed = []
+    monkeypatch.setattr("scripts.inference_pool.warmup", lambda names, inference: warmed.append(names))
+    pool = InferencePool(max_workers=1, max_queue=0)
+    reservation = pool.reserve()
+    try:
+        run(pool.warm_up(["default"], inference=False))
+        assert warmed == [["default"]]
+        assert pool.pending == 1
+    finally:
+        reservation.release()
+        pool.shutdown()
+
+
+def test_process_workers_warm_up_while_the_pool_is_full():
+    pool = InferencePool(max_workers=1, max_queue=0, kind="process", warmup_inference=False)
+    reservation = pool.reserve()
+    try:
+        run(asyncio.wait_for(pool.warm_up([], inference=False), 60))
+        with pytest.raises(PoolFullError):
+            run(pool.run(time.sleep, 0))
+    finally:
+        reservation.release()
+        pool.shutdown()
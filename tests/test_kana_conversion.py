@@ -0,0 +1,59 @@
+# Third-party library imports
+import pytest
+
+# Local application imports
+from scripts import auxiliar_functions_for_audio_query as kana
+from scripts.auxiliar_functions_for_audio_query import clear_kana_memo, text_to_kanji, texts_to_kanji
+
+
+class RecordingConverter:
+    """
+    Stands in for the pykakasi converter, upper-casing the text and recording every call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def do(self, text):
+        self.calls.append(text)
+        return text.upper()
+
+
+@pytest.fixture
+def converter(monkeypatch):
+    converter = RecordingConverter()
+    monkeypatch.setattr(kana, "_kana_converter", converter)
+    clear_kana_memo()
+    yield converter
+    clear_kana_memo()
+
+
+def test_keeps_the_order_and_the_duplicates(converter):
+    assert texts_to_kanji(["b", "a", "b", "c", "a"]) == ["B", "A", "B", "C", "A"]
+    assert texts_to_kanji([]) == []
+
+
+def test_converts_the_distinct_texts_in_one_call(converter):
+    texts_to_kanji(["b", "a", "b", "c", "a"])
+    assert converter.calls == ["b\na\nc"]
+
+
+def test_memoized_texts_are_not_converted_again(converter):
+    texts_to_kanji(["a", "b"])
+    assert text_to_kanji("a") == "A"
+    assert texts_to_kanji(["b", "c", "a"]) == ["B", "C", "A"]
+    assert converter.calls == ["a\nb", "c"]
+
+
+def test_texts_with_line_breaks_are_converted_alone(converter):
+    assert texts_to_kanji(["a", "x\ny", "b"]) == ["A", "X\nY", "B"]
+    assert converter.calls == ["a\nb", "x\ny"]
+
+
+def test_batch_matches_the_conversion_of_each_text():
+    pytest.importorskip("pykakasi")
+    words = ["今日", "は", "日本", "語", "を", "勉強", "し", "ます", "えー", "と", "日本語", "ひらがな", "カタカナ", "、"]
+    clear_kana_memo()
+    converter = kana._get_kana_converter()
+    expected = [converter.do(word) for word in words]
+    assert texts_to_kanji(words) == expected
@@ -0,0 +1,84 @@
+# Standard library imports
+import threading
+import time
+
+# Third-party library imports
+from fastapi.testclient import TestClient
+
+# Local application imports
+import app
+from scripts.metrics import MetricsRegistry, collect_timings, stage
+
+
+def test_stage_timers_accumulate_inside_collect_timings():
+    with collect_timings() as timings:
+        with stage("decode"):
+            time.sleep(0.01)
+        for _ in range(2):
+            with stage("pitch"):
+                time.sleep(0.01)
+    assert set(timings) == {"decode", "pitch"}
+    assert timings["decode"] >= 0.01
+    assert timings["pitch"] >= 0.02
+    # Outside collect_timings nothing is recorded
+    recorded = dict(timings)
+    with stage("decode"):
+        time.sleep(0.01)
+    assert timings == recorded
+
+
+def test_timings_are_collected_per_thread():
+    collected = {}
+
+    def request(name):
+        with collect_timings() as timings:
+            with stage(name):
+                time.sleep(0.01)
+        collected[name] = timings
+
+    threads = [threading.Thread(target=request, args=(name,)) for name in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {name: list(timings) for name, timings in collected.items()} == {"first": ["first"],
+                                                                            "second": ["second"]}
+
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests answered", ["endpoint", "status"])
+    latency = registry.histogram("latency_seconds", "Latency", ["endpoint"], buckets=(0.1, 1.0))
+    registry.gauge("queue_depth", "Jobs waiting", lambda: 3)
+    requests.inc("/mora", "200")
+    requests.inc("/mora", "200")
+    requests.inc('/a"b', "503")
+    latency.observe(0.05, "/mora")
+    latency.observe(0.5, "/mora")
+    latency.observe(5.0, "/mora")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests answered",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="/a\\"b",status="503"} 1.0',
+        'requests_total{endpoint="/mora",status="200"} 2.0',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{endpoint="/mora",le="0.1"} 1.0',
+        'latency_seconds_bucket{endpoint="/mora",le="1.0"} 2.0',
+        'latency_seconds_bucket{endpoint="/mora",le="+Inf"} 3.0',
+        'latency_seconds_sum{endpoint="/mora"} 5.55',
+        'latency_seconds_count{endpoint="/mora"} 3.0',
+        "# HELP queue_depth Jobs waiting",
+        "# TYPE queue_depth gauge",
+        "queue_depth 3.0",
+    ]
+
+
+def test_metrics_endpoint():
+    response = TestClient(app.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for name in ("mora_stage_seconds", "mora_request_seconds", "mora_requests_total", "mora_queue_depth",
+                 "mora_ready", "mora_realtime_sessions", "mora_result_cache_hit_rate"):
+        assert f"# TYPE {name} " in response.text
@@ -0,0 +1,74 @@
+# Standard library imports
+import json
+import os
+
+# Third-party library imports
+import pytest
+
+# Local application imports
+from scripts.mora_mapping import MoraInfo, MoraTable, load_mora_table, split_moras
+
+
+@pytest.fixture(scope="module")
+def table():
+    return load_mora_table("files/mapping.json")
+
+
+@pytest.mark.parametrize("text, consonant, vowel", [
+    ("きゃ", "ky", "a"), ("キャ", "ky", "a"), ("しゅ", "sh", "u"), ("ちょ", "ch", "o"), ("じょ", "j", "o"),
+    ("ファ", "f", "a"), ("ティ", "t", "i"), ("ウィ", "w", "i"), ("イェ", "y", "e"),
+])
+def test_combined_moras(table, text, consonant, vowel):
+    assert table.lookup(text) == MoraInfo(consonant, vowel, len(consonant), len(vowel))
+
+
+def test_invalid_combinations_are_not_moras(table):
+    # Youon need an i-row kana with a consonant
+    assert "あゃ" not in table
+    assert "かゃ" not in table
+
+
+def test_punctuation_is_ignored_by_lookup(table):
+    assert table.lookup("キャー") == table.lookup("キャ")
+    assert table.lookup("「シャ") == table.lookup("シャ")
+    assert table.lookup("か、") == table.lookup("か")
+    for symbol in ("ッ", "ー", "、", "。"):
+        assert table.lookup(symbol) is None
+
+
+@pytest.mark.parametrize("text, symbols", [
+    ("きゃしゅちょ", ["きゃ", "しゅ", "ちょ"]),
+    ("ファイティング", ["ファ", "イ", "ティ", "ン", "グ"]),
+    ("カッタ", ["カッ", "タ"]),
+    ("きゃー", ["きゃー"]),
+    ("「しゃ", ["「しゃ"]),
+    ("あ、い。", ["あ、", "い。"]),
+    ("ッ", ["ッ"]),
+    ("", []),
+])
+def test_split_moras(text, symbols):
+    assert split_moras(text) == symbols
+
+
+def test_table_is_reloaded_when_the_file_changes(tmp_path):
+    path = tmp_path / "mapping.json"
+    path.write_text(json.dumps({"か": {"consonant": "k", "vowel": "a"}}), encoding="utf-8")
+    first = load_mora_table(str(path))
+    assert load_mora_table(str(path)) is first
+    assert first.lookup("カ") == MoraInfo("k", "a", 1, 1)
+
+    path.write_text(json.dumps({"か": {"consonant": "g", "vowel": "a"}}), encoding="utf-8")
+    # Same size: only the modification time tells the versions apart
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = load_mora_table(str(path))
+    assert second is not first
+    assert second.lookup("か") == MoraInfo("g", "a", 1, 1)
+    assert load_mora_table(str(tmp_path / "missing.json")) is None
+
+
+def test_table_is_immutable():
+    table = MoraTable({"か": {"consonant": "k", "vowel": "a"}})
+    assert len(table) == 2
+    with pytest.raises(TypeError):
+        table._table["さ"] = MoraInfo("s", "a", 1, 1)
@@ -0,0 +1,62 @@
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts.audio_buffer import AudioBuffer
+from scripts.pitch_engine import PitchTrack, PitchTracker, compute_pitch_track
+
+aubio = pytest.importorskip("aubio")
+
+
+@pytest.fixture
+def gliding_tone():
+    # One second of a tone rising from 150 to 300 Hz, then half a second of silence
+    times = np.arange(16000) / 16000
+    phase = 2 * np.pi * (150 * times + 75 * times ** 2)
+    return np.concatenate((0.5 * np.sin(phase), np.zeros(8000))).astype(np.float32)
+
+
+def aubio_reference(samples, buffer_size=2048, hop_size=512):
+    detector = aubio.pitch("default", buffer_size, hop_size, 16000)
+    detector.set_unit("Hz")
+    detector.set_tolerance(0.8)
+    padded = np.zeros(-(-len(samples) // hop_size) * hop_size, dtype=np.float32)
+    padded[:len(samples)] = samples
+    return np.array([max(detector(padded[start:start + hop_size])[0], 0.0)
+                     for start in range(0, len(padded), hop_size)])
+
+
+def test_compute_pitch_track_matches_aubio(gliding_tone):
+    track = compute_pitch_track(AudioBuffer(gliding_tone))
+    reference = aubio_reference(gliding_tone)
+    assert np.array_equal(track.f0, reference)
+    assert np.array_equal(track.voiced, reference > 0)
+    assert np.allclose(track.times, np.arange(len(reference)) * 512 / 16000)
+    # The contour follows the glide and is unvoiced in the silence
+    assert track.mean_pitch([0.2, 0.7], [0.3, 0.8]) == pytest.approx([187.5, 262.5], rel=0.03)
+    assert track.mean_pitch([1.2], [1.4]).tolist() == [0.0]
+
+
+def test_pitch_tracker_matches_compute_pitch_track(gliding_tone):
+    tracker = PitchTracker(16000)
+    f0 = np.concatenate([tracker.feed(gliding_tone[start:start + 700])[1]
+                         for start in range(0, len(gliding_tone), 700)])
+    assert np.array_equal(f0, compute_pitch_track(AudioBuffer(gliding_tone)).f0[:len(f0)])
+
+
+def test_mean_pitch_matches_numpy():
+    rng = np.random.default_rng(0)
+    times = np.arange(200) * 0.01
+    voiced = rng.random(200) > 0.3
+    f0 = np.where(voiced, rng.uniform(100, 300, 200), 0.0)
+    track = PitchTrack(times, f0, voiced)
+
+    starts = rng.uniform(0, 2, 50)
+    ends = starts + rng.uniform(0, 0.3, 50)
+    expected = []
+    for start, end in zip(starts, ends):
+        inside = (times >= start) & (times < end) & voiced
+        expected.append(f0[inside].mean() if inside.any() else 0.0)
+    assert track.mean_pitch(starts, ends) == pytest.approx(expected)
+    assert len(track.mean_pitch([], [])) == 0
@@ -0,0 +1,80 @@
+# Third-party library imports
+import pytest
+
+# Local application imports
+from scripts.model_registry import ModelRegistry, load_whisper_model, model_registry, quantize_linear_layers
+from scripts.quantization_guard import check_guard, match_words, timestamp_drift
+
+
+def words(*entries):
+    return [{"text": text, "start": start, "end": end} for text, start, end in entries]
+
+
+def test_match_words_pairs_the_common_words_in_order():
+    reference = words(("きょう", 0.0, 0.4), ("は", 0.4, 0.5), ("はれ", 0.5, 0.9))
+    candidate = words(("きょう", 0.02, 0.41), ("はれ", 0.52, 0.95))
+    pairs = match_words(reference, candidate)
+    assert [(word["text"], other["text"]) for word, other in pairs] == [("きょう", "きょう"), ("はれ", "はれ")]
+
+
+def test_timestamp_drift_and_guard():
+    reference = words(("きょう", 0.0, 0.4), ("は", 0.4, 0.5), ("はれ", 0.5, 0.9))
+    candidate = words(("きょう", 0.02, 0.4), ("は", 0.4, 0.5), ("はれ", 0.5, 1.2))
+    report = timestamp_drift(reference, candidate)
+    assert report["matched_words"] == 3
+    assert report["agreement"] == 1.0
+    assert report["drift"]["start"]["max"] == pytest.approx(0.02)
+    assert report["drift"]["end"]["mean"] == pytest.approx(0.1)
+
+    assert check_guard({"totals": report}, max_drift=0.2) == []
+    failures = check_guard({"totals": report}, max_drift=0.05, min_agreement=1.0)
+    assert failures == ["Mean end drift 0.100 s is above 0.050 s"]
+    assert timestamp_drift([], [])["drift"] == {"start": None, "end": None}
+
+
+def test_quantize_linear_layers_keeps_the_model_usable():
+    torch = pytest.importorskip("torch")
+    whisper_model = pytest.importorskip("whisper.model")
+    dimensions = whisper_model.ModelDimensions(n_mels=80, n_audio_ctx=16, n_audio_state=32, n_audio_head=2,
+                                               n_audio_layer=1, n_vocab=64, n_text_ctx=8, n_text_state=32,
+                                               n_text_head=2, n_text_layer=1)
+    torch.manual_seed(0)
+    model = whisper_model.Whisper(dimensions).eval()
+    mel = torch.randn(1, 80, 32)
+    tokens = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        reference = model(mel, tokens)
+
+    quantized = quantize_linear_layers(model)
+    linear_layers = [module for module in quantized.modules() if isinstance(module, torch.nn.Linear)]
+    quantized_layers = [module for module in quantized.modules()
+                        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)]
+    assert not linear_layers
+    assert quantized_layers
+    with torch.no_grad():
+        logits = quantized(mel, tokens)
+    assert logits.shape == reference.shape
+    assert torch.isfinite(logits).all()
+
+
+def test_load_whisper_model_rejects_unsupported_settings():
+    with pytest.raises(ValueError, match="only available on the cpu"):
+        load_whisper_model("tiny", "cuda", "int8")
+    with pytest.raises(ValueError, match="Unsupported compute dtype"):
+        load_whisper_model("tiny", "cpu", "bf16")
+
+
+def test_inference_modes_are_registered():
+    assert {"default", "int8", "fast"} <= set(model_registry.names())
+    assert model_registry.key_for("int8")[1:] == ("cpu", "int8")
+
+
+def test_registry_shares_weights_between_names_of_one_configuration():
+    loads = []
+    registry = ModelRegistry(max_models=1, loader=lambda *key: loads.append(key) or object())
+    registry.register("a", "tiny", "cpu", "int8")
+    registry.register("b", "tiny", "cpu", "int8")
+    registry.register("c", "tiny", "cpu", "fp32")
+    assert registry.get("a") is registry.get("b")
+    registry.get("c")
+    assert loads == [("tiny", "cpu", "int8"), ("tiny", "cpu", "fp32")]
@@ -0,0 +1,164 @@
+# Standard library imports
+import threading
+
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts.realtime import RealtimeSession, RingBuffer, decode_pcm
+from conftest import transcription
+
+
+class SequenceTranscriber:
+    """
+    Replacement of whisper_timestamped returning the next of a list of transcriptions on every pass, and the last
+    one once the list is exhausted.
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.windows = []
+
+    def __call__(self, samples, language=None):
+        self.windows.append(len(samples))
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+
+class SlowTranscriber(SequenceTranscriber):
+    """
+    SequenceTranscriber whose first pass blocks until `release` is set, recording how many passes overlap.
+    """
+
+    def __init__(self, *results):
+        super().__init__(*results)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, samples, language=None):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            first = not self.started.is_set()
+        self.started.set()
+        if first:
+            self.release.wait(5)
+        try:
+            return super().__call__(samples, language)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def texts(words):
+    return [word["text"] for word in words]
+
+
+def events_of(events, event_type):
+    return [event for event in events if event["type"] == event_type]
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(5)
+    ring.write(np.arange(3, dtype=np.float32))
+    ring.write(np.arange(3, 7, dtype=np.float32))
+    assert (ring.start, ring.end) == (2, 7)
+    assert ring.read(0, 7).tolist() == [2, 3, 4, 5, 6]
+    assert ring.read(4, 6).tolist() == [4, 5]
+    ring.write(np.arange(7, 20, dtype=np.float32))
+    assert ring.read(0, 20).tolist() == [15, 16, 17, 18, 19]
+    assert len(ring.read(20, 30)) == 0
+
+
+def test_decode_pcm():
+    data = np.array([-32768, 0, 16384], dtype="<i2").tobytes() + b"\x01"
+    assert decode_pcm(data).tolist() == [-1.0, 0.0, 0.5]
+    assert decode_pcm(np.array([0.25], dtype="<f4").tobytes(), "pcm_f32le").tolist() == [0.25]
+
+
+def test_words_are_committed_once_two_passes_agree(tone):
+    first = transcription(("キョウ", 0.2, 0.6), ("ハ", 0.7, 1.2), ("ハレ", 2.5, 2.9))
+    revised = transcription(("キョウ", 0.2, 0.6), ("ワ", 0.7, 1.2), ("ハレ", 2.5, 2.9))
+    transcriber = SequenceTranscriber(first, revised, revised, revised)
+    session = RealtimeSession(transcriber=transcriber, latency_seconds=1.0)
+    session.feed(np.tile(tone, 2)[:48000])
+
+    # Nothing agrees with a previous pass yet
+    events = session.transcribe()
+    assert not events_of(events, "moras")
+    assert texts(events_of(events, "tentative")[0]["words"]) == ["キョウ", "ハ", "ハレ"]
+
+    # The first word is confirmed; the second changed, so it and the words after it stay tentative
+    session.feed(tone[:16000])
+    events = session.transcribe()
+    assert len(events_of(events, "moras")[0]["accent_phrases"]) == 1
+    assert texts(events_of(events, "tentative")[0]["words"]) == ["ワ", "ハレ"]
+    assert session.committed_until == 0.6
+
+    # The revised words are confirmed now; the committed first word is not returned again
+    events = session.transcribe()
+    assert len(events_of(events, "moras")[0]["accent_phrases"]) == 2
+    assert events_of(events, "tentative")[0]["words"] == []
+    assert session.kana_words == ["キョウ", "ワ", "ハレ"]
+
+
+def test_words_near_the_live_edge_wait_for_the_latency(tone):
+    words = transcription(("キョウ", 0.2, 0.6), ("ハレ", 1.5, 1.9))
+    session = RealtimeSession(transcriber=SequenceTranscriber(words), latency_seconds=0.5)
+    session.feed(tone)
+    session.transcribe()
+    events = session.transcribe()
+    # Both passes agree, but the second word ends 0.1 s before the live edge
+    assert len(events_of(events, "moras")[0]["accent_phrases"]) == 1
+    assert texts(session.tentative) == ["ハレ"]
+
+    events = session.finish()
+    assert len(events_of(events, "moras")[0]["accent_phrases"]) == 1
+    assert session.kana_words == ["キョウ", "ハレ"]
+    assert session.tentative == []
+    # The final pause runs from the last word to the end of the audio
+    assert events_of(events, "end")[0]["final_pause"] == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize("sample_rate", [8000, 44100, 48000])
+def test_resampled_session_keeps_the_input_duration(sample_rate):
+    session = RealtimeSession(sample_rate=sample_rate, transcriber=SequenceTranscriber(transcription()))
+    rng = np.random.default_rng(sample_rate)
+    total = 0
+    while total < 3 * sample_rate:
+        size = min(int(rng.integers(100, 5000)), 3 * sample_rate - total)
+        session.feed(rng.standard_normal(size).astype(np.float32) * 0.01)
+        total += size
+    session.finish()
+    assert session.duration == 3.0
+
+
+def test_finish_waits_for_the_pass_in_progress(tone):
+    first = transcription(("キョウ", 0.2, 0.6), ("ハ", 0.7, 1.0))
+    final = transcription(("キョウ", 0.2, 0.6), ("ハ", 0.7, 1.0), ("ハレ", 1.2, 1.6))
+    transcriber = SlowTranscriber(first, final)
+    session = RealtimeSession(transcriber=transcriber, latency_seconds=0.5)
+    session.feed(tone)
+    results = {}
+
+    # A periodic pass overruns (e.g. its request timed out) while the stream ends
+    periodic = threading.Thread(target=lambda: results.setdefault("periodic", session.transcribe()))
+    periodic.start()
+    assert transcriber.started.wait(5)
+    finishing = threading.Thread(target=lambda: results.setdefault("final", session.finish()))
+    finishing.start()
+    finishing.join(0.2)
+    assert finishing.is_alive()
+
+    transcriber.release.set()
+    periodic.join(5)
+    finishing.join(5)
+    assert transcriber.max_active == 1
+    assert not events_of(results["periodic"], "moras")
+    # Every word is committed exactly once, in order
+    phrases = [phrase for event in events_of(results["final"], "moras") for phrase in event["accent_phrases"]]
+    assert [phrase["complete_word"] for phrase in phrases] == ["キョウ", "ハ", "ハレ"]
+    assert session.kana_words == ["キョウ", "ハ", "ハレ"]
@@ -0,0 +1,67 @@
+# Standard library imports
+import gzip
+import json
+
+# Third-party library imports
+import pytest
+
+# Local application imports
+from scripts import response_encoding
+from scripts.response_encoding import (choose_encoding, compact_audio_query, dumps, encode_response,
+                                       expand_audio_query)
+
+
+@pytest.fixture(params=["with brotli", "without brotli"])
+def brotli_installed(request, monkeypatch):
+    installed = request.param == "with brotli"
+    monkeypatch.setattr(response_encoding, "brotli", object() if installed else None)
+    return installed
+
+
+def test_compact_schema_round_trip(audio_query):
+    compact = compact_audio_query(audio_query)
+    assert compact["format"] == "compact-1"
+    assert "accent_phrases" in compact and "moras" not in json.dumps(compact["accent_phrases"])
+    assert expand_audio_query(compact) == audio_query
+    assert expand_audio_query(json.loads(dumps(compact))) == json.loads(dumps(audio_query))
+
+
+def test_compact_schema_is_smaller(audio_query):
+    assert len(dumps(compact_audio_query(audio_query))) < len(dumps(audio_query))
+
+
+@pytest.mark.parametrize("header, with_brotli, without_brotli", [
+    (None, None, None),
+    ("", None, None),
+    ("gzip, deflate, br", "br", "gzip"),
+    ("gzip", "gzip", "gzip"),
+    ("br;q=0, gzip;q=0.5", "gzip", "gzip"),
+    ("*", "br", "gzip"),
+    ("*, gzip;q=0", "br", None),
+    ("identity", None, None),
+    ("GZIP;q=abc", None, None),
+])
+def test_choose_encoding(brotli_installed, header, with_brotli, without_brotli):
+    assert choose_encoding(header) == (with_brotli if brotli_installed else without_brotli)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_with_and_without_orjson(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(response_encoding, "orjson", None)
+    data = {"text": "キョウ", "values": [0.1, None, True]}
+    assert json.loads(dumps(data)) == data
+    assert b" " not in dumps(data)
+
+
+def test_encode_response_compresses_large_bodies_only(monkeypatch, audio_query):
+    monkeypatch.setattr(response_encoding, "brotli", None)
+    body, encoding, timings = encode_response(audio_query, "gzip, br")
+    assert encoding == "gzip"
+    assert json.loads(gzip.decompress(body)) == json.loads(dumps(audio_query))
+    assert timings["body_bytes"] == len(body) < timings["json_bytes"]
+
+    body, encoding, _ = encode_response({"small": 1}, "gzip")
+    assert (body, encoding) == (dumps({"small": 1}), None)
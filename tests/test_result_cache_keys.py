@@ -0,0 +1,42 @@
+# Local application imports
+from scripts.batch_transcriber import BatchTranscriber
+from scripts.speech_symbol_timestamps import audio_query_json, transcription_path
+from conftest import ScriptedTranscriber, transcription
+
+
+def query(tone, transcriber, **options):
+    return audio_query_json(samples=tone, sample_rate=16000, transcriber=transcriber, **options)
+
+
+def test_transcription_path_names():
+    assert transcription_path() == "whisper_timestamped"
+    assert transcription_path(ScriptedTranscriber(transcription())) == "custom"
+    assert transcription_path(ScriptedTranscriber(transcription(), transcription_path="batched")) == "batched"
+    assert transcription_path(BatchTranscriber.__new__(BatchTranscriber).transcribe) == "batched"
+
+
+def test_same_parameters_hit_the_cache(tone):
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    first = query(tone, transcriber)
+    second = query(tone, transcriber)
+    assert second == first
+    assert transcriber.calls == 1
+
+
+def test_batched_and_single_results_are_cached_apart(tone):
+    single = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)), transcription_path="whisper_timestamped")
+    batched = ScriptedTranscriber(transcription(("きのう", 0.2, 0.8)), transcription_path="batched")
+    assert query(tone, single)["kana"] == "キョウ"
+    assert query(tone, batched)["kana"] == "キノウ"
+    assert query(tone, single)["kana"] == "キョウ"
+    assert (single.calls, batched.calls) == (1, 1)
+
+
+def test_models_are_cached_apart(tone):
+    transcriber = ScriptedTranscriber(transcription(("きょう", 0.2, 0.8)))
+    for model_name in ("default", "int8", "fast"):
+        query(tone, transcriber, model_name=model_name)
+    assert transcriber.calls == 3
+    for model_name in ("default", "int8", "fast"):
+        query(tone, transcriber, model_name=model_name)
+    assert transcriber.calls == 3
@@ -0,0 +1,84 @@
+# Standard library imports
+import subprocess
+import sys
+import threading
+import time
+
+# Third-party library imports
+import pytest
+from fastapi.testclient import TestClient
+
+# Local application imports
+import app
+from scripts import warmup as warmup_module
+from scripts.inference_pool import InferencePool
+
+
+@pytest.fixture
+def warmup_gate(monkeypatch):
+    """
+    Makes the warmup of the application wait until the returned event is set.
+    """
+    gate = threading.Event()
+    monkeypatch.setattr(app, "create_inference_pool", lambda: InferencePool(max_workers=1, max_queue=1))
+    monkeypatch.setattr("scripts.inference_pool.warmup", lambda names, inference: gate.wait(10))
+    yield gate
+    gate.set()
+
+
+def wait_for_ready(client, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.02)
+    return response
+
+
+def test_ready_only_after_the_warmup(warmup_gate):
+    with TestClient(app.app) as client:
+        assert client.get("/health").status_code == 200
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+        assert "mora_ready 0.0" in client.get("/metrics").text
+
+        warmup_gate.set()
+        response = wait_for_ready(client)
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert "mora_ready 1.0" in client.get("/metrics").text
+
+
+def test_failed_warmup_is_not_ready(monkeypatch):
+    def failing_warmup(names, inference):
+        raise RuntimeError("no model")
+
+    monkeypatch.setattr(app, "create_inference_pool", lambda: InferencePool(max_workers=1, max_queue=1))
+    monkeypatch.setattr("scripts.inference_pool.warmup", failing_warmup)
+    with TestClient(app.app) as client:
+        deadline = time.monotonic() + 5
+        while app.readiness["status"] == "warming_up" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "failed", "detail": "RuntimeError: no model"}
+
+
+def test_warmup_runs_every_stage(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup_module.model_registry, "preload", lambda names: calls.append(("preload", names)))
+    monkeypatch.setattr(warmup_module, "audio_query_json",
+                        lambda **options: calls.append(("inference", options["model_name"], options["use_cache"])))
+    timings = warmup_module.warmup(model_names=("default", "int8"))
+    assert set(timings) == {"models", "kana", "mapping", "inference"}
+    assert calls == [("preload", ("default", "int8")), ("inference", "default", False), ("inference", "int8", False)]
+    assert set(warmup_module.warmup(model_names=(), inference=False)) == {"models", "kana", "mapping"}
+
+
+def test_importing_the_app_does_not_load_the_heavy_dependencies():
+    heavy = ("torch", "whisper", "whisper_timestamped", "aubio", "pykakasi", "scipy", "parselmouth", "pyarrow")
+    script = f"import sys, app; print([name for name in {heavy!r} if name in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "[]"
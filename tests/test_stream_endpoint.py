@@ -0,0 +1,93 @@
+# Standard library imports
+import asyncio
+import io
+import threading
+import time
+
+# Third-party library imports
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi.testclient import TestClient
+
+# Local application imports
+import app
+import scripts.streaming
+from scripts.inference_pool import InferencePool
+from conftest import transcription
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def slow_transcription(samples, *args, **kwargs):
+        time.sleep(0.3)
+        return transcription(("こんにちは", 0.1, 0.6))
+
+    monkeypatch.setattr(scripts.streaming, "transcribe_samples", slow_transcription)
+    pool = InferencePool(max_workers=1, max_queue=0)
+    monkeypatch.setattr(app, "inference_pool", pool)
+    yield TestClient(app.app)
+    pool.shutdown()
+
+
+def wav_bytes(seconds=1.0):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros(int(seconds * 16000), dtype=np.float32), 16000, format="WAV")
+    return buffer.getvalue()
+
+
+def test_stream_holds_a_pool_slot(client):
+    responses = {}
+
+    def first_stream():
+        responses["first"] = client.post("/mora/stream", files={"file": ("a.wav", wav_bytes())})
+
+    thread = threading.Thread(target=first_stream)
+    thread.start()
+    time.sleep(0.15)
+    assert app.inference_pool.pending == 1
+    busy = client.post("/mora/stream", files={"file": ("a.wav", wav_bytes())})
+    thread.join()
+
+    assert busy.status_code == 503
+    assert "Retry-After" in busy.headers
+    assert responses["first"].status_code == 200
+    assert app.inference_pool.pending == 0
+
+
+def test_stream_releases_the_slot_on_bad_audio(client):
+    response = client.post("/mora/stream", files={"file": ("a.wav", b"not audio")})
+    assert response.status_code == 400
+    assert app.inference_pool.pending == 0
+
+
+def test_realtime_feeds_chunks_off_the_event_loop(client, monkeypatch):
+    feed_threads = []
+
+    class RecordingSession(app.RealtimeSession):
+        def feed(self, samples):
+            try:
+                asyncio.get_running_loop()
+                feed_threads.append("event loop")
+            except RuntimeError:
+                feed_threads.append("worker")
+            return super().feed(samples)
+
+    monkeypatch.setattr(app, "RealtimeSession", RecordingSession)
+    monkeypatch.setattr(app, "shared_transcriber",
+                        lambda model: lambda samples, language=None: transcription(("キョウ", 0.2, 0.6)))
+    tone = (0.3 * np.sin(2 * np.pi * 220 * np.arange(16000) / 16000) * 32767).astype("<i2")
+
+    with client.websocket_connect("/mora/realtime") as websocket:
+        for chunk in np.array_split(tone, 4):
+            websocket.send_bytes(chunk.tobytes())
+        websocket.send_text("end")
+        events = []
+        while not events or events[-1]["type"] != "end":
+            events.append(websocket.receive_json())
+
+    assert feed_threads == ["worker"] * 4
+    assert any(event["type"] == "pitch" for event in events)
+    moras = [phrase["complete_word"] for event in events if event["type"] == "moras"
+             for phrase in event["accent_phrases"]]
+    assert moras == ["キョウ"]
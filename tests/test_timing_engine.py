@@ -0,0 +1,212 @@
+import copy
+import json
+
+import numpy as np
+import pytest
+
+from scripts.audio_buffer import AudioBuffer
+from scripts.auxiliar_functions_for_audio_query import (calculate_total_vowel_and_pause_time,
+                                                         distribute_time_error_in_all_vowels_and_pauses,
+                                                         number_of_vowels_and_pauses)
+from scripts.mora_mapping import load_mora_table
+from scripts.speech_symbol_timestamps import assemble_audio_query
+
+MAPPING_FILE = "files/mapping.json"
+PUNCTUATION = ['ー', 'ッ', '゜', '゛', '?', '。', '、', '「', '」', '『', '』', '（', '）', '・', 'ゝ', 'ゞ', 'ヽ', 'ヾ']
+
+# Hiragana words without small kana: the baseline neither grouped small kana nor looked up katakana.
+WORDS = [
+    {"text": "あめ", "start": 0.1, "end": 0.5},
+    {"text": "が", "start": 0.7, "end": 0.9},
+    {"text": "ふる。", "start": 0.9, "end": 1.63},
+]
+DURATION = 2.0
+
+
+class SilentPitch:
+    """
+    Pitch track without voiced frames, so the pitch of every mora is 0 as in the baseline on silence.
+    """
+
+    def mean_pitch(self, starts, ends):
+        return np.zeros(len(starts))
+
+
+# The baseline algorithms (commit 80cc371), kept verbatim apart from taking the mapping and durations directly.
+
+def baseline_distribute_time_equally(start, end, text, decimals=4):
+    grouped_symbols = []
+    i = 0
+    if text[0] in PUNCTUATION and len(text) > 1:
+        grouped_symbols.append(text[0] + text[1])
+        i = 2
+    while i < len(text):
+        current_symbol = text[i]
+        next_symbol = text[i + 1] if i + 1 < len(text) else ""
+        if next_symbol in PUNCTUATION:
+            grouped_symbols.append(current_symbol + next_symbol)
+            i += 2
+        else:
+            grouped_symbols.append(current_symbol)
+            i += 1
+    duration_per_group = (end - start) / len(grouped_symbols)
+    symbols_times = []
+    for i, symbol_group in enumerate(grouped_symbols):
+        symbol_start = start + i * duration_per_group
+        symbol_end = symbol_start + duration_per_group
+        symbols_times.append({
+            "text": symbol_group,
+            "start": round(symbol_start, decimals),
+            "end": round(symbol_end, decimals),
+            "vowel_consonant_length": round(symbol_end - symbol_start, decimals)
+        })
+    return symbols_times
+
+
+def baseline_add_consonant_vowel_info(symbols, mapping):
+    for symbol in symbols:
+        char_info = mapping.get(''.join(char for char in symbol["text"] if char not in PUNCTUATION).strip(), {})
+        symbol["consonant"] = char_info.get("consonant", None)
+        symbol["vowel"] = char_info.get("vowel", None)
+        symbol["pitch"] = 0.0
+    return symbols
+
+
+def baseline_time_for_vowels_and_consonants(symbols):
+    for symbol in symbols:
+        vowels = symbol.get('vowel')
+        consonants = symbol.get('consonant')
+        len_vowels = len(vowels) if vowels else 0
+        len_consonants = len(consonants) if consonants else 0
+        total_time = symbol['vowel_consonant_length']
+        if len_vowels or len_consonants:
+            fraction_time = total_time / (len_vowels * 4 + len_consonants)
+        else:
+            fraction_time = 0
+        time_consonants = fraction_time * len_consonants
+        symbol['vowel_length'] = total_time if len_vowels > 0 else None
+        symbol['consonant_length'] = round(time_consonants, 4) if len_consonants > 0 else None
+    return symbols
+
+
+def baseline_audio_query(words, mapping, duration):
+    accent_phrases = []
+    last_word_time = 0
+    for word in words:
+        pause_mora = None if word['start'] == last_word_time else word['start'] - last_word_time
+        last_word_time = word['end']
+        symbols_times = baseline_distribute_time_equally(word['start'], word['end'], word['text'])
+        symbols_times = baseline_add_consonant_vowel_info(symbols_times, mapping)
+        symbols_times = baseline_time_for_vowels_and_consonants(symbols_times)
+        accent_phrases.append({
+            "moras": symbols_times,
+            "accent": 0,
+            "is_interrogative": "か" in word['text'] or "?" in word['text'],
+            "complete_word": word['text'],
+            "pause_mora": None if pause_mora is None else {
+                "text": " ", "consonant": None, "consonant_length": None, "vowel": "pau",
+                "vowel_length": pause_mora, "pitch": 0.0
+            }
+        })
+    final_time = words[-1]['end']
+    return accent_phrases, duration - final_time if duration - final_time > 0 else None
+
+
+def baseline_total_time(audio_query):
+    total_time = 0.0
+    for phrase in audio_query['accent_phrases']:
+        for mora in phrase['moras']:
+            total_time += mora['vowel_consonant_length']
+        if phrase['pause_mora'] is not None:
+            total_time += phrase['pause_mora']['vowel_length']
+            if phrase['pause_mora']['consonant_length'] is not None:
+                total_time += phrase['pause_mora']['consonant_length']
+    total_time += audio_query['final_pause'] if audio_query['final_pause'] is not None else 0
+    return total_time
+
+
+def baseline_count(audio_query):
+    number = 0
+    for phrase in audio_query['accent_phrases']:
+        for mora in phrase['moras']:
+            number += len(mora)
+        if phrase['pause_mora'] is not None:
+            number += 1
+        if phrase['pause_mora'] is not None:
+            number += 1
+            if phrase['pause_mora']['consonant_length'] is not None:
+                number += 1
+    if audio_query['final_pause'] is not None:
+        number += 1
+    return number
+
+
+def baseline_distribute_time_error(audio_query, audio_duration):
+    error_per_vowel_or_pause = (audio_duration - baseline_total_time(audio_query)) / baseline_count(audio_query)
+    for phrase in audio_query['accent_phrases']:
+        for mora in phrase['moras']:
+            mora['vowel_consonant_length'] = mora['vowel_consonant_length'] + error_per_vowel_or_pause \
+                if mora['vowel_consonant_length'] is not None else None
+            mora['vowel_length'] = mora['vowel_length'] + error_per_vowel_or_pause \
+                if mora['vowel_length'] is not None else None
+        if phrase['pause_mora'] is not None:
+            phrase['pause_mora']['vowel_length'] = phrase['pause_mora']['vowel_length'] + error_per_vowel_or_pause
+            if phrase['pause_mora']['consonant_length'] is not None:
+                phrase['pause_mora']['consonant_length'] = (phrase['pause_mora']['consonant_length']
+                                                            + error_per_vowel_or_pause)
+    return audio_query
+
+
+@pytest.fixture
+def golden_query():
+    return assemble_audio_query("あめがふる。", copy.deepcopy(WORDS), SilentPitch(), load_mora_table(MAPPING_FILE),
+                                DURATION)
+
+
+def assert_same_query(actual, expected):
+    """
+    Compares two audio queries, allowing only the rounding of float sums taken in a different order.
+    """
+    assert {key: value for key, value in actual.items() if key != "accent_phrases"} == \
+        {key: value for key, value in expected.items() if key != "accent_phrases"}
+    assert len(actual["accent_phrases"]) == len(expected["accent_phrases"])
+    for phrase, expected_phrase in zip(actual["accent_phrases"], expected["accent_phrases"]):
+        assert phrase.keys() == expected_phrase.keys()
+        assert phrase["pause_mora"] == (None if expected_phrase["pause_mora"] is None
+                                        else pytest.approx(expected_phrase["pause_mora"], abs=1e-12))
+        for mora, expected_mora in zip(phrase["moras"], expected_phrase["moras"]):
+            assert mora == pytest.approx(expected_mora, abs=1e-12)
+
+
+def test_assemble_audio_query_matches_the_baseline(golden_query):
+    with open(MAPPING_FILE, encoding="utf-8") as file:
+        mapping = json.load(file)
+    accent_phrases, final_pause = baseline_audio_query(copy.deepcopy(WORDS), mapping, DURATION)
+
+    assert json.dumps(golden_query["accent_phrases"]) == json.dumps(accent_phrases)
+    assert golden_query["final_pause"] == final_pause
+
+
+def test_error_distribution_matches_the_baseline(golden_query):
+    # A pause consonant, which only hand-edited queries have, is adjusted as well.
+    golden_query["accent_phrases"][1]["pause_mora"]["consonant_length"] = 0.05
+    expected = baseline_distribute_time_error(copy.deepcopy(golden_query), 2.5)
+
+    assert number_of_vowels_and_pauses(golden_query) == baseline_count(golden_query)
+    assert calculate_total_vowel_and_pause_time(golden_query) == pytest.approx(baseline_total_time(golden_query))
+
+    actual = distribute_time_error_in_all_vowels_and_pauses(golden_query, AudioBuffer(np.zeros(40000, np.float32)))
+
+    assert actual["final_pause"] == expected["final_pause"]  # The final pause is counted but not adjusted.
+    assert_same_query(actual, expected)
+
+
+def test_error_distribution_counts_the_keys_of_each_mora(audio_query):
+    # Moras with formants have more keys, so the error is divided by a larger count, as in the baseline.
+    for mora in audio_query["accent_phrases"][0]["moras"]:
+        mora.update(f1=None, f2=None, intensity=None)
+    expected = baseline_distribute_time_error(copy.deepcopy(audio_query), 3.0)
+
+    actual = distribute_time_error_in_all_vowels_and_pauses(audio_query, AudioBuffer(np.zeros(48000, np.float32)))
+
+    assert_same_query(actual, expected)
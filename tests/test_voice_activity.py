@@ -0,0 +1,72 @@
+# Third-party library imports
+import numpy as np
+import pytest
+
+# Local application imports
+from scripts.audio_buffer import AudioBuffer
+from scripts.pitch_engine import PitchTrack
+from scripts.voice_activity import SpeechRegions, detect_speech
+
+
+@pytest.fixture
+def regions():
+    # Speech from 1 to 2 s and from 4 to 4.5 s of a 6 s audio; in the speech-only audio the second region starts
+    # at 1.2 s, after the 0.2 s separator
+    return SpeechRegions([1.0, 4.0], [2.0, 4.5], 6.0)
+
+
+def test_to_original(regions):
+    assert regions.compact_starts.tolist() == [0.0, 1.2]
+    # Inside the regions, then inside the separator (end of the first region) and past the end
+    assert regions.to_original([0.0, 0.5, 1.2, 1.45]).tolist() == [1.0, 1.5, 4.0, 4.25]
+    assert regions.to_original([1.1, 2.0]).tolist() == [2.0, 4.5]
+    assert SpeechRegions([], [], 3.0).to_original([0.5]).tolist() == [0.5]
+
+
+def test_words_to_original(regions):
+    words = [{"text": "キョウ", "start": 0.1, "end": 0.8}, {"text": "ハレ", "start": 1.25, "end": 1.5}]
+    assert regions.words_to_original(words) == [{"text": "キョウ", "start": 1.1, "end": 1.8},
+                                                {"text": "ハレ", "start": 4.05, "end": 4.3}]
+    assert words[0]["start"] == 0.1
+
+
+def test_silences_and_pauses(regions):
+    assert regions.silence_between([0.0, 1.5, 1.8], [1.0, 4.2, 4.1]) == pytest.approx([1.0, 2.0, 2.0])
+    words = [{"start": 1.1, "end": 1.8}, {"start": 1.8, "end": 1.9}, {"start": 4.05, "end": 4.3}]
+    pauses = regions.word_pauses(words)
+    assert pauses[0] == pytest.approx(1.0)
+    assert np.isnan(pauses[1])
+    assert pauses[2] == pytest.approx(2.0)
+
+
+def test_extract_and_map_pitch_track(regions):
+    audio = AudioBuffer(np.arange(6 * 100, dtype=np.float32), 100)
+    speech = regions.extract(audio)
+    assert len(speech.samples) == 100 + 20 + 50
+    assert speech.samples[:2].tolist() == [100, 101]
+    assert speech.samples[120:122].tolist() == [400, 401]
+    track = regions.map_pitch_track(PitchTrack(np.array([0.5, 1.3]), np.array([200.0, 0.0]),
+                                               np.array([True, False])))
+    assert track.times.tolist() == [1.5, 4.1]
+
+
+def test_detect_speech_finds_the_bursts():
+    rate = 16000
+    times = np.arange(6 * rate) / rate
+    samples = 0.001 * np.random.default_rng(0).standard_normal(len(times))
+    for start, end in ((1.0, 2.0), (4.0, 4.5)):
+        inside = (times >= start) & (times < end)
+        samples[inside] += 0.3 * np.sin(2 * np.pi * 200 * times[inside])
+    regions = detect_speech(AudioBuffer(samples.astype(np.float32), rate))
+    assert len(regions) == 2
+    # Padded by 0.1 s on each side
+    assert regions.starts == pytest.approx([0.9, 3.9], abs=0.03)
+    assert regions.ends == pytest.approx([2.1, 4.6], abs=0.03)
+
+
+def test_detect_speech_without_silence():
+    rate = 16000
+    samples = (0.3 * np.sin(2 * np.pi * 200 * np.arange(rate) / rate)).astype(np.float32)
+    regions = detect_speech(AudioBuffer(samples, rate))
+    assert (regions.starts.tolist(), regions.ends.tolist()) == ([0.0], [1.0])
+    assert len(detect_speech(AudioBuffer(np.zeros(rate, dtype=np.float32), rate))) == 0
@@ -0,0 +1,130 @@
+# Standard library imports
+import asyncio
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Third-party library imports
+import pytest
+import requests
+
+# Local application imports
+from scripts import voicevox_client
+from scripts.voicevox_client import AsyncVoicevoxClient, VoicevoxClient
+
+
+class StubEngine(ThreadingHTTPServer):
+    """
+    Local stand-in for the VOICEVOX engine. `failures` tells how many times each text is answered with a 503
+    before it succeeds, and `requests` counts the requests received for each text.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.failures = {}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        text = params.get("text", "")
+        with self.server.lock:
+            self.server.requests[text] += 1
+            failing = self.server.failures.get(text, 0) > 0
+            if failing:
+                self.server.failures[text] -= 1
+        if url.path != "/audio_query":
+            status, body = 404, {"detail": "Not Found"}
+        elif failing:
+            status, body = 503, {"detail": "busy"}
+        else:
+            status, body = 200, {"accent_phrases": [], "kana": text, "speaker": int(params["speaker"])}
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def engine():
+    engine = StubEngine()
+    thread = threading.Thread(target=engine.serve_forever, daemon=True)
+    thread.start()
+    yield engine
+    engine.shutdown()
+    engine.server_close()
+
+
+@pytest.fixture(params=["httpx", "threads"])
+def async_client(request, engine, monkeypatch):
+    if request.param == "httpx":
+        pytest.importorskip("httpx")
+    else:
+        monkeypatch.setattr(voicevox_client, "httpx", None)
+    client = AsyncVoicevoxClient(engine.url, max_connections=2, timeout=5, retries=2, backoff=0.01, cache_size=2)
+    assert (client._sync_client is not None) == (request.param == "threads")
+    return client
+
+
+def test_busy_responses_are_retried(engine):
+    engine.failures = {"こんにちは": 2, "だめ": 10}
+    with VoicevoxClient(engine.url, max_connections=2, timeout=5, retries=2, backoff=0.01) as client:
+        assert client.audio_query("こんにちは", speaker=3) == {"accent_phrases": [], "kana": "こんにちは", "speaker": 3}
+        assert engine.requests["こんにちは"] == 3
+        with pytest.raises(requests.HTTPError):
+            client.audio_query("だめ")
+        assert engine.requests["だめ"] == 3
+
+
+def test_responses_are_cached(engine):
+    with VoicevoxClient(engine.url, timeout=5, cache_size=2) as client:
+        first = client.audio_query("あ")
+        first["kana"] = "changed"
+        assert client.audio_query("あ")["kana"] == "あ"
+        assert client.audio_query("あ", speaker=2)["speaker"] == 2
+        assert engine.requests["あ"] == 2
+        assert (client.cache.hits, client.cache.misses) == (1, 2)
+        # The least recently used query is evicted
+        client.audio_query("い")
+        client.audio_query("あ", speaker=1)
+        assert engine.requests["あ"] == 3
+
+
+def test_batch_queries_keep_the_order(engine):
+    engine.failures = {"だめ": 10}
+    with VoicevoxClient(engine.url, max_connections=2, timeout=5, retries=1, backoff=0.01) as client:
+        results = client.audio_queries([("あ", 1), ("い", 1), ("あ", 1), ("だめ", 1)])
+    assert [result and result["kana"] for result in results] == ["あ", "い", "あ", None]
+    assert engine.requests["あ"] == 1
+
+
+def test_async_client(async_client, engine):
+    engine.failures = {"こんにちは": 2, "だめ": 10}
+
+    async def scenario():
+        async with async_client as client:
+            first = await client.audio_query("こんにちは", speaker=3)
+            again = await client.audio_query("こんにちは", speaker=3)
+            results = await client.audio_queries([("い", 1), ("だめ", 1), ("い", 1)])
+            return first, again, results
+
+    first, again, results = asyncio.run(scenario())
+    assert first == again == {"accent_phrases": [], "kana": "こんにちは", "speaker": 3}
+    assert engine.requests["こんにちは"] == 3
+    assert engine.requests["だめ"] == 3
+    assert [result and result["kana"] for result in results] == ["い", None, "い"]
+    assert engine.requests["い"] == 1
@@ -0,0 +1,18 @@
+# Local application imports
+from scripts.speech_symbol_timestamps import words_in_kana
+from conftest import transcription
+
+
+def test_word_timestamps_are_kept_as_transcribed():
+    result = transcription(("キョウ", 0.123456, 0.789012), ("ハ", 0.789012, 1.005))
+    words = words_in_kana(result)
+    assert [(word["start"], word["end"]) for word in words] == [(0.123456, 0.789012), (0.789012, 1.005)]
+
+
+def test_window_offset_is_added():
+    words = words_in_kana(transcription(("キョウ", 0.25, 0.5)), offset=30.0)
+    assert (words[0]["start"], words[0]["end"]) == (30.25, 30.5)
+
+
+def test_words_without_kana_are_dropped():
+    assert [word["text"] for word in words_in_kana(transcription(("", 0.0, 0.1), ("キョウ", 0.1, 0.5)))] == ["キョウ"]